@@ -0,0 +1,242 @@
+/*
+ * bench.c
+ * Copyright (C) 2026 Kovid Goyal <kovid at kovidgoyal.net>
+ *
+ * Distributed under terms of the Apache 2.0 license.
+ */
+
+// Times the phases of parsing natively, without any python overhead. Build
+// and run it with: python unix_build.py bench -- [options] file ...
+// To time only one phase, for example under perf stat, use --phase:
+// perf stat build/custom/bench --phase tokenize file.html
+
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <libxml/parser.h>
+#include "src/as-libxml.h"
+#include "gumbo/parser.h"
+#include "gumbo/tokenizer.h"
+
+typedef enum { TOKENIZE, PARSE, CONVERT, NUM_PHASES } Phase;
+static const char* PHASE_NAMES[NUM_PHASES] = {"tokenize", "parse", "convert"};
+
+typedef struct {
+    double total, best;
+} Timing;
+
+typedef struct {
+    size_t bytes, tokens, nodes, attributes;
+    Timing timings[NUM_PHASES];
+} Result;
+
+static void
+usage(void) {
+    fprintf(stderr,
+            "Usage: bench [options] file ...\n\n"
+            "Time tokenizing, parsing and converting to a libxml2 tree separately, for each file.\n\n"
+            "Options:\n"
+            "  -r, --repeat N    Number of times to run each phase (default: 20)\n"
+            "  -p, --phase NAME  Only time this phase, one of: tokenize, parse, convert\n"
+            "  -x, --xhtml       Use the XHTML rules when parsing\n"
+            "  -k, --keep-nodes  Do not free the parse tree progressively while converting it\n");
+    exit(1);
+}
+
+static char*
+read_file(const char *path, size_t *sz) {
+    FILE *f = fopen(path, "rb");
+    char *ans = NULL;
+    long len;
+    if (!f) return NULL;
+    if (fseek(f, 0, SEEK_END) == 0 && (len = ftell(f)) >= 0 && fseek(f, 0, SEEK_SET) == 0) {
+        ans = malloc((size_t)len + 1);
+        if (ans) {
+            *sz = fread(ans, 1, (size_t)len, f);
+            ans[*sz] = 0;
+        }
+    }
+    fclose(f);
+    return ans;
+}
+
+// Tokenize without building a tree. The tree builder switches the tokenizer
+// into the text states after some start tags, do the same so that the count
+// of tokens is close to the one when parsing. Note that gumbo produces one
+// token per character of text.
+static size_t
+tokenize(const char *data, size_t sz, const GumboOptions *gumbo_opts) {
+    GumboParser parser = {0};
+    GumboOutput output = {0};
+    GumboToken token = {0};
+    size_t count = 0;
+    parser._options = gumbo_opts;
+    parser._output = &output;  // the tokenizer records errors in it, but max_errors is zero
+    gumbo_tokenizer_state_init(&parser, data, sz);
+    do {
+        gumbo_lex(&parser, &token);
+        count++;
+        if (token.type == GUMBO_TOKEN_START_TAG) {
+            switch (token.v.start_tag.tag) {
+                case GUMBO_TAG_TITLE:
+                case GUMBO_TAG_TEXTAREA:
+                    gumbo_tokenizer_set_state(&parser, GUMBO_LEX_RCDATA); break;
+                case GUMBO_TAG_STYLE:
+                case GUMBO_TAG_XMP:
+                case GUMBO_TAG_IFRAME:
+                case GUMBO_TAG_NOEMBED:
+                case GUMBO_TAG_NOFRAMES:
+                    gumbo_tokenizer_set_state(&parser, GUMBO_LEX_RAWTEXT); break;
+                case GUMBO_TAG_SCRIPT:
+                    gumbo_tokenizer_set_state(&parser, GUMBO_LEX_SCRIPT); break;
+                case GUMBO_TAG_PLAINTEXT:
+                    gumbo_tokenizer_set_state(&parser, GUMBO_LEX_PLAINTEXT); break;
+                default:
+                    break;
+            }
+        }
+        gumbo_token_destroy(&token);
+    } while (token.type != GUMBO_TOKEN_EOF);
+    gumbo_tokenizer_state_destroy(&parser);
+    return count;
+}
+
+static bool
+count_nodes(GumboNode *root, size_t *nodes, size_t *attributes) {
+    size_t capacity = 1024, sz = 1;
+    GumboNode **stack = malloc(capacity * sizeof(GumboNode*));
+    if (!stack) return false;
+    stack[0] = root;
+    while (sz) {
+        GumboNode *node = stack[--sz];
+        GumboVector *children = NULL;
+        (*nodes)++;
+        switch (node->type) {
+            case GUMBO_NODE_DOCUMENT:
+                children = &node->v.document.children; break;
+            case GUMBO_NODE_ELEMENT:
+            case GUMBO_NODE_TEMPLATE:
+                children = &node->v.element.children;
+                *attributes += node->v.element.attributes.length;
+                break;
+            default:
+                break;
+        }
+        if (!children) continue;
+        if (sz + children->length > capacity) {
+            capacity = MAX(2 * capacity, sz + children->length);
+            GumboNode **s = realloc(stack, capacity * sizeof(GumboNode*));
+            if (!s) { free(stack); return false; }
+            stack = s;
+        }
+        for (unsigned int i = 0; i < children->length; i++) stack[sz++] = children->data[i];
+    }
+    free(stack);
+    return true;
+}
+
+static void
+record(Timing *t, double start) {
+    double elapsed = monotonic_time() - start;
+    t->total += elapsed;
+    if (t->best == 0 || elapsed < t->best) t->best = elapsed;
+}
+
+static bool
+run(const char *data, size_t sz, Options *opts, bool free_nodes, int phase, unsigned int repeat, Result *r) {
+    char *errmsg = NULL;
+    double start;
+    r->bytes = sz;
+    if (phase < 0 || phase == TOKENIZE) {
+        for (unsigned int i = 0; i < repeat; i++) {
+            start = monotonic_time();
+            r->tokens = tokenize(data, sz, &opts->gumbo_opts);
+            record(r->timings + TOKENIZE, start);
+        }
+    }
+    if (phase == TOKENIZE) return true;
+    for (unsigned int i = 0; i < repeat; i++) {
+        start = monotonic_time();
+        GumboOutput *output = gumbo_parse_with_options(&opts->gumbo_opts, data, sz);
+        if (!output) { fprintf(stderr, "Out of memory\n"); return false; }
+        record(r->timings + PARSE, start);
+        if (i == 0 && !count_nodes(output->document, &r->nodes, &r->attributes)) {
+            fprintf(stderr, "Out of memory\n"); gumbo_destroy_output(output); return false;
+        }
+        if (phase < 0 || phase == CONVERT) {
+            start = monotonic_time();
+            libxml_doc *doc = convert_gumbo_tree_to_libxml_tree(output, opts, free_nodes, &errmsg);
+            if (!doc) { fprintf(stderr, "%s\n", errmsg ? errmsg : "Failed to convert tree"); gumbo_destroy_output(output); return false; }
+            record(r->timings + CONVERT, start);
+            free_libxml_doc(doc);
+        }
+        gumbo_destroy_output(output);
+    }
+    return true;
+}
+
+static void
+report(const char *name, const Result *r, unsigned int repeat) {
+    printf("%s: %zu bytes, ", name, r->bytes);
+    if (r->tokens) printf("%zu tokens, ", r->tokens);
+    if (r->nodes) printf("%zu nodes, %zu attributes, ", r->nodes, r->attributes);
+    printf("%u repetitions\n", repeat);
+    printf("  %-9s %10s %10s %10s %12s %12s\n", "Phase", "Best ms", "Mean ms", "MB/s", "Mtokens/s", "Mnodes/s");
+    for (int p = 0; p < NUM_PHASES; p++) {
+        const Timing *t = r->timings + p;
+        if (!t->total) continue;
+        double mean = t->total / repeat;
+        printf("  %-9s %10.3f %10.3f %10.2f", PHASE_NAMES[p], t->best * 1000, mean * 1000, r->bytes / mean / 1e6);
+        if (r->tokens) printf(" %12.3f", r->tokens / mean / 1e6); else printf(" %12s", "");
+        if (p != TOKENIZE) printf(" %12.3f", r->nodes / mean / 1e6);
+        printf("\n");
+    }
+}
+
+int
+main(int argc, char **argv) {
+    Options opts = {0};
+    unsigned int repeat = 20;
+    int phase = -1, num_files = 0;
+    bool free_nodes = true, ok = true;
+    Result total = {0};
+    opts.gumbo_opts = kGumboDefaultOptions;
+    opts.stack_size = 16 * 1024;
+    opts.gumbo_opts.max_errors = 0;
+    opts.keep_doctype = 1;
+    opts.sanitize_names = 1;
+
+    int i = 1;
+    for (; i < argc && argv[i][0] == '-'; i++) {
+        const char *a = argv[i];
+        if (!strcmp(a, "-r") || !strcmp(a, "--repeat")) {
+            if (++i >= argc || (repeat = (unsigned int)strtoul(argv[i], NULL, 10)) < 1) usage();
+        } else if (!strcmp(a, "-p") || !strcmp(a, "--phase")) {
+            if (++i >= argc) usage();
+            for (phase = 0; phase < NUM_PHASES && strcmp(argv[i], PHASE_NAMES[phase]); phase++);
+            if (phase == NUM_PHASES) usage();
+        } else if (!strcmp(a, "-x") || !strcmp(a, "--xhtml")) opts.gumbo_opts.use_xhtml_rules = true;
+        else if (!strcmp(a, "-k") || !strcmp(a, "--keep-nodes")) free_nodes = false;
+        else usage();
+    }
+    if (i >= argc) usage();
+    xmlInitParser();
+    for (; i < argc && ok; i++) {
+        size_t sz = 0;
+        Result r = {0};
+        char *data = read_file(argv[i], &sz);
+        if (!data) { fprintf(stderr, "Failed to read: %s\n", argv[i]); ok = false; break; }
+        ok = run(data, sz, &opts, free_nodes, phase, repeat, &r);
+        free(data);
+        if (!ok) break;
+        report(argv[i], &r, repeat);
+        num_files++;
+        total.bytes += r.bytes; total.tokens += r.tokens; total.nodes += r.nodes; total.attributes += r.attributes;
+        for (int p = 0; p < NUM_PHASES; p++) {
+            total.timings[p].total += r.timings[p].total; total.timings[p].best += r.timings[p].best;
+        }
+    }
+    if (ok && num_files > 1) report("All files", &total, repeat);
+    xmlCleanupParser();
+    return ok ? 0 : 1;
+}
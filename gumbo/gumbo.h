@@ -138,7 +138,7 @@ typedef struct {
 extern const GumboVector kGumboEmptyVector;
 
 /**
- * Returns the first index at which an element appears in this vector (testing
+ * Returns the last index at which an element appears in this vector (testing
  * by pointer equality), or -1 if it never does.
  */
 int gumbo_vector_index_of(GumboVector* vector, const void* element);
@@ -521,6 +521,12 @@ struct GumboInternalNode {
   /** The type of node that this is. */
   GumboNodeType type;
 
+  /**
+   * Used by the parser while parsing: the number of its lists of open and
+   * active formatting elements that this node is in.
+   */
+  unsigned int parser_references;
+
   /** Pointer back to parent node.  Not owned. */
   GumboNode* parent;
 
@@ -534,6 +540,12 @@ struct GumboInternalNode {
    */
   GumboParseFlags parse_flags;
 
+  /**
+   * Not used by the parser, available to a GumboTreeObserver for associating
+   * its own data with the node.  NULL for newly created and cloned nodes.
+   */
+  void* user_data;
+
   /** The actual node data. */
   union {
     GumboDocument document;      // For GUMBO_NODE_DOCUMENT.
@@ -557,6 +569,52 @@ typedef void* (*GumboAllocatorFunction)(void* userdata, size_t size);
  */
 typedef void (*GumboDeallocatorFunction)(void* userdata, void* ptr);
 
+/**
+ * Callbacks that are notified of every change the parser makes to the parse
+ * tree, so that another tree can be built while parsing, instead of by walking
+ * the parse tree afterwards.  The callbacks must not modify the parse tree,
+ * except for the user_data member of nodes.
+ */
+typedef struct GumboInternalTreeObserver {
+  /**
+   * Called after node has been inserted into node->parent, at
+   * node->index_within_parent.  Return true if the text of a text, whitespace,
+   * CDATA or comment node is no longer needed, in which case the parser frees
+   * it and sets it to NULL, as the parser itself never reads it again.
+   */
+  bool (*node_inserted)(void* data, GumboNode* node);
+
+  /**
+   * Called before node is removed from its parent.  If destroyed is true, the
+   * node and its descendants are freed immediately afterwards.
+   */
+  void (*node_removed)(void* data, GumboNode* node, bool destroyed);
+
+  /**
+   * Called after all the children of from have been moved to the end of the
+   * children of to, which has no parent yet and is appended to from next.
+   */
+  void (*children_moved)(void* data, GumboNode* from, GumboNode* to);
+
+  /**
+   * Called after attributes have been added to an element that is already in
+   * the tree, they are the attributes from index first onwards.
+   */
+  void (*attributes_added)(void* data, GumboNode* node, unsigned int first);
+
+  /**
+   * Called after an element has been popped off the stack of open elements.
+   * Return true if the closed parts of the parse tree are no longer needed, in
+   * which case the parser frees those children of the element, and those of
+   * its siblings before it, that it does not need itself, removing them from
+   * the parse tree.  Later callbacks only see the nodes that are left.
+   */
+  bool (*element_closed)(void* data, GumboNode* node);
+
+  /** Passed as the first argument to the callbacks. */
+  void* data;
+} GumboTreeObserver;
+
 /**
  * Input struct containing configuration options for the parser.
  * These let you specify alternate memory managers, provide different error
@@ -590,6 +648,12 @@ typedef struct GumboInternalOptions {
    * Default: -1
    */
   int max_errors;
+
+  /**
+   * An optional observer, notified of every change made to the parse tree.
+   * Default: NULL.
+   */
+  const GumboTreeObserver* tree_observer;
 } GumboOptions;
 
 /** Default options struct; use this with gumbo_parse_with_options. */
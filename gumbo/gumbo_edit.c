@@ -215,8 +215,10 @@ GumboNode* clone_element_node(const GumboNode* node) {
   assert(node->type == GUMBO_NODE_ELEMENT || node->type == GUMBO_NODE_TEMPLATE);
   GumboNode* new_node = gumbo_malloc(sizeof(GumboNode));
   *new_node = *node;
+  new_node->parser_references = 0;
   new_node->parent = NULL;
   new_node->index_within_parent = -1;
+  new_node->user_data = NULL;
   GumboElement* element = &new_node->v.element;
   gumbo_vector_init(1, &element->children);
   const GumboVector* old_attributes = &node->v.element.attributes;
@@ -54,11 +54,13 @@ static GumboInsertionMode get_current_template_insertion_mode(
     const GumboParser*);
 static bool handle_in_template(GumboParser*, GumboToken*);
 static void free_node(GumboNode* node);
+static void free_node_data(GumboNode* node);
 
 const GumboOptions kGumboDefaultOptions = {
     4, true, false,
     50,  // limited to 50 max errors by default to avoid quadratic worst case
          // performance
+    NULL,
 };
 
 static const GumboStringPiece kDoctypeHtml = GUMBO_STRING("html");
@@ -196,6 +198,11 @@ static const NamespacedAttributeReplacement kForeignAttributeReplacements[] = {
 // scope doesn't matter.
 static const GumboNode kActiveFormattingScopeMarker;
 
+// Takes the place of the form element pointer when a tree observer lets the
+// parser free the closed form element.  The pointer is then only compared to
+// open elements, which this never is.
+static const GumboNode kClosedFormElement = {.type = GUMBO_NODE_ELEMENT};
+
 // The tag_is and tag_in function use true & false to denote start & end tags,
 // but for readability, we define constants for them here.
 static const bool kStartTag = true;
@@ -235,6 +242,13 @@ typedef struct GumboInternalParserState {
   // http://www.whatwg.org/specs/web-apps/current-work/complete/parsing.html#the-stack-of-open-elements
   GumboVector /*GumboNode*/ _open_elements;
 
+  // The number of elements of each tag in the HTML namespace in the stack of
+  // open elements.  This lets the "has an element in scope" checks return
+  // immediately when no element of the tag is open, rather than walk the whole
+  // stack, which is quadratic in deeply nested documents.  All changes to the
+  // stack must go through the *_open_element functions to keep it up to date.
+  unsigned int _open_html_elements[GUMBO_TAG_LAST];
+
   // http://www.whatwg.org/specs/web-apps/current-work/complete/parsing.html#the-list-of-active-formatting-elements
   GumboVector /*GumboNode*/ _active_formatting_elements;
 
@@ -246,6 +260,10 @@ typedef struct GumboInternalParserState {
   GumboNode* _head_element;
   GumboNode* _form_element;
 
+  // Whether the tree observer lets the parser free the nodes it no longer
+  // needs, as it answered when the last element was closed.
+  bool _free_unneeded_nodes;
+
   // The element used as fragment context when parsing in fragment mode
   GumboNode* _fragment_ctx;
 
@@ -347,7 +365,9 @@ static GumboNode* create_node(GumboNodeType type) {
   node->parent = NULL;
   node->index_within_parent = -1;
   node->type = type;
+  node->parser_references = 0;
   node->parse_flags = GUMBO_INSERTION_NORMAL;
+  node->user_data = NULL;
 
   return node;
 }
@@ -364,6 +384,9 @@ static GumboNode* new_document_node(void) {
   document->name = NULL;
   document->public_identifier = NULL;
   document->system_identifier = NULL;
+  // Fragments are parsed without going through the initial insertion mode,
+  // which is where this is set for documents.
+  document->doc_type_quirks_mode = GUMBO_DOCTYPE_NO_QUIRKS;
   return document_node;
 }
 
@@ -385,10 +408,13 @@ static void parser_state_init(GumboParser* parser) {
   parser_state->_text_node._type = GUMBO_NODE_WHITESPACE;
   gumbo_string_buffer_init(&parser_state->_text_node._buffer);
   gumbo_vector_init(10, &parser_state->_open_elements);
+  memset(parser_state->_open_html_elements, 0,
+      sizeof(parser_state->_open_html_elements));
   gumbo_vector_init(5, &parser_state->_active_formatting_elements);
   gumbo_vector_init(5, &parser_state->_template_insertion_modes);
   parser_state->_head_element = NULL;
   parser_state->_form_element = NULL;
+  parser_state->_free_unneeded_nodes = false;
   parser_state->_fragment_ctx = NULL;
   parser_state->_current_token = NULL;
   parser_state->_closed_body_tag = false;
@@ -691,23 +717,21 @@ InsertionLocation get_appropriate_insertion_location(
     return retval;
   }
 
-  // Foster-parenting case.
-  int last_template_index = -1;
+  // Foster-parenting case.  Search from the top of the stack, so that this
+  // does not become quadratic in deeply nested documents.
   int last_table_index = -1;
   GumboVector* open_elements = &parser->_parser_state->_open_elements;
-  for (unsigned int i = 0; i < open_elements->length; ++i) {
+  for (int i = open_elements->length; --i >= 0;) {
     if (node_html_tag_is(open_elements->data[i], GUMBO_TAG_TEMPLATE)) {
-      last_template_index = i;
+      // The last template is after the last table, if any.
+      retval.target = open_elements->data[i];
+      return retval;
     }
     if (node_html_tag_is(open_elements->data[i], GUMBO_TAG_TABLE)) {
       last_table_index = i;
+      break;
     }
   }
-  if (last_template_index != -1 &&
-      (last_table_index == -1 || last_template_index > last_table_index)) {
-    retval.target = open_elements->data[last_template_index];
-    return retval;
-  }
   if (last_table_index == -1) {
     retval.target = open_elements->data[0];
     return retval;
@@ -723,9 +747,128 @@ InsertionLocation get_appropriate_insertion_location(
   return retval;
 }
 
+static void notify_node_inserted(GumboParser* parser, GumboNode* node) {
+  const GumboTreeObserver* observer = parser->_options->tree_observer;
+  if (!observer || !observer->node_inserted(observer->data, node)) {
+    return;
+  }
+  switch (node->type) {
+    case GUMBO_NODE_TEXT:
+    case GUMBO_NODE_CDATA:
+    case GUMBO_NODE_COMMENT:
+    case GUMBO_NODE_WHITESPACE:
+      gumbo_free((void*) node->v.text.text);
+      node->v.text.text = NULL;
+      break;
+    default:
+      break;
+  }
+}
+
+static void notify_attributes_added(
+    GumboParser* parser, GumboNode* node, unsigned int first) {
+  const GumboTreeObserver* observer = parser->_options->tree_observer;
+  if (observer && node->v.element.attributes.length > first) {
+    observer->attributes_added(observer->data, node, first);
+  }
+}
+
+static void notify_node_removed(
+    GumboParser* parser, GumboNode* node, bool destroyed) {
+  const GumboTreeObserver* observer = parser->_options->tree_observer;
+  if (observer) {
+    observer->node_removed(observer->data, node, destroyed);
+  }
+}
+
+// Whether the parser may still need node, once its parent or node itself has
+// been closed.  Elements are needed if they are open, active formatting or
+// head elements, or have needed children of their own, which are only freed
+// with the rest of the parse tree.
+static bool is_needed_node(const GumboParserState* state, const GumboNode* node) {
+  return (node->type == GUMBO_NODE_ELEMENT ||
+             node->type == GUMBO_NODE_TEMPLATE) &&
+         (node->parser_references > 0 ||
+             node->v.element.children.length > 0 ||
+             node == state->_head_element);
+}
+
+static void free_unneeded_node(GumboParserState* state, GumboNode* node) {
+  if (node == state->_form_element) {
+    state->_form_element = (GumboNode*) &kClosedFormElement;
+  }
+  free_node_data(node);
+}
+
+// Frees the children of the closed element node, and its siblings before it,
+// that the parser no longer needs.  Only the siblings up to the first needed
+// one are checked, so that closing every child of an element is linear.
+static void free_unneeded_nodes(GumboParserState* state, GumboNode* node) {
+  GumboVector* children = &node->v.element.children;
+  unsigned int kept = 0;
+  for (unsigned int i = 0; i < children->length; ++i) {
+    GumboNode* child = children->data[i];
+    if (is_needed_node(state, child)) {
+      child->index_within_parent = kept;
+      children->data[kept++] = child;
+    } else {
+      free_unneeded_node(state, child);
+    }
+  }
+  children->length = kept;
+
+  GumboNode* parent = node->parent;
+  if (!parent || parent->type == GUMBO_NODE_DOCUMENT) {
+    return;
+  }
+  GumboVector* siblings = &parent->v.element.children;
+  unsigned int end = node->index_within_parent, start = end;
+  while (start > 0 && !is_needed_node(state, siblings->data[start - 1])) {
+    free_unneeded_node(state, siblings->data[--start]);
+  }
+  if (start == end) {
+    return;
+  }
+  memmove(&siblings->data[start], &siblings->data[end],
+      sizeof(void*) * (siblings->length - end));
+  siblings->length -= end - start;
+  for (unsigned int i = start; i < siblings->length; ++i) {
+    ((GumboNode*) siblings->data[i])->index_within_parent = i;
+  }
+}
+
+static void notify_element_closed(GumboParser* parser, GumboNode* node) {
+  const GumboTreeObserver* observer = parser->_options->tree_observer;
+  GumboParserState* state = parser->_parser_state;
+  state->_free_unneeded_nodes =
+      observer && observer->element_closed(observer->data, node);
+  if (state->_free_unneeded_nodes) {
+    free_unneeded_nodes(state, node);
+  }
+}
+
+// Frees an element that has been removed from the list of active formatting
+// elements, if it was only kept in its closed parent because it was in it.
+// Must not be called in the middle of the adoption agency algorithm, which
+// still works on closed elements.
+static void free_released_element(GumboParserState* state, GumboNode* node) {
+  GumboNode* parent = node->parent;
+  if (!state->_free_unneeded_nodes || is_needed_node(state, node) || !parent ||
+      parent->type == GUMBO_NODE_DOCUMENT || parent->parser_references > 0) {
+    return;
+  }
+  GumboVector* siblings = &parent->v.element.children;
+  gumbo_vector_remove_at(node->index_within_parent, siblings);
+  for (unsigned int i = node->index_within_parent; i < siblings->length; ++i) {
+    ((GumboNode*) siblings->data[i])->index_within_parent = i;
+  }
+  free_unneeded_node(state, node);
+}
+
 // Appends a node to the end of its parent, setting the "parent" and
 // "index_within_parent" fields appropriately.
-static void append_node(GumboNode* parent, GumboNode* node) {
+static void append_node(
+    GumboParser* parser, GumboNode* parent, GumboNode* node) {
   assert(node->parent == NULL);
   assert(node->index_within_parent == UINT_MAX);
   GumboVector* children;
@@ -740,12 +883,14 @@ static void append_node(GumboNode* parent, GumboNode* node) {
   node->index_within_parent = children->length;
   gumbo_vector_add((void*) node, children);
   assert(node->index_within_parent < children->length);
+  notify_node_inserted(parser, node);
 }
 
 // Inserts a node at the specified InsertionLocation, updating the
 // "parent" and "index_within_parent" fields of it and all its siblings.
 // If the index of the location is -1, this calls append_node.
-static void insert_node(GumboNode* node, InsertionLocation location) {
+static void insert_node(
+    GumboParser* parser, GumboNode* node, InsertionLocation location) {
   assert(node->parent == NULL);
   assert(node->index_within_parent == UINT_MAX);
   GumboNode* parent = location.target;
@@ -773,8 +918,9 @@ static void insert_node(GumboNode* node, InsertionLocation location) {
       sibling->index_within_parent = i;
       assert(sibling->index_within_parent < children->length);
     }
+    notify_node_inserted(parser, node);
   } else {
-    append_node(parent, node);
+    append_node(parser, parent, node);
   }
 }
 
@@ -806,7 +952,7 @@ static void maybe_flush_text_node_buffer(GumboParser* parser) {
     // spec, they are dropped on the floor.
     free_node(text_node);
   } else {
-    insert_node(text_node, location);
+    insert_node(parser, text_node, location);
   }
 
   gumbo_string_buffer_clear(&buffer_state->_buffer);
@@ -822,6 +968,50 @@ static void record_end_of_element(
                                   : kGumboEmptyString;
 }
 
+// Counts the lists of open and active formatting elements that node is in, so
+// that the parser knows which nodes it can free when a tree observer does not
+// need them.
+static void count_node_reference(const GumboNode* node, int delta) {
+  if (node != &kActiveFormattingScopeMarker) {
+    ((GumboNode*) node)->parser_references += delta;
+    assert(node->parser_references <= 2);
+  }
+}
+
+static void count_open_element(
+    GumboParserState* state, const GumboNode* node, int delta) {
+  assert(node->type == GUMBO_NODE_ELEMENT || node->type == GUMBO_NODE_TEMPLATE);
+  count_node_reference(node, delta);
+  if (node->v.element.tag_namespace == GUMBO_NAMESPACE_HTML) {
+    state->_open_html_elements[node->v.element.tag] += delta;
+  }
+}
+
+static void push_open_element(GumboParserState* state, GumboNode* node) {
+  gumbo_vector_add(node, &state->_open_elements);
+  count_open_element(state, node, 1);
+}
+
+static void insert_open_element_at(
+    GumboParserState* state, GumboNode* node, int index) {
+  gumbo_vector_insert_at(node, index, &state->_open_elements);
+  count_open_element(state, node, 1);
+}
+
+static void remove_open_element_at(GumboParserState* state, int index) {
+  count_open_element(
+      state, gumbo_vector_remove_at(index, &state->_open_elements), -1);
+}
+
+// Does nothing if node is not in the stack of open elements.
+static void remove_open_element(
+    GumboParserState* state, const GumboNode* node) {
+  int index = gumbo_vector_index_of(&state->_open_elements, node);
+  if (index != -1) {
+    remove_open_element_at(state, index);
+  }
+}
+
 static GumboNode* pop_current_node(GumboParser* parser) {
   GumboParserState* state = parser->_parser_state;
   maybe_flush_text_node_buffer(parser);
@@ -835,6 +1025,7 @@ static GumboNode* pop_current_node(GumboParser* parser) {
     assert(state->_open_elements.length == 0);
     return NULL;
   }
+  count_open_element(state, current_node, -1);
   assert(current_node->type == GUMBO_NODE_ELEMENT ||
          current_node->type == GUMBO_NODE_TEMPLATE);
   bool is_closed_body_or_html_tag =
@@ -850,6 +1041,7 @@ static GumboNode* pop_current_node(GumboParser* parser) {
   if (!is_closed_body_or_html_tag) {
     record_end_of_element(state->_current_token, &current_node->v.element);
   }
+  notify_element_closed(parser, current_node);
   return current_node;
 }
 
@@ -862,7 +1054,7 @@ static void append_comment_node(
   comment->v.text.text = token->v.text;
   comment->v.text.original_text = token->original_text;
   comment->v.text.start_pos = token->position;
-  append_node(node, comment);
+  append_node(parser, node, comment);
 }
 
 // http://www.whatwg.org/specs/web-apps/current-work/complete/tokenization.html#clear-the-stack-back-to-a-table-row-context
@@ -956,8 +1148,8 @@ static void insert_element(GumboParser* parser, GumboNode* node,
     maybe_flush_text_node_buffer(parser);
   }
   InsertionLocation location = get_appropriate_insertion_location(parser, NULL);
-  insert_node(node, location);
-  gumbo_vector_add((void*) node, &state->_open_elements);
+  insert_node(parser, node, location);
+  push_open_element(state, node);
 }
 
 // Convenience method that combines create_element_from_token and
@@ -1104,15 +1296,21 @@ static void add_formatting_element(GumboParser* parser, const GumboNode* node) {
   if (num_identical_elements >= 3) {
     gumbo_debug("Noah's ark clause: removing element at %d.\n",
         earliest_identical_element);
-    gumbo_vector_remove_at(earliest_identical_element, elements);
+    GumboNode* earliest =
+        gumbo_vector_remove_at(earliest_identical_element, elements);
+    count_node_reference(earliest, -1);
+    free_released_element(parser->_parser_state, earliest);
   }
 
   gumbo_vector_add((void*) node, elements);
+  count_node_reference(node, 1);
 }
 
 static bool is_open_element(GumboParser* parser, const GumboNode* node) {
   GumboVector* open_elements = &parser->_parser_state->_open_elements;
-  for (unsigned int i = 0; i < open_elements->length; ++i) {
+  // Search from the top of the stack, as active formatting elements that are
+  // still open are almost always near it.
+  for (int i = open_elements->length; --i >= 0;) {
     if (open_elements->data[i] == node) {
       return true;
     }
@@ -1127,8 +1325,10 @@ GumboNode* clone_node(const GumboNode* node, GumboParseFlags reason) {
   assert(node->type == GUMBO_NODE_ELEMENT || node->type == GUMBO_NODE_TEMPLATE);
   GumboNode* new_node = gumbo_malloc(sizeof(GumboNode));
   *new_node = *node;
+  new_node->parser_references = 0;
   new_node->parent = NULL;
   new_node->index_within_parent = -1;
+  new_node->user_data = NULL;
   // Clear the GUMBO_INSERTION_IMPLICIT_END_TAG flag, as the cloned node may
   // have a separate end tag.
   new_node->parse_flags &= ~GUMBO_INSERTION_IMPLICIT_END_TAG;
@@ -1194,11 +1394,14 @@ static void reconstruct_active_formatting_elements(GumboParser* parser) {
     // Step 9.
     InsertionLocation location =
         get_appropriate_insertion_location(parser, NULL);
-    insert_node(clone, location);
-    gumbo_vector_add((void*) clone, &parser->_parser_state->_open_elements);
+    insert_node(parser, clone, location);
+    push_open_element(parser->_parser_state, clone);
 
     // Step 10.
     elements->data[c] = clone;
+    count_node_reference(element, -1);
+    count_node_reference(clone, 1);
+    free_released_element(parser->_parser_state, (GumboNode*) element);
     gumbo_debug("Reconstructed %s element at %d.\n",
         gumbo_normalized_tagname(clone->v.element.tag), c);
   }
@@ -1209,6 +1412,10 @@ static void clear_active_formatting_elements(GumboParser* parser) {
   const GumboNode* node;
   do {
     node = gumbo_vector_pop(elements);
+    if (node && node != &kActiveFormattingScopeMarker) {
+      count_node_reference(node, -1);
+      free_released_element(parser->_parser_state, (GumboNode*) node);
+    }
   } while (node && node != &kActiveFormattingScopeMarker);
   gumbo_debug("Cleared %d elements from active formatting list.\n",
       num_elements_cleared);
@@ -1252,6 +1459,15 @@ static GumboQuirksModeEnum compute_quirks_mode(
 static bool has_an_element_in_specific_scope(GumboParser* parser,
     int expected_size, const GumboTag* expected, bool negate,
     const gumbo_tagset tags) {
+  const unsigned int* open_html_elements =
+      parser->_parser_state->_open_html_elements;
+  bool any_open = false;
+  for (int j = 0; j < expected_size && !any_open; ++j) {
+    any_open = open_html_elements[expected[j]] > 0;
+  }
+  if (!any_open) {
+    return false;
+  }
   GumboVector* open_elements = &parser->_parser_state->_open_elements;
   for (int i = open_elements->length; --i >= 0;) {
     const GumboNode* node = open_elements->data[i];
@@ -1540,11 +1756,13 @@ static void maybe_implicitly_close_list_tag(
   }
 }
 
-static void merge_attributes(GumboToken* token, GumboNode* node) {
+static void merge_attributes(
+    GumboParser* parser, GumboToken* token, GumboNode* node) {
   assert(token->type == GUMBO_TOKEN_START_TAG);
   assert(node->type == GUMBO_NODE_ELEMENT);
   const GumboVector* token_attr = &token->v.start_tag.attributes;
   GumboVector* node_attr = &node->v.element.attributes;
+  unsigned int num_attributes = node_attr->length;
 
   for (unsigned int i = 0; i < token_attr->length; ++i) {
     GumboAttribute* attr = token_attr->data[i];
@@ -1556,6 +1774,7 @@ static void merge_attributes(GumboToken* token, GumboNode* node) {
       token_attr->data[i] = NULL;
     }
   }
+  notify_attributes_added(parser, node, num_attributes);
   // When attributes are merged, it means the token has been ignored and merged
   // with another token, so we need to free its memory.  The attributes that are
   // transferred need to be nulled-out in the vector above so that they aren't
@@ -1658,7 +1877,7 @@ static bool maybe_add_doctype_error(
   return true;
 }
 
-static void remove_from_parent(GumboNode* node) {
+static void remove_from_parent(GumboParser* parser, GumboNode* node) {
   if (!node->parent) {
     // The node may not have a parent if, for example, it is a newly-cloned copy
     // of an active formatting element.  DOM manipulations continue with the
@@ -1667,6 +1886,7 @@ static void remove_from_parent(GumboNode* node) {
     return;
   }
   assert(node->parent->type == GUMBO_NODE_ELEMENT);
+  notify_node_removed(parser, node, false);
   GumboVector* children = &node->parent->v.element.children;
   int index = gumbo_vector_index_of(children, node);
   assert(index != -1);
@@ -1731,6 +1951,8 @@ static bool adoption_agency_algorithm(
       gumbo_debug("Formatting node not on stack of open elements.\n");
       parser_add_parse_error(parser, token);
       gumbo_vector_remove(formatting_node, &state->_active_formatting_elements);
+      count_node_reference(formatting_node, -1);
+      free_released_element(state, formatting_node);
       return false;
     }
 
@@ -1769,6 +1991,7 @@ static bool adoption_agency_algorithm(
       // And the formatting element itself.
       pop_current_node(parser);
       gumbo_vector_remove(formatting_node, &state->_active_formatting_elements);
+      count_node_reference(formatting_node, -1);
       return false;
     }
     assert(!node_html_tag_is(furthest_block, GUMBO_TAG_HTML));
@@ -1824,6 +2047,7 @@ static bool adoption_agency_algorithm(
         gumbo_debug("Removing formatting element at %d.\n", formatting_index);
         gumbo_vector_remove_at(
             formatting_index, &state->_active_formatting_elements);
+        count_node_reference(node, -1);
         // Removing the element shifts all indices over by one, so we may need
         // to move the bookmark.
         if (formatting_index < bookmark) {
@@ -1834,17 +2058,20 @@ static bool adoption_agency_algorithm(
       }
       if (formatting_index == -1) {
         // Step 13.6.
-        gumbo_vector_remove_at(node_index, &state->_open_elements);
+        remove_open_element_at(state, node_index);
         continue;
       }
       // Step 13.7.
       // "common ancestor as the intended parent" doesn't actually mean insert
       // it into the common ancestor; that happens below.
+      GumboNode* original = node;
       node = clone_node(node, GUMBO_INSERTION_ADOPTION_AGENCY_CLONED);
       assert(formatting_index >= 0);
       state->_active_formatting_elements.data[formatting_index] = node;
       assert(node_index >= 0);
       state->_open_elements.data[node_index] = node;
+      count_node_reference(original, -2);
+      count_node_reference(node, 2);
       // Step 13.8.
       if (last_node == furthest_block) {
         bookmark = formatting_index + 1;
@@ -1854,8 +2081,8 @@ static bool adoption_agency_algorithm(
       }
       // Step 13.9.
       last_node->parse_flags |= GUMBO_INSERTION_ADOPTION_AGENCY_MOVED;
-      remove_from_parent(last_node);
-      append_node(node, last_node);
+      remove_from_parent(parser, last_node);
+      append_node(parser, node, last_node);
       // Step 13.10.
       last_node = node;
     }  // Step 13.11.
@@ -1863,13 +2090,13 @@ static bool adoption_agency_algorithm(
     // Step 14.
     gumbo_debug("Removing %s node from parent ",
         gumbo_normalized_tagname(last_node->v.element.tag));
-    remove_from_parent(last_node);
+    remove_from_parent(parser, last_node);
     last_node->parse_flags |= GUMBO_INSERTION_ADOPTION_AGENCY_MOVED;
     InsertionLocation location =
         get_appropriate_insertion_location(parser, common_ancestor);
     gumbo_debug("and inserting it into %s.\n",
         gumbo_normalized_tagname(location.target->v.element.tag));
-    insert_node(last_node, location);
+    insert_node(parser, last_node, location);
 
     // Step 15.
     GumboNode* new_formatting_node =
@@ -1890,9 +2117,14 @@ static bool adoption_agency_algorithm(
       GumboNode* child = temp.data[i];
       child->parent = new_formatting_node;
     }
+    const GumboTreeObserver* observer = parser->_options->tree_observer;
+    if (observer) {
+      observer->children_moved(
+          observer->data, furthest_block, new_formatting_node);
+    }
 
     // Step 17.
-    append_node(furthest_block, new_formatting_node);
+    append_node(parser, furthest_block, new_formatting_node);
 
     // Step 18.
     // If the formatting node was before the bookmark, it may shift over all
@@ -1909,20 +2141,21 @@ static bool adoption_agency_algorithm(
     }
     gumbo_vector_remove_at(
         formatting_node_index, &state->_active_formatting_elements);
+    count_node_reference(formatting_node, -1);
     assert(bookmark >= 0);
     assert(
         (unsigned int) bookmark <= state->_active_formatting_elements.length);
     gumbo_vector_insert_at(
         new_formatting_node, bookmark, &state->_active_formatting_elements);
+    count_node_reference(new_formatting_node, 1);
 
     // Step 19.
-    gumbo_vector_remove(formatting_node, &state->_open_elements);
+    remove_open_element(state, formatting_node);
     int insert_at =
         gumbo_vector_index_of(&state->_open_elements, furthest_block) + 1;
     assert(insert_at >= 0);
     assert((unsigned int) insert_at <= state->_open_elements.length);
-    gumbo_vector_insert_at(
-        new_formatting_node, insert_at, &state->_open_elements);
+    insert_open_element_at(state, new_formatting_node, insert_at);
   }  // Step 20.
   return true;
 }
@@ -2307,9 +2540,9 @@ static bool handle_after_head(GumboParser* parser, GumboToken* token) {
           // may be
           // pending character tokens that should be attached to the root.
           maybe_flush_text_node_buffer(parser);
-          gumbo_vector_add(state->_head_element, &state->_open_elements);
+          push_open_element(state, state->_head_element);
           bool result = handle_in_head(parser, token);
-          gumbo_vector_remove(state->_head_element, &state->_open_elements);
+          remove_open_element(state, state->_head_element);
           return result;
         case GUMBO_TAG_HEAD:
           parser_add_parse_error(parser, token);
@@ -2342,43 +2575,67 @@ static bool handle_after_head(GumboParser* parser, GumboToken* token) {
   return true;
 }
 
+// Frees the node and everything it owns except its children.
+static void free_node_data(GumboNode* node) {
+  switch (node->type) {
+    case GUMBO_NODE_DOCUMENT: {
+      GumboDocument* doc = &node->v.document;
+      gumbo_free((void*) doc->children.data);
+      gumbo_free((void*) doc->name);
+      gumbo_free((void*) doc->public_identifier);
+      gumbo_free((void*) doc->system_identifier);
+    } break;
+    case GUMBO_NODE_TEMPLATE:
+    case GUMBO_NODE_ELEMENT:
+      for (unsigned int i = 0; i < node->v.element.attributes.length; ++i) {
+        gumbo_destroy_attribute(node->v.element.attributes.data[i]);
+      }
+      gumbo_free(node->v.element.attributes.data);
+      gumbo_free(node->v.element.children.data);
+      break;
+    case GUMBO_NODE_TEXT:
+    case GUMBO_NODE_CDATA:
+    case GUMBO_NODE_COMMENT:
+    case GUMBO_NODE_WHITESPACE:
+      gumbo_free((void*) node->v.text.text);
+      break;
+  }
+  gumbo_free(node);
+}
+
 static void free_node(GumboNode* node_to_free) {
   GumboNode* node;
+  GumboVector* children = node_to_free->type == GUMBO_NODE_DOCUMENT ?
+      &node_to_free->v.document.children :
+      (node_to_free->type == GUMBO_NODE_ELEMENT || node_to_free->type == GUMBO_NODE_TEMPLATE) ?
+      &node_to_free->v.element.children : NULL;
+  if (children == NULL || children->length == 0) {
+    // No need for a stack to free a single node
+    free_node_data(node_to_free);
+    return;
+  }
   GumboVector nodestack = kGumboEmptyVector;
   gumbo_vector_init(10, &nodestack);
   gumbo_vector_add((void*) node_to_free, &nodestack);
   while ((node = (GumboNode*) gumbo_vector_pop(&nodestack)) != NULL) {
     switch (node->type) {
-      case GUMBO_NODE_DOCUMENT: {
-        GumboDocument* doc = &node->v.document;
-        for (unsigned int i = 0; i < doc->children.length; ++i) {
-          gumbo_vector_add((void*) (doc->children.data[i]), &nodestack);
-        }
-        gumbo_free((void*) doc->children.data);
-        gumbo_free((void*) doc->name);
-        gumbo_free((void*) doc->public_identifier);
-        gumbo_free((void*) doc->system_identifier);
-      } break;
+      case GUMBO_NODE_DOCUMENT:
+        children = &node->v.document.children;
+        break;
       case GUMBO_NODE_TEMPLATE:
       case GUMBO_NODE_ELEMENT:
-        for (unsigned int i = 0; i < node->v.element.attributes.length; ++i) {
-          gumbo_destroy_attribute(node->v.element.attributes.data[i]);
-        }
-        for (unsigned int i = 0; i < node->v.element.children.length; ++i) {
-          gumbo_vector_add(
-              (void*) (node->v.element.children.data[i]), &nodestack);
-        }
-        gumbo_free(node->v.element.attributes.data);
-        gumbo_free(node->v.element.children.data);
+        children = &node->v.element.children;
         break;
-      case GUMBO_NODE_TEXT:
-      case GUMBO_NODE_CDATA:
-      case GUMBO_NODE_COMMENT:
-      case GUMBO_NODE_WHITESPACE:
-        gumbo_free((void*) node->v.text.text);
+      default:
+        children = NULL;
         break;
     }
-    gumbo_free(node);
+    if (children) {
+      for (unsigned int i = 0; i < children->length; ++i) {
+        gumbo_vector_add(children->data[i], &nodestack);
+      }
+    }
+    free_node_data(node);
   }
   gumbo_vector_destroy(&nodestack);
 }
@@ -2433,7 +2690,7 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
           }
           assert(parser->_output->root != NULL);
           assert(parser->_output->root->type == GUMBO_NODE_ELEMENT);
-          merge_attributes(token, parser->_output->root);
+          merge_attributes(parser, token, parser->_output->root);
           return false;
         case GUMBO_TAG_BASE:
         case GUMBO_TAG_BASEFONT:
@@ -2457,7 +2714,7 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
             return false;
           }
           state->_frameset_ok = false;
-          merge_attributes(token, state->_open_elements.data[1]);
+          merge_attributes(parser, token, state->_open_elements.data[1]);
           return false;
         case GUMBO_TAG_FRAMESET:
           parser_add_parse_error(parser, token);
@@ -2494,6 +2751,7 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
           GumboVector* children = &parser->_output->root->v.element.children;
           for (unsigned int i = 0; i < children->length; ++i) {
             if (children->data[i] == body_node) {
+              notify_node_removed(parser, body_node, true);
               gumbo_vector_remove_at(i, children);
               break;
             }
@@ -2621,7 +2879,9 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
             if (find_last_anchor_index(parser, &last_a)) {
               void* last_element = gumbo_vector_remove_at(
                   last_a, &state->_active_formatting_elements);
-              gumbo_vector_remove(last_element, &state->_open_elements);
+              count_node_reference(last_element, -1);
+              remove_open_element(state, last_element);
+              free_released_element(state, last_element);
             }
             success = false;
           }
@@ -2755,6 +3015,7 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
           }
           if (action_attr) {
             gumbo_vector_add(action_attr, &form->v.element.attributes);
+            notify_attributes_added(parser, form, 0);
           }
           insert_element_of_tag_type(
               parser, GUMBO_TAG_HR, GUMBO_INSERTION_FROM_ISINDEX);
@@ -2820,6 +3081,7 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
           name->value_start = kGumboEmptySourcePosition;
           name->value_end = kGumboEmptySourcePosition;
           gumbo_vector_add(name, &input->v.element.attributes);
+          notify_attributes_added(parser, input, 0);
 
           pop_current_node(parser);  // <input>
           pop_current_node(parser);  // <label>
@@ -3063,10 +3325,9 @@ static bool handle_in_body(GumboParser* parser, GumboToken* token) {
             } else
               record_end_of_element(token, &node->v.element);
 
-            GumboVector* open_elements = &state->_open_elements;
-            int index = gumbo_vector_index_of(open_elements, node);
+            int index = gumbo_vector_index_of(&state->_open_elements, node);
             assert(index >= 0);
-            gumbo_vector_remove_at(index, open_elements);
+            remove_open_element_at(state, index);
             return result;
           }
         }
@@ -44,7 +44,9 @@ const char* gumbo_normalized_tagname_and_size(GumboTag tag, uint8_t* sz) {
 }
 
 void gumbo_tag_from_original_text(GumboStringPiece* text) {
-  if (text->data == NULL) {
+  if (text->data == NULL || text->data[0] != '<') {
+    // No original text or already converted, which can happen if a parse tree
+    // is converted more than once
     return;
   }
 
@@ -67,6 +67,10 @@
 // script mode.
 const GumboStringPiece kScriptTag = {"script", 6};
 
+// Tags with at least this many attributes use a hash table to find duplicate
+// attribute names, instead of comparing each new name with all previous ones.
+static const unsigned int kMinAttributesToIndex = 16;
+
 // An enum for the return value of each individual state.
 typedef enum {
   RETURN_ERROR,    // Return false (error) from the tokenizer.
@@ -102,6 +106,14 @@ typedef struct GumboInternalTagState {
   // the attribute value, but shouldn't overwrite the existing value.
   bool _drop_next_attr_value;
 
+  // For tags with many attributes, an open addressing hash table of the
+  // indices (plus one, zero is an empty slot) of the attributes, used to find
+  // duplicates.  The first _attribute_index_length attributes are in it.  It is
+  // created when needed and freed when the next tag starts.
+  unsigned int* _attribute_index;
+  unsigned int _attribute_index_capacity;
+  unsigned int _attribute_index_length;
+
   // The state that caused the tokenizer to switch into a character reference in
   // attribute value state.  This is used to set the additional allowed
   // character, and is switched back to on completion.  Initialized as the
@@ -691,6 +703,10 @@ static void start_new_tag(GumboParser* parser, bool is_start_tag) {
   // for the HTML5 Spec), but still have basically 99% of nodes with <= 2 attrs.
   gumbo_vector_init(2, &tag_state->_attributes);
   tag_state->_drop_next_attr_value = false;
+  gumbo_free(tag_state->_attribute_index);
+  tag_state->_attribute_index = NULL;
+  tag_state->_attribute_index_capacity = 0;
+  tag_state->_attribute_index_length = 0;
   tag_state->_is_start_tag = is_start_tag;
   tag_state->_is_self_closing = false;
   gumbo_debug("Starting new tag.\n");
@@ -763,6 +779,72 @@ static void add_duplicate_attr_error(
   reinitialize_tag_buffer(parser);
 }
 
+static bool attribute_name_is(
+    const GumboAttribute* attr, const char* name, size_t length) {
+  return strlen(attr->name) == length && memcmp(attr->name, name, length) == 0;
+}
+
+// FNV-1a
+static unsigned int hash_attribute_name(const char* name, size_t length) {
+  unsigned int hash = 2166136261u;
+  for (size_t i = 0; i < length; ++i) {
+    hash = (hash ^ (unsigned char) name[i]) * 16777619u;
+  }
+  return hash;
+}
+
+static void index_attribute(GumboTagState* tag_state, unsigned int i) {
+  const char* name = ((GumboAttribute*) tag_state->_attributes.data[i])->name;
+  unsigned int mask = tag_state->_attribute_index_capacity - 1;
+  unsigned int slot = hash_attribute_name(name, strlen(name)) & mask;
+  while (tag_state->_attribute_index[slot]) {
+    slot = (slot + 1) & mask;
+  }
+  tag_state->_attribute_index[slot] = i + 1;
+}
+
+// Returns the index of the attribute of the current tag whose name is in the
+// tag buffer, or -1 if there is none.
+static int find_attribute(GumboTagState* tag_state) {
+  const GumboVector* attributes = &tag_state->_attributes;
+  const char* name = tag_state->_buffer.data;
+  size_t length = tag_state->_buffer.length;
+  if (attributes->length < kMinAttributesToIndex) {
+    for (unsigned int i = 0; i < attributes->length; ++i) {
+      if (attribute_name_is(attributes->data[i], name, length)) {
+        return i;
+      }
+    }
+    return -1;
+  }
+  // Keep the table at most half full, rebuilding it when it grows.
+  if (2 * (attributes->length + 1) > tag_state->_attribute_index_capacity) {
+    unsigned int capacity = 4 * kMinAttributesToIndex;
+    while (capacity < 4 * (attributes->length + 1)) {
+      capacity *= 2;
+    }
+    gumbo_free(tag_state->_attribute_index);
+    tag_state->_attribute_index =
+        gumbo_malloc(capacity * sizeof(unsigned int));
+    memset(tag_state->_attribute_index, 0, capacity * sizeof(unsigned int));
+    tag_state->_attribute_index_capacity = capacity;
+    tag_state->_attribute_index_length = 0;
+  }
+  for (; tag_state->_attribute_index_length < attributes->length;
+       ++tag_state->_attribute_index_length) {
+    index_attribute(tag_state, tag_state->_attribute_index_length);
+  }
+  unsigned int mask = tag_state->_attribute_index_capacity - 1;
+  for (unsigned int slot = hash_attribute_name(name, length) & mask;
+       tag_state->_attribute_index[slot]; slot = (slot + 1) & mask) {
+    unsigned int i = tag_state->_attribute_index[slot] - 1;
+    if (attribute_name_is(attributes->data[i], name, length)) {
+      return i;
+    }
+  }
+  return -1;
+}
+
 // Creates a new attribute in the current tag, copying the current tag buffer to
 // the attribute's name.  The attribute's value starts out as the empty string
 // (following the "Boolean attributes" section of the spec) and is only
@@ -778,16 +860,12 @@ static bool finish_attribute_name(GumboParser* parser) {
   assert(tag_state->_attributes.capacity);
 
   GumboVector* /* GumboAttribute* */ attributes = &tag_state->_attributes;
-  for (unsigned int i = 0; i < attributes->length; ++i) {
-    GumboAttribute* attr = attributes->data[i];
-    if (strlen(attr->name) == tag_state->_buffer.length &&
-        memcmp(attr->name, tag_state->_buffer.data,
-            tag_state->_buffer.length) == 0) {
-      // Identical attribute; bail.
-      add_duplicate_attr_error(parser, i, attributes->length);
-      tag_state->_drop_next_attr_value = true;
-      return false;
-    }
+  int duplicate = find_attribute(tag_state);
+  if (duplicate >= 0) {
+    // Identical attribute; bail.
+    add_duplicate_attr_error(parser, duplicate, attributes->length);
+    tag_state->_drop_next_attr_value = true;
+    return false;
   }
 
   GumboAttribute* attr = gumbo_malloc(sizeof(GumboAttribute));
@@ -842,6 +920,7 @@ void gumbo_tokenizer_state_init(
   tokenizer->_is_current_node_foreign = false;
   tokenizer->_is_in_cdata = false;
   tokenizer->_tag_state._last_start_tag = GUMBO_TAG_LAST;
+  tokenizer->_tag_state._attribute_index = NULL;
 
   tokenizer->_buffered_emit_char = kGumboNoChar;
   gumbo_string_buffer_init(&tokenizer->_temporary_buffer);
@@ -863,6 +942,7 @@ void gumbo_tokenizer_state_destroy(GumboParser* parser) {
   assert(tokenizer->_doc_type_state.system_identifier == NULL);
   gumbo_string_buffer_destroy(&tokenizer->_temporary_buffer);
   gumbo_string_buffer_destroy(&tokenizer->_script_data_buffer);
+  gumbo_free(tokenizer->_tag_state._attribute_index);
   gumbo_free(tokenizer);
 }
 
@@ -66,7 +66,9 @@ void* gumbo_vector_pop(GumboVector* vector) {
 }
 
 int gumbo_vector_index_of(GumboVector* vector, const void* element) {
-  for (unsigned int i = 0; i < vector->length; ++i) {
+  // Search from the end, as the parser mostly looks for recently added nodes
+  // in the stack of open elements and the list of active formatting elements.
+  for (int i = vector->length; --i >= 0;) {
     if (vector->data[i] == element) {
       return i;
     }
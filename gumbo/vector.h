@@ -50,6 +50,7 @@ void gumbo_vector_remove(const void* element, GumboVector* vector);
 // potentially O(N) time and should be used sparingly.
 void* gumbo_vector_remove_at(int index, GumboVector* vector);
 
+// Returns the index of the last occurrence of element in the vector, or -1.
 int gumbo_vector_index_of(GumboVector* vector, const void* element);
 
 void gumbo_vector_splice(
@@ -15,7 +15,7 @@ static inline libxml_doc*
 convert_tree(GumboOutput *output, Options *opts) {
     char *errmsg = NULL;
     libxml_doc *doc = NULL;
-    doc = convert_gumbo_tree_to_libxml_tree(output, opts, &errmsg);
+    doc = convert_gumbo_tree_to_libxml_tree(output, opts, true, &errmsg);
     return doc;
 }
 
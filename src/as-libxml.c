@@ -27,6 +27,7 @@ typedef struct {
     xmlNsPtr xlink, xml;
     xmlNodePtr root;
     bool maybe_xhtml, sanitize_names;
+    unsigned int intern_max_len;
     const char* errmsg;
     const xmlChar* standard_tags[GUMBO_TAG_LAST], *lang_attribute;
 } ParseData;
@@ -78,19 +79,62 @@ find_namespace_by_prefix(xmlDocPtr doc, xmlNodePtr node, xmlNodePtr xml_parent,
     return xmlSearchNs(doc, xml_parent, BAD_CAST prefix);
 }
 
+static inline xmlNodePtr
+new_interned_text(xmlDocPtr doc, const xmlChar *text, int len) {
+    // libxml2 knows not to free node content that belongs to the document
+    // dictionary, its own parser interns short text the same way.
+    const xmlChar *content = xmlDictLookup(doc->dict, text, len);
+    if (UNLIKELY(!content)) return NULL;
+    xmlNodePtr ans = xmlNewDocText(doc, NULL);
+    if (LIKELY(ans)) ans->content = (xmlChar*)content;
+    return ans;
+}
+
+static inline xmlAttrPtr
+new_interned_attribute(xmlDocPtr doc, xmlNodePtr node, xmlNsPtr ns, const xmlChar *name, const xmlChar *value, int len) {
+    xmlNodePtr text = new_interned_text(doc, value, len);
+    if (UNLIKELY(!text)) return NULL;
+    xmlAttrPtr ans = xmlNewNsPropEatName(node, ns, (xmlChar*)name, NULL);
+    if (UNLIKELY(!ans)) { xmlFreeNode(text); return NULL; }
+    ans->children = ans->last = text;
+    text->parent = (xmlNodePtr)ans;
+    return ans;
+}
+
+static inline size_t
+internable_length(ParseData *pd, const char *text) {
+    // Returns the length of text if it is short enough to be interned, otherwise
+    // intern_max_len
+    const char *end = memchr(text, 0, pd->intern_max_len);
+    return end ? (size_t)(end - text) : pd->intern_max_len;
+}
+
+static inline xmlAttrPtr
+new_attribute(xmlDocPtr doc, ParseData *pd, xmlNodePtr node, xmlNsPtr ns, const xmlChar *name, const char *value) {
+    // Attributes in the xml namespace are not interned as libxml2 only
+    // registers xml:id when the value is passed in.
+    if (pd->intern_max_len && (!ns || ns != pd->xml)) {
+        size_t len = internable_length(pd, value);
+        if (len < pd->intern_max_len) return new_interned_attribute(doc, node, ns, name, BAD_CAST value, (int)len);
+    }
+    return xmlNewNsPropEatName(node, ns, (xmlChar*)name, BAD_CAST value);
+}
+
 static GumboStringPiece REPROCESS = {"", 0};
 
 static inline bool
-create_attributes(xmlDocPtr doc, xmlNodePtr node, GumboElement *elem, xmlNodePtr xml_parent, bool reprocess, bool *needs_reprocess) {
+create_attributes(xmlDocPtr doc, xmlNodePtr node, GumboElement *elem, unsigned int first, xmlNodePtr xml_parent, bool reprocess, bool *needs_reprocess) {
     GumboAttribute* attr;
     const xmlChar *attr_name;
     const char *aname;
-    char buf[50] = {0};
+    char buf[50] = {0}, sbuf[256];
+    size_t aname_sz;
     ParseData *pd = (ParseData*)doc->_private;
     xmlNsPtr ns;
+    xmlAttrPtr existing, added, last = NULL;
     int added_lang = 0;
 
-    for (unsigned int i = 0; i < elem->attributes.length; ++i) {
+    for (unsigned int i = first; i < elem->attributes.length; ++i) {
         attr = elem->attributes.data[i];
         if (reprocess && attr->original_name.data != REPROCESS.data) continue;
         aname = attr->name;
@@ -163,18 +207,38 @@ create_attributes(xmlDocPtr doc, xmlNodePtr node, GumboElement *elem, xmlNodePtr
                         *needs_reprocess = true;
                         continue;
                     }
-                    *colon = '_';
+                    if (!pd->sanitize_names) {
+                        // Dont modify the gumbo tree, so it can be converted again
+                        aname_sz = MIN((size_t)(colon - aname) + strlen(colon), sizeof(sbuf) - 1);
+                        memcpy(sbuf, aname, aname_sz); sbuf[aname_sz] = 0;
+                        sbuf[colon - aname] = '_';
+                        aname = sbuf;
+                    }  // else the colon is replaced by sanitization
                 } else aname = colon + 1;
             }
         }
-        attr_name = xmlDictLookup(doc->dict, BAD_CAST aname, (pd->sanitize_names ? sanitize_name((char*)aname) : strlen(aname)));  // we deliberately discard const, for performance
+        if (pd->sanitize_names) aname = sanitized_name(aname, sbuf, sizeof(sbuf), &aname_sz);
+        else aname_sz = strlen(aname);
+        attr_name = xmlDictLookup(doc->dict, BAD_CAST aname, aname_sz);
         if (UNLIKELY(!attr_name)) return false;
         if (UNLIKELY(pd->maybe_xhtml && attr_name == pd->lang_attribute)) {
             if (added_lang == 2) continue;
             added_lang = 2;
             xmlSetNsProp(node, NULL, attr_name, BAD_CAST attr->value);
         } else {
-            if (UNLIKELY(!xmlNewNsPropEatName(node, ns, (xmlChar*)attr_name, BAD_CAST attr->value))) return false;
+            // libxml2 appends an attribute by walking the list of existing
+            // ones, which is quadratic for elements with very many attributes,
+            // so create it as the only attribute and link it after the last
+            existing = node->properties; node->properties = NULL;
+            added = new_attribute(doc, pd, node, ns, attr_name, attr->value);
+            node->properties = existing;
+            if (UNLIKELY(!added)) return false;
+            if (existing) {
+                // last is NULL or stale if attributes were added some other way
+                for (last = last ? last : existing; last->next; last = last->next);
+                last->next = added; added->prev = last;
+            } else node->properties = added;
+            last = added;
         }
     }
     return true;
@@ -258,9 +322,9 @@ create_element(xmlDocPtr doc, xmlNodePtr xml_parent, GumboNode *parent, GumboEle
     }
 
     bool needs_reprocess = false;
-    if (UNLIKELY(!create_attributes(doc, result, elem, xml_parent, false, &needs_reprocess))) ABORT;
+    if (UNLIKELY(!create_attributes(doc, result, elem, 0, xml_parent, false, &needs_reprocess))) ABORT;
     if (UNLIKELY(needs_reprocess)) {
-        if (UNLIKELY(!create_attributes(doc, result, elem, xml_parent, true, &needs_reprocess))) ABORT;
+        if (UNLIKELY(!create_attributes(doc, result, elem, 0, xml_parent, true, &needs_reprocess))) ABORT;
     }
     if (UNLIKELY(nsprefix)) {
         namespace = xmlSearchNs(doc, result, BAD_CAST nsprefix);
@@ -291,6 +355,10 @@ convert_node(xmlDocPtr doc, xmlNodePtr xml_parent, GumboNode* node, GumboElement
             break;
         case GUMBO_NODE_TEXT:
         case GUMBO_NODE_WHITESPACE:
+            if (pd->intern_max_len) {
+                size_t len = internable_length(pd, node->v.text.text);
+                if (len < pd->intern_max_len) { ans = new_interned_text(doc, BAD_CAST node->v.text.text, (int)len); break; }
+            }
             ans = xmlNewText(BAD_CAST node->v.text.text);
             break;
         case GUMBO_NODE_COMMENT:
@@ -312,15 +380,71 @@ convert_node(xmlDocPtr doc, xmlNodePtr xml_parent, GumboNode* node, GumboElement
     return ans;
 }
 
+// Shared dictionary {{{
+
+// A long lived dictionary pre-populated with the names of all standard tags
+// and attributes and some common attribute values. When the shared_dict option
+// is used, documents get a sub-dictionary of it, so they start out with all
+// these names already interned and do not need their own copies of them.
+static xmlDictPtr shared_dict = NULL;
+static const xmlChar* shared_standard_tags[GUMBO_TAG_LAST] = {0};
+
+static const char* COMMON_ATTR_VALUES[] = {
+    "_blank", "_self", "nofollow", "noopener", "noreferrer", "noopener noreferrer", "stylesheet", "icon",
+    "canonical", "alternate", "preload", "prefetch", "preconnect", "dns-prefetch", "manifest",
+    "text/css", "text/javascript", "application/javascript", "application/ld+json", "module", "javascript:void(0)", "#",
+    "viewport", "width=device-width, initial-scale=1", "width=device-width, initial-scale=1.0",
+    "utf-8", "UTF-8", "en", "en-US", "ltr", "rtl", "description", "keywords", "robots", "author",
+    "og:title", "og:description", "og:image", "og:url", "og:type", "og:site_name",
+    "twitter:card", "twitter:title", "twitter:description", "twitter:image",
+    "button", "submit", "reset", "hidden", "text", "checkbox", "radio", "email", "password", "search", "image",
+    "get", "post", "GET", "POST", "true", "false", "0", "1", "-1", "auto", "none", "lazy", "eager", "async",
+    "anonymous", "use-credentials", "presentation", "navigation", "dialog", "img", "main", "banner",
+    "contentinfo", "off", "on", "yes", "no", "left", "right", "center", "top", "middle", "bottom",
+    "display:none", "display: none", "clear", "clearfix", "container", "row", "active", "selected",
+    "disabled", "checked", "required", "readonly", "multiple", "defer",
+    NULL
+};
+
+bool
+init_shared_dict(void) {
+    // Must be called with the GIL held, or otherwise serialized. Once created
+    // the shared dictionary is never modified, so it is safe to create
+    // sub-dictionaries of it and look up names in it from multiple threads.
+    if (shared_dict) return true;
+    xmlDictPtr dict = xmlDictCreate();
+    if (!dict) return false;
+    for (int i = 0; i < GUMBO_TAG_UNKNOWN; i++) {
+        uint8_t sz;
+        const char *name = gumbo_normalized_tagname_and_size(i, &sz);
+        shared_standard_tags[i] = xmlDictLookup(dict, BAD_CAST name, sz);
+        if (!shared_standard_tags[i]) goto error;
+    }
+    for (int i = 0; i < HTML_ATTR_LAST; i++) {
+        if (!xmlDictLookup(dict, BAD_CAST ATTR_NAMES[i], -1)) goto error;
+    }
+    for (const char **x = COMMON_ATTR_VALUES; *x; x++) {
+        if (!xmlDictLookup(dict, BAD_CAST *x, -1)) goto error;
+    }
+    shared_dict = dict;
+    return true;
+error:
+    memset(shared_standard_tags, 0, sizeof(shared_standard_tags));
+    xmlDictFree(dict);
+    return false;
+}
+
+// }}}
+
 static inline xmlDocPtr
 alloc_doc(Options *opts) {
     xmlDocPtr doc = xmlNewDoc(BAD_CAST "1.0");
     if (doc) {
         if (!doc->dict) {
-            doc->dict = xmlDictCreate();
+            doc->dict = opts->shared_dict ? xmlDictCreateSub(shared_dict) : xmlDictCreate();
             if (doc->dict == NULL) {
                 xmlFreeDoc(doc);
-                doc = NULL;
+                return NULL;
             }
             opts->line_number_attr = xmlDictLookup(doc->dict, BAD_CAST opts->line_number_attr, -1);
         }
@@ -349,8 +473,78 @@ add_root_comments(ParseData *pd, GumboDocument *document, GumboNode *root) {
     return true;
 }
 
+static inline bool
+init_parse_data(xmlDocPtr doc, ParseData *pd, Options *opts) {
+    pd->maybe_xhtml = opts->gumbo_opts.use_xhtml_rules;
+    pd->sanitize_names = opts->sanitize_names;
+    pd->intern_max_len = opts->intern_max_len;
+    if (opts->shared_dict) memcpy(pd->standard_tags, shared_standard_tags, sizeof(pd->standard_tags));
+    doc->_private = (void*)pd;
+    pd->lang_attribute = xmlDictLookup(doc->dict, BAD_CAST "lang", 4);
+    return pd->lang_attribute != NULL;
+}
+
+static inline bool
+add_doctype(xmlDocPtr doc, GumboNode *document_node, Options *opts) {
+    GumboDocument* document = &(document_node->v.document);
+    if (opts->keep_doctype && document->has_doctype) {
+        if(!xmlCreateIntSubset(doc, BAD_CAST document->name, BAD_CAST document->public_identifier, BAD_CAST document->system_identifier)) return false;
+    }
+    return true;
+}
+
+// Freeing converted nodes {{{
+
+// When the caller does not need the gumbo tree after conversion, the nodes
+// are freed as soon as they have been converted, so that the gumbo tree and the
+// libxml2 tree are never both fully in memory. Nodes are converted depth first,
+// so a node that has no children is freed immediately after it is converted
+// and an element is freed once its last child has been freed. The root is
+// left to gumbo_destroy_output().
+
+static inline bool
+is_last_child(GumboNode *node) {
+    GumboVector *siblings = &(node->parent->v.element.children);
+    return siblings->data[siblings->length - 1] == node;
+}
+
+static inline void
+free_converted_node(GumboNode *node) {
+    GumboNode *parent;
+    bool last;
+    if (node->type == GUMBO_NODE_ELEMENT || node->type == GUMBO_NODE_TEMPLATE) {
+        if (node->v.element.children.length) return;
+    }
+    while (node->parent->type != GUMBO_NODE_DOCUMENT) {
+        parent = node->parent; last = is_last_child(node);
+        // The children of an element are already freed when it is freed
+        if (node->type == GUMBO_NODE_ELEMENT || node->type == GUMBO_NODE_TEMPLATE) node->v.element.children.length = 0;
+        gumbo_destroy_node(node);
+        if (!last) return;
+        node = parent;
+    }
+    node->v.element.children.length = 0;
+}
+
+static inline void
+forget_freed_nodes(GumboNode *node) {
+    // Remove the nodes that have been freed from the tree, so that
+    // gumbo_destroy_output() can free the rest after an error. node is the one
+    // being converted, the freed nodes are the siblings before it and before
+    // each of its ancestors.
+    for (; node->parent->type != GUMBO_NODE_DOCUMENT; node = node->parent) {
+        GumboVector *siblings = &(node->parent->v.element.children);
+        unsigned int i = 0;
+        while (siblings->data[i] != node) i++;
+        memmove(siblings->data, siblings->data + i, sizeof(void*) * (siblings->length - i));
+        siblings->length -= i;
+    }
+}
+
+// }}}
+
 libxml_doc*
-convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, char **errmsg) {
+convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, bool free_nodes, char **errmsg) {
 #define ABORT { ok = false; goto end; }
     xmlDocPtr doc = NULL;
     xmlNodePtr parent = NULL, child = NULL;
@@ -365,16 +559,8 @@ convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, char **err
     doc = alloc_doc(opts);
     if (doc == NULL) ABORT;
 
-    GumboDocument* document = &(output->document->v.document);
-    if (opts->keep_doctype && output->document->v.document.has_doctype) {
-        if(!xmlCreateIntSubset(doc, BAD_CAST document->name, BAD_CAST document->public_identifier, BAD_CAST document->system_identifier)) ABORT;
-    }
-
-    parse_data.maybe_xhtml = opts->gumbo_opts.use_xhtml_rules;
-    parse_data.sanitize_names = opts->sanitize_names;
-    doc->_private = (void*)&parse_data;
-    parse_data.lang_attribute = xmlDictLookup(doc->dict, BAD_CAST "lang", 4);
-    if (!parse_data.lang_attribute) ABORT;
+    if (!add_doctype(doc, output->document, opts)) ABORT;
+    if (!init_parse_data(doc, &parse_data, opts)) ABORT;
     while(stack->length > 0) {
         Stack_pop(stack, &gumbo, &parent);
         child = convert_node(doc, parent, gumbo, &elem, opts);
@@ -385,7 +571,8 @@ convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, char **err
         if (elem != NULL) {
             if (!push_children(child, elem, stack)) ABORT;
         }
-
+        if (free_nodes) free_converted_node(gumbo);
+        gumbo = NULL;
     }
     if (parse_data.maybe_xhtml) {
         // Add xml:lang to the root element if it has lang
@@ -399,22 +586,598 @@ convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, char **err
 
     xmlDocSetRootElement(doc, parse_data.root);
     // Add any comments that are outside the root element
-    if (!add_root_comments(&parse_data, document, root)) ABORT;
+    if (!add_root_comments(&parse_data, &(output->document->v.document), root)) ABORT;
 #undef ABORT
 end:
     if (doc) doc->_private = NULL;
     Stack_free(stack);
     *errmsg = (char*)parse_data.errmsg;
+    if (!ok && free_nodes && gumbo) forget_freed_nodes(gumbo);
     if(!ok) { if (parse_data.root) xmlFreeNode(parse_data.root); if (doc) xmlFreeDoc(doc); doc = NULL; }
     return doc;
 }
 
+// Single pass conversion {{{
+
+// Builds the libxml2 tree while gumbo is parsing, by mirroring every change
+// gumbo makes to its parse tree, instead of walking the finished parse tree.
+// The libxml2 node of a gumbo element is stored in its user_data. Since the
+// namespace of an element depends on its parent, an element is only converted
+// once its parent is in the tree, so the elements the adoption agency
+// algorithm assembles outside the tree are converted when they are inserted
+// into it. Text is converted as soon as it is inserted, and gumbo then frees
+// its copy, and gumbo frees the closed parts of its parse tree as parsing
+// proceeds, so the document is never held twice in memory.
+
+typedef struct {
+    xmlDocPtr doc;
+    Options *opts;
+    ParseData pd;
+    Stack *stack;
+    bool ok;
+} SinglePass;
+
+static inline bool
+is_element(GumboNode *node) {
+    return node->type == GUMBO_NODE_ELEMENT || node->type == GUMBO_NODE_TEMPLATE;
+}
+
+static inline void
+replace_namespace(xmlNodePtr root, xmlNsPtr old, xmlNsPtr ns) {
+    // Elements using the namespace old are root and a connected set of its
+    // descendants, as elements use the namespace of their parent, unless they
+    // declare their own
+    xmlNodePtr n = root->children;
+    root->ns = ns;
+    while (n) {
+        if (n->type == XML_ELEMENT_NODE && n->ns == old) {
+            n->ns = ns;
+            if (n->children) { n = n->children; continue; }
+        }
+        while (!n->next) { n = n->parent; if (n == root) return; }
+        n = n->next;
+    }
+}
+
+static void
+fix_moved_namespace(SinglePass *sp, xmlNodePtr x) {
+    // An element keeps the namespace it was converted with when the adoption
+    // agency algorithm moves it, correct it for its new parent. Works on the
+    // libxml2 tree only, as gumbo may have freed the moved nodes.
+    xmlNsPtr old = x->ns, ns, *def;
+    if (!sp->opts->namespace_elements) return;
+    for (def = &(x->nsDef); *def && (*def)->prefix; def = &((*def)->next));
+    if (!xmlStrEqual(old->href, x->parent->ns->href)) {
+        if (*def) return;
+        ns = xmlNewNs(x, old->href, NULL);
+        if (UNLIKELY(!ns)) { sp->ok = false; return; }
+    } else {
+        ns = x->parent->ns;
+        if (ns == old) return;
+    }
+    replace_namespace(x, old, ns);
+    if (*def && *def == old) {
+        *def = old->next;
+        xmlFreeNs(old);
+    }
+}
+
+static xmlNodePtr
+convert_subtree(SinglePass *sp, GumboNode *node, GumboNode *parent, xmlNodePtr xml_parent) {
+    // Converts node and those of its descendants that have not been
+    // converted already, returns the unlinked libxml2 node for node
+    xmlNodePtr ans, child, x;
+    GumboNode *gumbo;
+    GumboElement *elem;
+    if (!is_element(node)) return convert_node(sp->doc, xml_parent, node, &elem, sp->opts);
+    ans = create_element(sp->doc, xml_parent, parent, &node->v.element, sp->opts);
+    if (UNLIKELY(!ans)) return NULL;
+    node->user_data = ans;
+    if (UNLIKELY(!push_children(ans, &node->v.element, sp->stack))) goto error;
+    while (sp->stack->length > 0) {
+        Stack_pop(sp->stack, &gumbo, &x);
+        // Elements that were converted before being moved here by the
+        // adoption agency algorithm
+        if (gumbo->user_data) { child = gumbo->user_data; elem = NULL; }
+        else {
+            child = convert_node(sp->doc, x, gumbo, &elem, sp->opts);
+            if (UNLIKELY(!child)) goto error;
+            if (elem) gumbo->user_data = child;
+        }
+        if (UNLIKELY(!xmlAddChild(x, child))) { if (!elem && !gumbo->user_data) xmlFreeNode(child); goto error; }
+        if (elem) { if (UNLIKELY(!push_children(child, elem, sp->stack))) goto error; }
+        else if (gumbo->user_data) fix_moved_namespace(sp, child);
+    }
+    return ans;
+error:
+    sp->stack->length = 0;
+    return NULL;
+}
+
+static inline xmlNodePtr
+add_before(xmlNodePtr next, xmlNodePtr x) {
+    // xmlAddPrevSibling() only merges text with adjacent text when next is
+    // itself text, xmlAddChild() always does
+    xmlNodePtr prev = next->prev;
+    if (x->type == XML_TEXT_NODE && prev && prev->type == XML_TEXT_NODE && prev->name == x->name) {
+        xmlNodeAddContent(prev, x->content);
+        xmlFreeNode(x);
+        return prev;
+    }
+    return xmlAddPrevSibling(next, x);
+}
+
+static bool
+single_pass_node_inserted(void *data, GumboNode *node) {
+    SinglePass *sp = (SinglePass*)data;
+    GumboNode *parent = node->parent;
+    xmlNodePtr x, xml_parent, added;
+    if (UNLIKELY(!sp->ok)) return false;
+    if (parent->type == GUMBO_NODE_DOCUMENT) {
+        // Comments outside the root element are added when parsing is done
+        if (is_element(node)) sp->ok = (sp->pd.root = convert_subtree(sp, node, parent, NULL)) != NULL;
+        return false;
+    }
+    xml_parent = parent->user_data;
+    // Converted along with its parent, when that is inserted into the tree
+    if (!xml_parent) return false;
+    x = node->user_data;
+    bool moved = x != NULL;
+    if (!x && UNLIKELY(!(x = convert_subtree(sp, node, parent, xml_parent)))) { sp->ok = false; return false; }
+    GumboVector *siblings = &parent->v.element.children;
+    if (node->index_within_parent + 1 < siblings->length) {
+        // Foster parenting, which inserts before a table
+        GumboNode *next = siblings->data[node->index_within_parent + 1];
+        added = next->user_data ? add_before(next->user_data, x) : NULL;
+    } else added = xmlAddChild(xml_parent, x);
+    if (UNLIKELY(!added)) {
+        if (!is_element(node)) xmlFreeNode(x);
+        sp->ok = false;
+        return false;
+    }
+    if (moved) fix_moved_namespace(sp, x);
+    return true;
+}
+
+static void
+drop_unused_xlink_ns(SinglePass *sp) {
+    // The xlink namespace is declared on the root when it is first used, which
+    // it would not be when converting the final parse tree, if all the nodes
+    // using it have been destroyed
+    xmlNsPtr ns = sp->pd.xlink, *def;
+    xmlNodePtr root = sp->pd.root, n = root;
+    if (!ns || !root) return;
+    while (n) {
+        if (n->type == XML_ELEMENT_NODE) {
+            for (xmlAttrPtr a = n->properties; a; a = a->next) { if (a->ns == ns) return; }
+            if (n->children) { n = n->children; continue; }
+        }
+        while (n != root && !n->next) n = n->parent;
+        n = n == root ? NULL : n->next;
+    }
+    for (def = &(root->nsDef); *def; def = &((*def)->next)) {
+        if (*def == ns) {
+            *def = ns->next;
+            xmlFreeNs(ns);
+            sp->pd.xlink = NULL;
+            return;
+        }
+    }
+}
+
+static void
+single_pass_node_removed(void *data, GumboNode *node, bool destroyed) {
+    // Done even after an error, so that the nodes removed from the tree can be
+    // found and freed
+    xmlNodePtr x = node->user_data, prev, next;
+    if (!x) return;
+    prev = x->prev; next = x->next;
+    xmlUnlinkNode(x);
+    // Text on either side of the node is now adjacent, which would be a single
+    // text node when converting the final parse tree
+    if (prev && next && prev->type == XML_TEXT_NODE && next->type == XML_TEXT_NODE) xmlTextMerge(prev, next);
+    if (destroyed) {
+        xmlFreeNode(x); node->user_data = NULL;
+        drop_unused_xlink_ns((SinglePass*)data);
+    }
+}
+
+static void
+single_pass_children_moved(void *data, GumboNode *from, GumboNode *to) {
+    // to is appended to from next, convert it now, so that the converted
+    // children of from can be moved to it
+    SinglePass *sp = (SinglePass*)data;
+    xmlNodePtr xfrom = from->user_data, xto, child;
+    if (UNLIKELY(!sp->ok) || !xfrom) return;
+    xto = create_element(sp->doc, xfrom, from, &to->v.element, sp->opts);
+    if (UNLIKELY(!xto)) { sp->ok = false; return; }
+    to->user_data = xto;
+    while ((child = xfrom->children)) {
+        xmlUnlinkNode(child);
+        xmlAddChild(xto, child);
+    }
+    for (child = xto->children; child; child = child->next) {
+        if (child->type == XML_ELEMENT_NODE) fix_moved_namespace(sp, child);
+    }
+}
+
+static void
+single_pass_attributes_added(void *data, GumboNode *node, unsigned int first) {
+    SinglePass *sp = (SinglePass*)data;
+    xmlNodePtr x = node->user_data;
+    bool needs_reprocess = false;
+    if (UNLIKELY(!sp->ok) || !x) return;
+    if (UNLIKELY(!create_attributes(sp->doc, x, &node->v.element, first, x->parent, false, &needs_reprocess))) sp->ok = false;
+}
+
+static bool
+single_pass_element_closed(void *data, GumboNode UNUSED *node) {
+    // Everything is converted by the time an element is closed, so gumbo can
+    // free what it does not need. After an error, the parse tree is kept, to
+    // find the nodes to free.
+    return ((SinglePass*)data)->ok;
+}
+
+static void
+free_unlinked_nodes(SinglePass *sp, GumboNode *document) {
+    // After an error, nodes removed from the libxml2 tree may not have been
+    // inserted again, free them
+    xmlNodePtr *unlinked = NULL, x;
+    size_t count = 0, capacity = 0;
+    GumboNode *node;
+    GumboVector *children;
+    sp->stack->length = 0;
+    if (!Stack_push(sp->stack, document, NULL)) return;
+    while (sp->stack->length > 0) {
+        Stack_pop(sp->stack, &node, &x);
+        x = node->user_data;
+        if (x && !x->parent && x != sp->pd.root) {
+            if (count >= capacity) {
+                capacity = MAX(16, 2 * capacity);
+                unlinked = safe_realloc(unlinked, capacity * sizeof(xmlNodePtr));
+                if (!unlinked) break;
+            }
+            unlinked[count++] = x;
+        }
+        children = node->type == GUMBO_NODE_DOCUMENT ? &node->v.document.children : (is_element(node) ? &node->v.element.children : NULL);
+        for (unsigned int i = 0; children && i < children->length; i++) {
+            if (!Stack_push(sp->stack, children->data[i], NULL)) break;
+        }
+    }
+    sp->stack->length = 0;
+    for (size_t i = 0; unlinked && i < count; i++) xmlFreeNode(unlinked[i]);
+    free(unlinked);
+}
+
+libxml_doc*
+parse_to_libxml_tree(const char *buffer, size_t length, GumboTag context, GumboNamespaceEnum context_namespace, Options *opts, char **errmsg) {
+    SinglePass sp = {0};
+    GumboOutput *output = NULL;
+    GumboTreeObserver observer = {
+        single_pass_node_inserted, single_pass_node_removed, single_pass_children_moved, single_pass_attributes_added,
+        single_pass_element_closed, &sp};
+    *errmsg = NULL;
+    sp.opts = opts; sp.ok = true;
+    sp.doc = alloc_doc(opts);
+    if (!sp.doc) return NULL;
+    sp.stack = Stack_alloc(opts->stack_size);
+    if (!sp.stack || !init_parse_data(sp.doc, &sp.pd, opts)) goto error;
+    opts->gumbo_opts.tree_observer = &observer;
+    output = gumbo_parse_fragment(&(opts->gumbo_opts), buffer, length, context, context_namespace);
+    opts->gumbo_opts.tree_observer = NULL;
+    if (!output || !sp.ok || !sp.pd.root || !add_doctype(sp.doc, output->document, opts)) goto error;
+    xmlDocSetRootElement(sp.doc, sp.pd.root);
+    if (!add_root_comments(&sp.pd, &(output->document->v.document), output->root)) goto error;
+    gumbo_destroy_output(output);
+    Stack_free(sp.stack);
+    sp.doc->_private = NULL;
+    return sp.doc;
+error:
+    if (output) {
+        if (sp.stack) free_unlinked_nodes(&sp, output->document);
+        gumbo_destroy_output(output);
+    }
+    if (sp.pd.root && sp.pd.root->parent != (xmlNodePtr)sp.doc) xmlFreeNode(sp.pd.root);
+    Stack_free(sp.stack);
+    *errmsg = (char*)sp.pd.errmsg;
+    sp.doc->_private = NULL;
+    xmlFreeDoc(sp.doc);
+    return NULL;
+}
+
+// }}}
+
 libxml_doc*
 copy_libxml_doc(libxml_doc* doc) { return xmlCopyDoc(doc, 1); }
 
+static inline bool
+is_lxml_element(xmlNodePtr node) {
+    // The node types that lxml exposes as children of an element
+    switch (node->type) {
+        case XML_ELEMENT_NODE:
+        case XML_COMMENT_NODE:
+        case XML_PI_NODE:
+        case XML_ENTITY_REF_NODE:
+            return true;
+        default:
+            return false;
+    }
+}
+
+static inline xmlNodePtr
+find_subtree(xmlDocPtr doc, const unsigned int *path, size_t path_len) {
+    xmlNodePtr node = xmlDocGetRootElement(doc);
+    for (size_t i = 0; node && i < path_len; i++) {
+        unsigned int idx = path[i];
+        for (node = node->children; node; node = node->next) {
+            if (is_lxml_element(node) && idx-- == 0) break;
+        }
+    }
+    return (node && node->type == XML_ELEMENT_NODE) ? node : NULL;
+}
+
+// Cloning {{{
+
+#undef Item1
+#undef Item2
+#undef StackItemClass
+#undef StackClass
+#define Item1 xmlNodePtr
+#define Item2 xmlNodePtr
+#define StackItemClass CloneStackItem
+#define StackClass CloneStack
+#include "stack.h"
+
+typedef struct {
+    xmlDocPtr src, doc;
+    xmlNodePtr root;
+    xmlNsPtr *ns_map;  // pairs of (source namespace, cloned namespace)
+    size_t ns_count, ns_capacity;
+    const xmlChar *name_cache[256][2];  // (source name, cloned name), keyed on the source pointer
+} CloneData;
+
+static inline xmlDocPtr
+new_doc_sharing_dict(xmlDocPtr src) {
+    xmlDocPtr doc = xmlNewDoc(src->version ? src->version : BAD_CAST "1.0");
+    if (!doc) return NULL;
+    // The clone interns names in a sub-dictionary of the source document's
+    // dictionary, so names already in the source can be shared, not copied.
+    if (doc->dict) xmlDictFree(doc->dict);
+    doc->dict = src->dict ? xmlDictCreateSub(src->dict) : xmlDictCreate();
+    if (!doc->dict) { xmlFreeDoc(doc); return NULL; }
+    doc->standalone = src->standalone;
+    doc->charset = src->charset;
+    doc->properties = src->properties;
+    doc->parseFlags = src->parseFlags;
+    if (src->encoding) doc->encoding = xmlStrdup(src->encoding);
+    if (src->URL) doc->URL = xmlStrdup(src->URL);
+    return doc;
+}
+
+static inline const xmlChar*
+shared_name(CloneData *c, const xmlChar *name) {
+    // Looking up in the sub-dictionary returns the parent's pointer for names
+    // the parent already has, so those are shared. Dictionary lookups only
+    // ever go one level up, so we must not reuse source pointers directly, as
+    // the source dictionary may itself be a sub-dictionary.
+    const xmlChar **entry = c->name_cache[((uintptr_t)name >> 3) & 255];
+    if (LIKELY(entry[0] == name)) return entry[1];
+    const xmlChar *ans = xmlDictLookup(c->doc->dict, name, -1);
+    if (LIKELY(ans)) { entry[0] = name; entry[1] = ans; }
+    return ans;
+}
+
+static inline bool
+is_interned(CloneData *c, const xmlChar *text) {
+    return text && c->src->dict && xmlDictOwns(c->src->dict, text) == 1;
+}
+
+static inline bool
+add_ns_mapping(CloneData *c, xmlNsPtr src, xmlNsPtr clone) {
+    if (c->ns_count >= c->ns_capacity) {
+        c->ns_capacity = MAX(8, 2 * c->ns_capacity);
+        c->ns_map = safe_realloc(c->ns_map, 2 * c->ns_capacity * sizeof(xmlNsPtr));
+        if (!c->ns_map) return false;
+    }
+    c->ns_map[2 * c->ns_count] = src; c->ns_map[2 * c->ns_count + 1] = clone;
+    c->ns_count++;
+    return true;
+}
+
+static inline xmlNsPtr
+clone_ns(CloneData *c, xmlNodePtr node, xmlNsPtr ns) {
+    for (size_t i = c->ns_count; i > 0; i--) {
+        if (c->ns_map[2 * (i - 1)] == ns) return c->ns_map[2 * (i - 1) + 1];
+    }
+    // The namespace is declared outside the cloned subtree (or is the
+    // implicit xml namespace), so declare it on the root of the clone.
+    xmlNsPtr ans = xmlSearchNs(c->doc, node, ns->prefix);
+    if (ans && xmlStrEqual(ans->href, ns->href)) return ans;
+    ans = xmlNewNs(c->root, ns->href, ns->prefix);
+    if (!ans) ans = xmlSearchNsByHref(c->doc, node, ns->href);
+    if (ans && !add_ns_mapping(c, ns, ans)) return NULL;
+    return ans;
+}
+
+static inline bool
+clone_attributes(CloneData *c, xmlNodePtr src, xmlNodePtr node) {
+    for (xmlAttrPtr a = src->properties; a; a = a->next) {
+        xmlNsPtr ns = NULL;
+        xmlChar *allocated = NULL;
+        const xmlChar *value = NULL;
+        if (a->ns) {
+            ns = clone_ns(c, node, a->ns);
+            if (UNLIKELY(!ns)) return false;
+        }
+        if (LIKELY(a->children && !a->children->next && a->children->type == XML_TEXT_NODE)) {
+            value = a->children->content;
+            if (is_interned(c, value)) {
+                if (UNLIKELY(!new_interned_attribute(c->doc, node, ns, shared_name(c, a->name), value, -1))) return false;
+                continue;
+            }
+        } else if (a->children) {
+            value = allocated = xmlNodeListGetString(c->src, a->children, 1);
+            if (UNLIKELY(!value)) return false;
+        }
+        xmlAttrPtr prop = xmlNewNsPropEatName(node, ns, (xmlChar*)shared_name(c, a->name), value);
+        xmlFree(allocated);
+        if (UNLIKELY(!prop)) return false;
+    }
+    return true;
+}
+
+static inline xmlNodePtr
+clone_element(CloneData *c, xmlNodePtr src, xmlNodePtr parent) {
+    const xmlChar *name = shared_name(c, src->name);
+    if (UNLIKELY(!name)) return NULL;
+    xmlNodePtr node = xmlNewDocNodeEatName(c->doc, NULL, (xmlChar*)name, NULL);
+    if (UNLIKELY(!node)) return NULL;
+    if (parent) {
+        if (UNLIKELY(!xmlAddChild(parent, node))) { xmlFreeNode(node); return NULL; }
+    } else c->root = node;
+    for (xmlNsPtr ns = src->nsDef; ns; ns = ns->next) {
+        xmlNsPtr clone = xmlNewNs(node, ns->href, ns->prefix);
+        if (UNLIKELY(!clone || !add_ns_mapping(c, ns, clone))) goto error;
+    }
+    if (src->ns) {
+        xmlNsPtr ns = clone_ns(c, node, src->ns);
+        if (UNLIKELY(!ns)) goto error;
+        xmlSetNs(node, ns);
+    }
+    if (UNLIKELY(!clone_attributes(c, src, node))) goto error;
+    return node;
+error:
+    if (!parent) { xmlFreeNode(node); c->root = NULL; }
+    return NULL;
+}
+
+static inline xmlNodePtr
+clone_node(CloneData *c, xmlNodePtr src, xmlNodePtr parent) {
+    xmlNodePtr node = NULL;
+    switch (src->type) {
+        case XML_ELEMENT_NODE:
+            node = clone_element(c, src, parent);
+            if (node) node->line = src->line;
+            return node;
+        case XML_TEXT_NODE:
+            node = is_interned(c, src->content) ? new_interned_text(c->doc, src->content, -1) : xmlNewDocText(c->doc, src->content);
+            break;
+        case XML_COMMENT_NODE:
+            node = xmlNewDocComment(c->doc, src->content);
+            break;
+        case XML_CDATA_SECTION_NODE:
+            node = xmlNewCDataBlock(c->doc, src->content, xmlStrlen(src->content));
+            break;
+        default:
+            node = xmlDocCopyNode(src, c->doc, 1);
+            break;
+    }
+    if (UNLIKELY(!node)) return NULL;
+    node->line = src->line;
+    if (parent && UNLIKELY(!xmlAddChild(parent, node))) { xmlFreeNode(node); return NULL; }
+    return node;
+}
+
+static xmlNodePtr
+clone_tree(CloneData *c, xmlNodePtr src) {
+    xmlNodePtr ans, parent, child;
+    ans = clone_node(c, src, NULL);
+    if (!ans || src->type != XML_ELEMENT_NODE || !src->children) return ans;
+    CloneStack *stack = CloneStack_alloc(64);
+    if (!stack) goto error;
+    for (child = src->last; child; child = child->prev) {
+        if (UNLIKELY(!CloneStack_push(stack, child, ans))) goto error;
+    }
+    while (stack->length > 0) {
+        CloneStack_pop(stack, &src, &parent);
+        child = clone_node(c, src, parent);
+        if (UNLIKELY(!child)) goto error;
+        if (src->type == XML_ELEMENT_NODE) {
+            for (xmlNodePtr x = src->last; x; x = x->prev) {
+                if (UNLIKELY(!CloneStack_push(stack, x, child))) goto error;
+            }
+        }
+    }
+    CloneStack_free(stack);
+    return ans;
+error:
+    CloneStack_free(stack);
+    xmlFreeNode(ans);
+    return NULL;
+}
+
+libxml_doc*
+clone_libxml_doc(libxml_doc* vsrc, const unsigned int *subtree, size_t subtree_len, const char **errmsg) {
+    CloneData c = {0};
+    xmlNodePtr node, copy;
+    c.src = vsrc;
+    *errmsg = NULL;
+    if (subtree) {
+        node = find_subtree(c.src, subtree, subtree_len);
+        if (!node) { *errmsg = "No element found at the specified subtree path"; return NULL; }
+        c.doc = new_doc_sharing_dict(c.src);
+        if (!c.doc) return NULL;
+        copy = clone_tree(&c, node);
+        if (!copy) goto error;
+        xmlDocSetRootElement(c.doc, copy);
+        goto end;
+    }
+    c.doc = new_doc_sharing_dict(c.src);
+    if (!c.doc) return NULL;
+    for (node = c.src->children; node; node = node->next) {
+        if (node->type == XML_DTD_NODE) {
+            if ((xmlDtdPtr)node != c.src->intSubset || c.doc->intSubset) continue;
+            c.doc->intSubset = xmlCopyDtd(c.src->intSubset);
+            if (!c.doc->intSubset) goto error;
+            // xmlAddChild() sets the parent, and ignores nodes that already have it set
+            xmlSetTreeDoc((xmlNodePtr)c.doc->intSubset, c.doc);
+            copy = (xmlNodePtr)c.doc->intSubset;
+        } else {
+            copy = clone_tree(&c, node);
+            if (!copy) goto error;
+        }
+        if (!xmlAddChild((xmlNodePtr)c.doc, copy)) {
+            if (copy == (xmlNodePtr)c.doc->intSubset) c.doc->intSubset = NULL;
+            xmlFreeNode(copy);
+            goto error;
+        }
+    }
+end:
+    free(c.ns_map);
+    return c.doc;
+error:
+    free(c.ns_map);
+    xmlFreeDoc(c.doc);
+    return NULL;
+}
+
+// }}}
+
 libxml_doc
 free_libxml_doc(libxml_doc* doc) { xmlFreeDoc(doc); }
 
+void
+count_libxml_nodes(libxml_doc *doc, ParseStats *stats) {
+    xmlNodePtr node = xmlDocGetRootElement((xmlDocPtr)doc), root = node;
+    while (node) {
+        switch (node->type) {
+            case XML_ELEMENT_NODE:
+                stats->elements++;
+                for (xmlAttrPtr attr = node->properties; attr; attr = attr->next) stats->attributes++;
+                break;
+            case XML_TEXT_NODE:
+            case XML_CDATA_SECTION_NODE:
+                stats->text_nodes++;
+                break;
+            default:
+                break;
+        }
+        if (node->type == XML_ELEMENT_NODE && node->children) { node = node->children; continue; }
+        while (node != root && !node->next) node = node->parent;
+        node = node == root ? NULL : node->next;
+    }
+}
+
 int
 get_libxml_version(void) {
     return atoi(xmlParserVersion);
@@ -7,10 +7,15 @@
 #pragma once
 
 #include "data-types.h"
+#include "parse-stats.h"
 
 typedef void libxml_doc;
 
 libxml_doc* copy_libxml_doc(libxml_doc* doc);
+libxml_doc* clone_libxml_doc(libxml_doc* doc, const unsigned int *subtree, size_t subtree_len, const char **errmsg);
 libxml_doc free_libxml_doc(libxml_doc* doc);
 int get_libxml_version(void);
-libxml_doc* convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, char **errmsg);
+void count_libxml_nodes(libxml_doc *doc, ParseStats *stats);
+bool init_shared_dict(void);
+libxml_doc* convert_gumbo_tree_to_libxml_tree(GumboOutput *output, Options *opts, bool free_nodes, char **errmsg);
+libxml_doc* parse_to_libxml_tree(const char *buffer, size_t length, GumboTag context, GumboNamespaceEnum context_namespace, Options *opts, char **errmsg);
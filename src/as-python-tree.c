@@ -4,6 +4,7 @@
  *
  * Distributed under terms of the GPL3 license.
  */
+#define NEEDS_SANITIZE_NAME 1
 #include "as-python-tree.h"
 
 // Stack {{{
@@ -65,6 +66,129 @@ set_known_tag_names(PyObject *val, PyObject *attr_val) {
 }
 
 
+// Strings {{{
+
+// Unknown tag and attribute names and short attribute values and text are
+// interned in a per parse table, so repeated strings are decoded only once.
+#define MAX_INTERNED_SZ 32
+#define MAX_INTERNED_COUNT (64 * 1024)
+
+typedef struct {
+    const char *key;
+    Py_ssize_t len;
+    uint32_t hash;
+    PyObject *val;
+} InternEntry;
+
+typedef struct {
+    InternEntry *entries;
+    size_t capacity, count;
+} InternTable;
+
+static inline bool
+scan_string(const char *s, size_t *len) {
+    // Returns true if s is pure ASCII, setting len to its length
+    const char *p = s;
+    unsigned char seen = 0;
+    while (*p) seen |= (unsigned char)*(p++);
+    *len = p - s;
+    return seen < 0x80;
+}
+
+static inline bool
+is_ascii(const char *s, size_t len) {
+    unsigned char seen = 0;
+    for (size_t i = 0; i < len; i++) seen |= (unsigned char)s[i];
+    return seen < 0x80;
+}
+
+static inline PyObject*
+new_string(const char *s, size_t len, bool ascii) {
+    if (LIKELY(ascii)) {
+        PyObject *ans = PyUnicode_New(len, 127);
+        if (LIKELY(ans)) memcpy(PyUnicode_1BYTE_DATA(ans), s, len);
+        return ans;
+    }
+    return PyUnicode_DecodeUTF8(s, len, NULL);
+}
+
+static void
+free_intern_table(InternTable *t) {
+    for (size_t i = 0; i < t->capacity; i++) Py_XDECREF(t->entries[i].val);
+    free(t->entries);
+    t->entries = NULL; t->capacity = 0; t->count = 0;
+}
+
+static inline bool
+grow_intern_table(InternTable *t) {
+    size_t capacity = MAX(256u, 2 * t->capacity);
+    InternEntry *entries = calloc(capacity, sizeof(InternEntry));
+    if (!entries) return false;
+    for (size_t i = 0; i < t->capacity; i++) {
+        if (t->entries[i].val) {
+            size_t idx = t->entries[i].hash & (capacity - 1);
+            while (entries[idx].val) idx = (idx + 1) & (capacity - 1);
+            entries[idx] = t->entries[i];
+        }
+    }
+    free(t->entries);
+    t->entries = entries; t->capacity = capacity;
+    return true;
+}
+
+static inline PyObject*
+interned_string(InternTable *t, const char *s, size_t len, bool ascii) {
+    uint32_t hash = 2166136261u;
+    for (size_t i = 0; i < len; i++) { hash ^= (unsigned char)s[i]; hash *= 16777619u; }
+    if (UNLIKELY(2 * t->count >= t->capacity)) {
+        if (t->count >= MAX_INTERNED_COUNT) return new_string(s, len, ascii);
+        if (!grow_intern_table(t)) return PyErr_NoMemory();
+    }
+    size_t idx = hash & (t->capacity - 1);
+    InternEntry *e;
+    while ((e = t->entries + idx)->val) {
+        if (e->hash == hash && (size_t)e->len == len && memcmp(e->key, s, len) == 0) {
+            Py_INCREF(e->val);
+            return e->val;
+        }
+        idx = (idx + 1) & (t->capacity - 1);
+    }
+    PyObject *ans = new_string(s, len, ascii);
+    if (UNLIKELY(!ans)) return NULL;
+    // For ASCII strings this is the string data itself, for others the
+    // UTF-8 representation is cached in the string object
+    e->key = PyUnicode_AsUTF8AndSize(ans, &e->len);
+    if (UNLIKELY(!e->key)) { Py_DECREF(ans); return NULL; }
+    e->hash = hash; e->val = ans; t->count++;
+    Py_INCREF(ans);
+    return ans;
+}
+
+static inline PyObject*
+text_string(InternTable *t, const char *s) {
+    size_t len;
+    bool ascii = scan_string(s, &len);
+    if (len <= MAX_INTERNED_SZ) return interned_string(t, s, len, ascii);
+    return new_string(s, len, ascii);
+}
+
+static inline PyObject*
+name_string(InternTable *t, const char *s, size_t len) {
+    return interned_string(t, s, len, is_ascii(s, len));
+}
+
+// }}}
+
+static inline PyObject*
+call_function(PyObject *func, PyObject *a, PyObject *b) {
+#if PY_VERSION_HEX >= 0x03090000
+    PyObject *args[2] = {a, b};
+    return PyObject_Vectorcall(func, args, b ? 2 : 1, NULL);
+#else
+    return PyObject_CallFunctionObjArgs(func, a, b, NULL);
+#endif
+}
+
 static inline bool
 push_children(PyObject *parent, GumboElement *elem, Stack *stack) {
     for (int i = elem->children.length - 1; i >= 0; i--) {
@@ -74,22 +198,90 @@ push_children(PyObject *parent, GumboElement *elem, Stack *stack) {
 }
 
 
+// List attributes {{{
+
+// bs4 splits the values of some attributes, such as class, into lists. The
+// attributes are specified as a dict mapping tag names (or * for all tags) to
+// sets of attribute names. Known tags and attributes are looked up in bitsets,
+// anything else in the dict itself.
+#define ATTR_SET_SZ ((HTML_ATTR_LAST + 7) / 8)
+#define IN_ATTR_SET(set, anum) ((set)[(anum) >> 3] & (1 << ((anum) & 7)))
+
+typedef struct {
+    unsigned char universal[ATTR_SET_SZ], tags[GUMBO_TAG_UNKNOWN][ATTR_SET_SZ];
+    PyObject *map, *universal_names;
+} ListAttributes;
+
+static ListAttributes*
+alloc_list_attributes(PyObject *map) {
+    PyObject *key, *names, *name, *iterator;
+    Py_ssize_t pos = 0, sz;
+    const char *raw;
+    ListAttributes *ans = calloc(1, sizeof(ListAttributes));
+    if (!ans) return (ListAttributes*)PyErr_NoMemory();
+    ans->map = map;
+    while (PyDict_Next(map, &pos, &key, &names)) {
+        unsigned char *set = NULL;
+        if (!PyUnicode_Check(key) || !(raw = PyUnicode_AsUTF8AndSize(key, &sz))) continue;
+        if (sz == 1 && raw[0] == '*') { set = ans->universal; ans->universal_names = names; }
+        else {
+            GumboTag tag = gumbo_tagn_enum(raw, sz);
+            if (tag < GUMBO_TAG_UNKNOWN) set = ans->tags[tag];
+        }
+        if (!set) continue;
+        if (!(iterator = PyObject_GetIter(names))) goto error;
+        while ((name = PyIter_Next(iterator))) {
+            if (PyUnicode_Check(name) && (raw = PyUnicode_AsUTF8AndSize(name, &sz))) {
+                HTMLAttr anum = attr_num(raw, sz);
+                if (anum < HTML_ATTR_LAST) set[anum >> 3] |= 1 << (anum & 7);
+            }
+            Py_DECREF(name);
+        }
+        Py_DECREF(iterator);
+        if (PyErr_Occurred()) goto error;
+    }
+    return ans;
+error:
+    free(ans);
+    return NULL;
+}
+
+static inline bool
+is_list_attribute(ListAttributes *la, GumboTag tag, PyObject *tag_name, HTMLAttr anum, PyObject *attr_name) {
+    PyObject *names;
+    if (LIKELY(anum < HTML_ATTR_LAST)) {
+        if (IN_ATTR_SET(la->universal, anum)) return true;
+        if (LIKELY(tag < GUMBO_TAG_UNKNOWN)) return IN_ATTR_SET(la->tags[tag], anum);
+    } else if (la->universal_names && PySequence_Contains(la->universal_names, attr_name) == 1) return true;
+    names = PyDict_GetItem(la->map, tag_name);
+    return names && PySequence_Contains(names, attr_name) == 1;
+}
+
+// }}}
+
+typedef struct {
+    PyObject *new_tag, *new_comment, *new_string;
+    InternTable strings;
+    ListAttributes *list_attributes;
+} Builder;
+
 static inline PyObject*
-create_attr_name(const char *aname) {
+create_attr_name(InternTable *strings, const char *aname, HTMLAttr *anum) {
     size_t alen = strlen(aname);
-    HTMLAttr anum = attr_num(aname, alen);
-    if (anum >= HTML_ATTR_LAST) return PyUnicode_FromStringAndSize(aname, alen);
-    PyObject *ans = PyTuple_GET_ITEM(KNOWN_ATTR_NAMES, (int)anum);
+    *anum = attr_num(aname, alen);
+    if (*anum >= HTML_ATTR_LAST) return name_string(strings, aname, alen);
+    PyObject *ans = PyTuple_GET_ITEM(KNOWN_ATTR_NAMES, (int)*anum);
     Py_INCREF(ans);
     return ans;
 }
 
 static inline PyObject*
-create_attributes(GumboElement *elem) {
+create_attributes(GumboElement *elem, PyObject *tag_name, Builder *b) {
     GumboAttribute* attr;
     const char *aname;
     char buf[MAX_TAG_NAME_SZ];
-    PyObject *attr_name = NULL, *attr_val = NULL, *ans;
+    HTMLAttr anum;
+    PyObject *attr_name = NULL, *attr_val = NULL, *ans, *temp;
     ans = PyDict_New();
     if (ans == NULL) return NULL;
 
@@ -113,9 +305,15 @@ create_attributes(GumboElement *elem) {
             default:
                 break;
         }
-        attr_name = create_attr_name(aname);
-        attr_val = PyUnicode_FromString(attr->value);
+        attr_name = create_attr_name(&b->strings, aname, &anum);
+        attr_val = text_string(&b->strings, attr->value);
         if (UNLIKELY(attr_name == NULL || attr_val == NULL)) ABORT;
+        if (b->list_attributes && is_list_attribute(b->list_attributes, elem->tag, tag_name, anum, attr_name)) {
+            temp = PyUnicode_Split(attr_val, NULL, -1);
+            Py_CLEAR(attr_val);
+            if (UNLIKELY(!temp)) ABORT;
+            attr_val = temp;
+        }
         if (UNLIKELY(PyDict_SetItem(ans, attr_name, attr_val) != 0)) ABORT;
         Py_DECREF(attr_name); Py_DECREF(attr_val);
 #undef ABORT
@@ -124,18 +322,18 @@ create_attributes(GumboElement *elem) {
 }
 
 static inline PyObject*
-create_element(GumboElement *elem, PyObject *new_tag) {
+create_element(GumboElement *elem, Builder *b) {
     PyObject *tag_name = NULL, *tag_obj = NULL, *attributes = NULL;
     const char *tag;
 
     if (UNLIKELY(elem->tag >= GUMBO_TAG_UNKNOWN)) {
         gumbo_tag_from_original_text(&(elem->original_tag));
-        tag_name = PyUnicode_FromStringAndSize(elem->original_tag.data, elem->original_tag.length);
+        tag_name = name_string(&b->strings, elem->original_tag.data, elem->original_tag.length);
     } else if (UNLIKELY(elem->tag_namespace == GUMBO_NAMESPACE_SVG)) {
         gumbo_tag_from_original_text(&(elem->original_tag));
         tag = gumbo_normalize_svg_tagname(&(elem->original_tag));
         if (tag) {
-            tag_name = PyUnicode_FromStringAndSize(tag, elem->original_tag.length);
+            tag_name = name_string(&b->strings, tag, elem->original_tag.length);
         } else {
             tag_name = PyTuple_GET_ITEM(KNOWN_TAG_NAMES, elem->tag);
             Py_INCREF(tag_name);
@@ -145,38 +343,38 @@ create_element(GumboElement *elem, PyObject *new_tag) {
         Py_INCREF(tag_name);
     }
     if (UNLIKELY(tag_name == NULL)) return NULL;
-    attributes = create_attributes(elem);
+    attributes = create_attributes(elem, tag_name, b);
     if (UNLIKELY(attributes == NULL)) { Py_CLEAR(tag_name); return NULL; }
-    tag_obj = PyObject_CallFunctionObjArgs(new_tag, tag_name, attributes, NULL);
+    tag_obj = call_function(b->new_tag, tag_name, attributes);
     Py_DECREF(tag_name); Py_DECREF(attributes);
     if (UNLIKELY(tag_obj == NULL)) return NULL;
     return tag_obj;
 }
 
 static inline PyObject* 
-convert_node(GumboNode* node, GumboElement **elem, PyObject *new_tag, PyObject *new_comment, PyObject *new_string) {
+convert_node(GumboNode* node, GumboElement **elem, Builder *b) {
     PyObject *ans = NULL, *temp;
     *elem = NULL;
 
 #define STRING_LIKE(converter) \
-    temp = PyUnicode_FromString(node->v.text.text); \
+    temp = text_string(&b->strings, node->v.text.text); \
     if (UNLIKELY(temp == NULL)) break; \
-    ans = PyObject_CallFunctionObjArgs(converter, temp, NULL); \
+    ans = call_function(converter, temp, NULL); \
     Py_DECREF(temp); 
 
     switch (node->type) {
         case GUMBO_NODE_ELEMENT:
         case GUMBO_NODE_TEMPLATE:
             *elem = &node->v.element;
-            ans = create_element(*elem, new_tag);
+            ans = create_element(*elem, b);
             break;
         case GUMBO_NODE_TEXT:
         case GUMBO_NODE_WHITESPACE:
         case GUMBO_NODE_CDATA:
-            STRING_LIKE(new_string);
+            STRING_LIKE(b->new_string);
             break;
         case GUMBO_NODE_COMMENT:
-            STRING_LIKE(new_comment);
+            STRING_LIKE(b->new_comment);
             break;
         default:
             PyErr_SetString(PyExc_TypeError, "unknown gumbo node type");
@@ -194,16 +392,17 @@ as_python_tree(GumboOutput *gumbo_output, Options *opts, PyObject *new_tag, PyOb
     GumboNode *gumbo;
     GumboElement *elem;
     PyObject *parent, *child, *ans = NULL, *ret;
+    Builder b = {.new_tag = new_tag, .new_comment = new_comment, .new_string = new_string};
     Stack *stack = Stack_alloc(opts->stack_size);
     if (stack == NULL) return PyErr_NoMemory();
 
     Stack_push(stack, gumbo_output->root, NULL);
     while(stack->length > 0) {
         Stack_pop(stack, &gumbo, &parent);
-        child = convert_node(gumbo, &elem, new_tag, new_comment, new_string);
+        child = convert_node(gumbo, &elem, &b);
         if (UNLIKELY(!child)) ABORT;
         if (LIKELY(parent)) {
-            ret = PyObject_CallFunctionObjArgs(append, parent, child, NULL);
+            ret = call_function(append, parent, child);
             Py_DECREF(child);
             if (UNLIKELY(ret == NULL)) ABORT;
             Py_DECREF(ret);
@@ -215,7 +414,617 @@ as_python_tree(GumboOutput *gumbo_output, Options *opts, PyObject *new_tag, PyOb
 
 end:
     Stack_free(stack);
+    free_intern_table(&b.strings);
     if (!ok) { Py_CLEAR(ans); }
     return ans;
 #undef ABORT
 }
+
+PyObject*
+build_python_tree(GumboOutput *gumbo_output, Options *opts, PyObject *builder) {
+    // Unlike as_python_tree() the children of an element are created together
+    // and passed to builder.append_many() in a single call. Items on the stack
+    // hold a reference to their python object.
+    bool ok = false;
+    GumboNode *gumbo;
+    GumboElement *elem, *child_elem;
+    PyObject *append_many = NULL;
+    PyObject *parent, *child, *children, *ans = NULL, *ret;
+    Builder b = {0};
+    Stack *stack = NULL;
+
+    if (!(b.new_tag = PyObject_GetAttrString(builder, "new_tag"))) goto end;
+    if (!(b.new_comment = PyObject_GetAttrString(builder, "new_comment"))) goto end;
+    if (!(b.new_string = PyObject_GetAttrString(builder, "new_string"))) goto end;
+    if (!(append_many = PyObject_GetAttrString(builder, "append_many"))) goto end;
+    stack = Stack_alloc(opts->stack_size);
+    if (stack == NULL) { PyErr_NoMemory(); goto end; }
+    ans = convert_node(gumbo_output->root, &elem, &b);
+    if (UNLIKELY(!ans)) goto end;
+    Py_INCREF(ans);
+    Stack_push(stack, gumbo_output->root, ans);
+
+    while (stack->length > 0) {
+        Stack_pop(stack, &gumbo, &parent);
+        elem = &gumbo->v.element;
+        children = PyList_New(elem->children.length);
+        if (UNLIKELY(!children)) { Py_DECREF(parent); goto end; }
+        size_t first = stack->length;
+        for (unsigned int i = 0; i < elem->children.length; i++) {
+            child = convert_node(elem->children.data[i], &child_elem, &b);
+            if (UNLIKELY(!child)) break;
+            PyList_SET_ITEM(children, i, child);
+            if (child_elem && child_elem->children.length) {
+                Py_INCREF(child);
+                if (UNLIKELY(!Stack_push(stack, elem->children.data[i], child))) { Py_DECREF(child); PyErr_NoMemory(); break; }
+            }
+        }
+        if (UNLIKELY(PyErr_Occurred())) { Py_DECREF(parent); Py_DECREF(children); goto end; }
+        // Process the children in document order
+        for (size_t a = first, b = stack->length; b > a + 1; a++, b--) {
+            StackItem t = stack->items[a]; stack->items[a] = stack->items[b - 1]; stack->items[b - 1] = t;
+        }
+        ret = call_function(append_many, parent, children);
+        Py_DECREF(parent); Py_DECREF(children);
+        if (UNLIKELY(ret == NULL)) goto end;
+        Py_DECREF(ret);
+    }
+    ok = true;
+
+end:
+    if (stack) {
+        if (stack->items) {
+            while (stack->length > 0) { Stack_pop(stack, &gumbo, &parent); Py_DECREF(parent); }
+        }
+        Stack_free(stack);
+    }
+    free_intern_table(&b.strings);
+    Py_XDECREF(b.new_tag); Py_XDECREF(b.new_comment); Py_XDECREF(b.new_string); Py_XDECREF(append_many);
+    if (!ok) { Py_CLEAR(ans); }
+    return ans;
+}
+
+static inline bool
+link_soup_node(PyObject *parent, PyObject *child, PyObject *previous_element) {
+    // Equivalent to bs4's append() for a node added in document order, where
+    // the previous element is always the previously added node
+    static PyObject *s_contents = NULL, *s_parent, *s_next_sibling, *s_previous_sibling, *s_next_element, *s_previous_element;
+    PyObject *contents, *previous_sibling;
+    bool ok = false;
+    if (UNLIKELY(!s_contents)) {
+#define S(x) if (!(s_##x = PyUnicode_InternFromString(#x))) return false;
+        S(parent); S(next_sibling); S(previous_sibling); S(next_element); S(previous_element); S(contents);
+#undef S
+    }
+    contents = PyObject_GetAttr(parent, s_contents);
+    if (UNLIKELY(!contents)) return false;
+    if (UNLIKELY(!PyList_Check(contents))) { PyErr_SetString(PyExc_TypeError, "contents must be a list"); goto end; }
+    previous_sibling = PyList_GET_SIZE(contents) ? PyList_GET_ITEM(contents, PyList_GET_SIZE(contents) - 1) : Py_None;
+    if (PyObject_SetAttr(child, s_parent, parent) != 0) goto end;
+    if (PyObject_SetAttr(child, s_previous_sibling, previous_sibling) != 0) goto end;
+    if (previous_sibling != Py_None && PyObject_SetAttr(previous_sibling, s_next_sibling, child) != 0) goto end;
+    if (PyObject_SetAttr(child, s_next_sibling, Py_None) != 0) goto end;
+    if (PyObject_SetAttr(child, s_previous_element, previous_element) != 0) goto end;
+    if (PyObject_SetAttr(previous_element, s_next_element, child) != 0) goto end;
+    if (PyObject_SetAttr(child, s_next_element, Py_None) != 0) goto end;
+    if (PyList_Append(contents, child) != 0) goto end;
+    ok = true;
+end:
+    Py_DECREF(contents);
+    return ok;
+}
+
+PyObject*
+as_soup_tree(GumboOutput *gumbo_output, Options *opts, PyObject *new_tag, PyObject *new_comment, PyObject *new_string, PyObject *list_attributes) {
+    // Builds a BeautifulSoup 4 tree, linking the nodes directly instead of
+    // calling append() for each node
+    bool ok = false;
+    GumboNode *gumbo;
+    GumboElement *elem;
+    PyObject *parent, *child, *ans = NULL, *previous = NULL;
+    Builder b = {.new_tag = new_tag, .new_comment = new_comment, .new_string = new_string};
+    Stack *stack = NULL;
+
+    if (list_attributes != Py_None && !(b.list_attributes = alloc_list_attributes(list_attributes))) return NULL;
+    stack = Stack_alloc(opts->stack_size);
+    if (stack == NULL) { PyErr_NoMemory(); goto end; }
+
+    Stack_push(stack, gumbo_output->root, NULL);
+    while(stack->length > 0) {
+        Stack_pop(stack, &gumbo, &parent);
+        child = convert_node(gumbo, &elem, &b);
+        if (UNLIKELY(!child)) goto end;
+        if (LIKELY(parent)) {
+            bool linked = link_soup_node(parent, child, previous);
+            Py_DECREF(child);  // the parent holds a reference to child
+            if (UNLIKELY(!linked)) goto end;
+        } else ans = child;
+        previous = child;
+        if (elem != NULL) {
+            if (UNLIKELY(!push_children(child, elem, stack))) { PyErr_NoMemory(); goto end; }
+        }
+    }
+    ok = true;
+
+end:
+    Stack_free(stack);
+    free_intern_table(&b.strings);
+    free(b.list_attributes);
+    if (!ok) { Py_CLEAR(ans); }
+    return ans;
+}
+
+// ElementTree {{{
+
+static const char* kLegalXmlns[] = {
+    "{http://www.w3.org/1999/xhtml}",
+    "{http://www.w3.org/2000/svg}",
+    "{http://www.w3.org/1998/Math/MathML}"
+};
+#define XLINK_NAMESPACE "{http://www.w3.org/1999/xlink}"
+#define XML_NAMESPACE "{http://www.w3.org/XML/1998/namespace}"
+
+static inline PyObject*
+qualified_name(InternTable *strings, const char *ns, const char *name, size_t name_sz) {
+    char buf[MAX_TAG_NAME_SZ + 64];
+    size_t ns_sz = ns ? strlen(ns) : 0;
+    if (!ns_sz) return name_string(strings, name, name_sz);
+    name_sz = MIN(name_sz, sizeof(buf) - ns_sz);
+    memcpy(buf, ns, ns_sz); memcpy(buf + ns_sz, name, name_sz);
+    return name_string(strings, buf, ns_sz + name_sz);
+}
+
+static inline const char*
+element_name(GumboElement *elem, bool sanitize, char *buf, size_t *sz) {
+    // Must match the names used by create_element() in as-libxml.c. The
+    // original_tag of unknown and SVG elements must have already been
+    // normalized with gumbo_tag_from_original_text(). buf must have space for
+    // MAX_TAG_NAME_SZ bytes.
+    const char *tag = NULL;
+    if (UNLIKELY(elem->tag >= GUMBO_TAG_UNKNOWN)) {
+        *sz = MIN(MAX_TAG_NAME_SZ - 1, elem->original_tag.length);
+        memcpy(buf, elem->original_tag.data, *sz);
+        buf[*sz] = 0;
+        if (sanitize) *sz = sanitize_name(buf);
+        return buf;
+    }
+    if (UNLIKELY(elem->tag_namespace == GUMBO_NAMESPACE_SVG)) {
+        tag = gumbo_normalize_svg_tagname(&(elem->original_tag));
+        *sz = elem->original_tag.length;
+    }
+    if (!tag) {
+        uint8_t tsz;
+        tag = gumbo_normalized_tagname_and_size(elem->tag, &tsz);
+        *sz = tsz;
+    }
+    return tag;
+}
+
+static inline PyObject*
+etree_tag_name(GumboElement *elem, Options *opts, InternTable *strings) {
+    char buf[MAX_TAG_NAME_SZ];
+    size_t tag_sz;
+    const char *tag;
+    if (UNLIKELY(elem->tag >= GUMBO_TAG_UNKNOWN || elem->tag_namespace == GUMBO_NAMESPACE_SVG)) gumbo_tag_from_original_text(&(elem->original_tag));
+    tag = element_name(elem, opts->sanitize_names, buf, &tag_sz);
+    return qualified_name(strings, opts->namespace_elements ? kLegalXmlns[elem->tag_namespace] : NULL, tag, tag_sz);
+}
+
+static inline PyObject*
+etree_attributes(GumboElement *elem, Options *opts, InternTable *strings) {
+    // Must match the attributes created by create_attributes() in as-libxml.c
+    GumboAttribute* attr;
+    const char *aname, *ns;
+    char buf[MAX_TAG_NAME_SZ], sbuf[256];
+    size_t aname_sz;
+    PyObject *attr_name = NULL, *attr_val = NULL, *ans;
+    ans = PyDict_New();
+    if (ans == NULL) return NULL;
+#define ABORT { Py_CLEAR(ans); Py_CLEAR(attr_name); Py_CLEAR(attr_val); return NULL; }
+    if (opts->line_number_attr) {
+        snprintf(buf, sizeof(buf) - 1, "%u", elem->start_pos.line);
+        attr_name = PyUnicode_FromString(opts->line_number_attr);
+        attr_val = PyUnicode_FromString(buf);
+        if (UNLIKELY(attr_name == NULL || attr_val == NULL || PyDict_SetItem(ans, attr_name, attr_val) != 0)) ABORT;
+        Py_CLEAR(attr_name); Py_CLEAR(attr_val);
+    }
+
+    for (unsigned int i = 0; i < elem->attributes.length; ++i) {
+        attr = elem->attributes.data[i];
+        aname = attr->name;
+        ns = NULL;
+        switch (attr->attr_namespace) {
+            case GUMBO_ATTR_NAMESPACE_XLINK:
+                ns = XLINK_NAMESPACE;
+                break;
+            case GUMBO_ATTR_NAMESPACE_XML:
+                ns = XML_NAMESPACE;
+                break;
+            case GUMBO_ATTR_NAMESPACE_XMLNS:
+                if (strncmp(aname, "xlink", 5) == 0 || strncmp(aname, "xmlns", 5) == 0) continue;
+                break;
+            default:
+                if (UNLIKELY(strncmp("xmlns", aname, 5) == 0)) {
+                    size_t len = strlen(aname);
+                    if (len == 5) continue;  // ignore xmlns
+                    if (aname[5] == ':') {
+                        if (len == 6) continue; //ignore xmlns:
+                        snprintf(buf, sizeof(buf) - 1, "xmlns_%s", aname + 6);
+                        aname = buf;
+                    }
+                }
+                break;
+        }
+        if (opts->sanitize_names) aname = sanitized_name(aname, sbuf, sizeof(sbuf), &aname_sz);
+        else aname_sz = strlen(aname);
+        attr_name = qualified_name(strings, ns, aname, aname_sz);
+        attr_val = text_string(strings, attr->value);
+        if (UNLIKELY(attr_name == NULL || attr_val == NULL)) ABORT;
+        if (UNLIKELY(PyDict_SetItem(ans, attr_name, attr_val) != 0)) ABORT;
+        Py_CLEAR(attr_name); Py_CLEAR(attr_val);
+    }
+#undef ABORT
+    return ans;
+}
+
+static inline bool
+add_etree_text(PyObject *parent, PyObject *text, PyObject *s_text, PyObject *s_tail) {
+    // Text goes into the text of parent or the tail of its last child, joining
+    // adjacent text nodes
+    PyObject *target, *name, *existing, *joined;
+    bool ok = false;
+    Py_ssize_t num = PySequence_Size(parent);
+    if (UNLIKELY(num < 0)) return false;
+    if (num) { target = PySequence_GetItem(parent, num - 1); name = s_tail; }
+    else { target = parent; Py_INCREF(target); name = s_text; }
+    if (UNLIKELY(!target)) return false;
+    existing = PyObject_GetAttr(target, name);
+    if (UNLIKELY(!existing)) goto end;
+    if (existing == Py_None || (PyUnicode_Check(existing) && !PyUnicode_GET_LENGTH(existing))) {
+        ok = PyObject_SetAttr(target, name, text) == 0;
+    } else {
+        joined = PyUnicode_Concat(existing, text);
+        if (joined) { ok = PyObject_SetAttr(target, name, joined) == 0; Py_DECREF(joined); }
+    }
+    Py_DECREF(existing);
+end:
+    Py_DECREF(target);
+    return ok;
+}
+
+PyObject*
+as_etree_tree(GumboOutput *gumbo_output, Options *opts, PyObject *element, PyObject *subelement, PyObject *comment) {
+    // Builds a tree of ElementTree elements, identical to the one made by
+    // converting the libxml2 tree with html5_parser.stdlib_etree.adapt()
+    static PyObject *s_text = NULL, *s_tail, *s_append;
+    bool ok = false;
+    GumboNode *gumbo;
+    GumboElement *elem;
+    PyObject *parent, *child, *tag_name, *attrib, *text, *ans = NULL, *ret;
+    InternTable strings = {0};
+    Stack *stack = NULL;
+
+    if (UNLIKELY(!s_text)) {
+        if (!(s_text = PyUnicode_InternFromString("text")) || !(s_tail = PyUnicode_InternFromString("tail")) || !(s_append = PyUnicode_InternFromString("append"))) return NULL;
+    }
+    stack = Stack_alloc(opts->stack_size);
+    if (stack == NULL) return PyErr_NoMemory();
+    Stack_push(stack, gumbo_output->root, NULL);
+    while(stack->length > 0) {
+        Stack_pop(stack, &gumbo, &parent);
+        switch (gumbo->type) {
+            case GUMBO_NODE_ELEMENT:
+            case GUMBO_NODE_TEMPLATE:
+                elem = &gumbo->v.element;
+                tag_name = etree_tag_name(elem, opts, &strings);
+                if (UNLIKELY(!tag_name)) goto end;
+                attrib = etree_attributes(elem, opts, &strings);
+                if (UNLIKELY(!attrib)) { Py_DECREF(tag_name); goto end; }
+                if (parent) child = PyObject_CallFunctionObjArgs(subelement, parent, tag_name, attrib, NULL);
+                else child = ans = call_function(element, tag_name, attrib);
+                Py_DECREF(tag_name); Py_DECREF(attrib);
+                if (UNLIKELY(!child)) goto end;
+                if (parent) Py_DECREF(child);  // parent holds a reference to child
+                if (UNLIKELY(!push_children(child, elem, stack))) { PyErr_NoMemory(); goto end; }
+                break;
+            case GUMBO_NODE_TEXT:
+            case GUMBO_NODE_WHITESPACE:
+            case GUMBO_NODE_CDATA:
+                text = text_string(&strings, gumbo->v.text.text);
+                if (UNLIKELY(!text)) goto end;
+                ok = add_etree_text(parent, text, s_text, s_tail);
+                Py_DECREF(text);
+                if (UNLIKELY(!ok)) goto end;
+                ok = false;
+                break;
+            case GUMBO_NODE_COMMENT:
+                text = text_string(&strings, gumbo->v.text.text);
+                if (UNLIKELY(!text)) goto end;
+                child = call_function(comment, text, NULL);
+                Py_DECREF(text);
+                if (UNLIKELY(!child)) goto end;
+                ret = PyObject_CallMethodObjArgs(parent, s_append, child, NULL);
+                Py_DECREF(child);
+                if (UNLIKELY(!ret)) goto end;
+                Py_DECREF(ret);
+                break;
+            default:
+                PyErr_SetString(PyExc_TypeError, "unknown gumbo node type");
+                goto end;
+        }
+    }
+    ok = true;
+
+end:
+    Stack_free(stack);
+    free_intern_table(&strings);
+    if (!ok) { Py_CLEAR(ans); }
+    return ans;
+}
+
+// }}}
+
+// Native tree {{{
+
+// Read-only access to the gumbo parse tree from python. The nodes are indexed
+// in document order, so that the descendants of a node are the nodes
+// immediately following it and python can refer to nodes by index.
+
+#undef Item1
+#undef Item2
+#undef StackItemClass
+#undef StackClass
+#define Item1 GumboNode*
+#define Item2 uint32_t
+#define StackItemClass NativeStackItem
+#define StackClass NativeStack
+#include "stack.h"
+
+struct NativeTree {
+    GumboOutput *output;
+    PyObject *data;
+    GumboNode **nodes;
+    uint32_t *parents, *sizes;
+    size_t count;
+    unsigned int users;
+    bool sanitize_names, maybe_xhtml, closed;
+    Builder b;
+};
+
+static void
+free_native_tree_contents(NativeTree *t) {
+    if (t->output) gumbo_destroy_output(t->output);
+    t->output = NULL;
+    free(t->nodes); free(t->parents); free(t->sizes);
+    t->nodes = NULL; t->parents = t->sizes = NULL; t->count = 0;
+    free_intern_table(&t->b.strings);
+    Py_CLEAR(t->data);
+}
+
+void
+free_native_tree(NativeTree *t) {
+    if (!t) return;
+    free_native_tree_contents(t);
+    free(t);
+}
+
+void
+close_native_tree(NativeTree *t) {
+    // Free the parse tree now, or if it is being converted, as soon as the
+    // conversion is done
+    t->closed = true;
+    if (!t->users) free_native_tree_contents(t);
+}
+
+static inline bool
+check_open(NativeTree *t) {
+    if (UNLIKELY(t->closed)) { PyErr_SetString(PyExc_ValueError, "The parsed document has been closed"); return false; }
+    return true;
+}
+
+GumboOutput*
+native_tree_output(NativeTree *t, bool *maybe_xhtml) {
+    // Use the parse tree for a conversion, must be matched by a call to
+    // release_native_tree_output()
+    if (!check_open(t)) return NULL;
+    t->users++;
+    *maybe_xhtml = t->maybe_xhtml;
+    return t->output;
+}
+
+void
+release_native_tree_output(NativeTree *t) {
+    if (t->users) t->users--;
+    if (t->closed && !t->users) free_native_tree_contents(t);
+}
+
+static inline bool
+index_native_tree(NativeTree *t, size_t stack_size) {
+    size_t capacity = 1024;
+    uint32_t parent;
+    GumboNode *node;
+    GumboVector *children;
+    GumboElement *elem;
+    NativeStack *stack = NativeStack_alloc(stack_size);
+    if (!stack) return false;
+    t->nodes = malloc(capacity * sizeof(GumboNode*));
+    t->parents = malloc(capacity * sizeof(uint32_t));
+    if (!t->nodes || !t->parents || !NativeStack_push(stack, t->output->document, 0)) goto fail;
+    while (stack->length > 0) {
+        NativeStack_pop(stack, &node, &parent);
+        if (UNLIKELY(t->count >= capacity)) {
+            if (capacity >= UINT32_MAX / 2) goto fail;
+            capacity *= 2;
+            if (!(t->nodes = safe_realloc(t->nodes, capacity * sizeof(GumboNode*)))) goto fail;
+            if (!(t->parents = safe_realloc(t->parents, capacity * sizeof(uint32_t)))) goto fail;
+        }
+        t->nodes[t->count] = node; t->parents[t->count] = parent;
+        children = NULL;
+        switch (node->type) {
+            case GUMBO_NODE_DOCUMENT:
+                children = &node->v.document.children;
+                break;
+            case GUMBO_NODE_ELEMENT:
+            case GUMBO_NODE_TEMPLATE:
+                elem = &node->v.element;
+                // Done once, here, as it modifies original_tag
+                if (UNLIKELY(elem->tag >= GUMBO_TAG_UNKNOWN || elem->tag_namespace == GUMBO_NAMESPACE_SVG)) gumbo_tag_from_original_text(&(elem->original_tag));
+                children = &elem->children;
+                break;
+            default:
+                break;
+        }
+        if (children) {
+            for (unsigned int i = children->length; i > 0; i--) {
+                if (UNLIKELY(!NativeStack_push(stack, children->data[i - 1], (uint32_t)t->count))) goto fail;
+            }
+        }
+        t->count++;
+    }
+    NativeStack_free(stack);
+    // The size of the subtree rooted at every node
+    if (!(t->sizes = malloc(t->count * sizeof(uint32_t)))) return false;
+    for (size_t i = 0; i < t->count; i++) t->sizes[i] = 1;
+    for (size_t i = t->count - 1; i > 0; i--) t->sizes[t->parents[i]] += t->sizes[i];
+    return true;
+fail:
+    NativeStack_free(stack);
+    return false;
+}
+
+NativeTree*
+alloc_native_tree(GumboOutput *output, PyObject *data, bool sanitize_names, bool maybe_xhtml, size_t stack_size) {
+    // Takes ownership of output. data is the buffer that was parsed, which
+    // must be kept alive as the gumbo nodes point into it.
+    NativeTree *t = calloc(1, sizeof(NativeTree));
+    if (!t) { gumbo_destroy_output(output); PyErr_NoMemory(); return NULL; }
+    t->output = output; t->data = data; Py_INCREF(data);
+    t->sanitize_names = sanitize_names; t->maybe_xhtml = maybe_xhtml;
+    if (!index_native_tree(t, MAX(stack_size, 16u))) { free_native_tree(t); PyErr_NoMemory(); return NULL; }
+    return t;
+}
+
+static inline bool
+check_index(NativeTree *t, Py_ssize_t idx) {
+    if (!check_open(t)) return false;
+    if (UNLIKELY(idx < 0 || (size_t)idx >= t->count)) { PyErr_SetString(PyExc_IndexError, "Node index out of range"); return false; }
+    return true;
+}
+
+static inline PyObject*
+native_children(NativeTree *t, size_t idx, unsigned int num) {
+    PyObject *ans = PyTuple_New(num), *x;
+    if (!ans) return NULL;
+    for (size_t i = 0, c = idx + 1; i < num; i++, c += t->sizes[c]) {
+        if (!(x = PyLong_FromSize_t(c))) { Py_DECREF(ans); return NULL; }
+        PyTuple_SET_ITEM(ans, i, x);
+    }
+    return ans;
+}
+
+static inline PyObject*
+native_element_name(NativeTree *t, GumboElement *elem) {
+    char buf[MAX_TAG_NAME_SZ];
+    size_t sz;
+    const char *name;
+    if (LIKELY(elem->tag < GUMBO_TAG_UNKNOWN && elem->tag_namespace != GUMBO_NAMESPACE_SVG)) {
+        PyObject *ans = PyTuple_GET_ITEM(KNOWN_TAG_NAMES, elem->tag);
+        Py_INCREF(ans);
+        return ans;
+    }
+    name = element_name(elem, t->sanitize_names, buf, &sz);
+    return name_string(&t->b.strings, name, sz);
+}
+
+PyObject*
+native_tree_node(NativeTree *t, Py_ssize_t idx) {
+    // Returns a tuple of (node_type, parent_index, ...) with the remaining
+    // items depending on the node type
+    GumboNode *node;
+    GumboDocument *doc;
+    GumboElement *elem;
+    PyObject *name, *attrs;
+    long parent;
+    if (!check_index(t, idx)) return NULL;
+    node = t->nodes[idx];
+    parent = idx ? (long)t->parents[idx] : -1;
+    switch (node->type) {
+        case GUMBO_NODE_DOCUMENT:
+            doc = &node->v.document;
+            if (doc->has_doctype) return Py_BuildValue("ilN(sss)", node->type, parent, native_children(t, idx, doc->children.length),
+                    doc->name, doc->public_identifier, doc->system_identifier);
+            return Py_BuildValue("ilNO", node->type, parent, native_children(t, idx, doc->children.length), Py_None);
+        case GUMBO_NODE_ELEMENT:
+        case GUMBO_NODE_TEMPLATE:
+            elem = &node->v.element;
+            name = native_element_name(t, elem);
+            if (UNLIKELY(!name)) return NULL;
+            attrs = create_attributes(elem, name, &t->b);
+            if (UNLIKELY(!attrs)) { Py_DECREF(name); return NULL; }
+            return Py_BuildValue("ilNiNIN", node->type, parent, name, (int)elem->tag_namespace, attrs,
+                    elem->start_pos.line, native_children(t, idx, elem->children.length));
+        case GUMBO_NODE_TEXT:
+        case GUMBO_NODE_WHITESPACE:
+        case GUMBO_NODE_CDATA:
+        case GUMBO_NODE_COMMENT:
+            return Py_BuildValue("ilN", node->type, parent, text_string(&t->b.strings, node->v.text.text));
+    }
+    PyErr_SetString(PyExc_TypeError, "unknown gumbo node type");
+    return NULL;
+}
+
+#define IS_TEXT(node) ((node)->type == GUMBO_NODE_TEXT || (node)->type == GUMBO_NODE_WHITESPACE || (node)->type == GUMBO_NODE_CDATA)
+
+PyObject*
+native_tree_text(NativeTree *t, Py_ssize_t idx) {
+    // The concatenated text of all text nodes in the subtree rooted at idx
+    size_t sz = 0, end, pos = 0;
+    char *buf;
+    PyObject *ans;
+    if (!check_index(t, idx)) return NULL;
+    end = idx + t->sizes[idx];
+    for (size_t i = idx; i < end; i++) {
+        if (IS_TEXT(t->nodes[i])) sz += strlen(t->nodes[i]->v.text.text);
+    }
+    if (!(buf = malloc(sz + 1))) return PyErr_NoMemory();
+    for (size_t i = idx; i < end; i++) {
+        if (IS_TEXT(t->nodes[i])) {
+            size_t len = strlen(t->nodes[i]->v.text.text);
+            memcpy(buf + pos, t->nodes[i]->v.text.text, len);
+            pos += len;
+        }
+    }
+    ans = PyUnicode_DecodeUTF8(buf, sz, "replace");
+    free(buf);
+    return ans;
+}
+
+#undef IS_TEXT
+
+PyObject*
+native_tree_iter(NativeTree *t, Py_ssize_t idx, const char *tag, Py_ssize_t tag_sz) {
+    // The indices of all elements in the subtree rooted at idx, in document
+    // order, optionally only those with the specified tag name
+    char buf[MAX_TAG_NAME_SZ];
+    size_t end, sz;
+    const char *name;
+    GumboElement *elem;
+    PyObject *ans, *x;
+    if (!check_index(t, idx)) return NULL;
+    if (!(ans = PyList_New(0))) return NULL;
+    end = idx + t->sizes[idx];
+    for (size_t i = idx; i < end; i++) {
+        if (t->nodes[i]->type != GUMBO_NODE_ELEMENT && t->nodes[i]->type != GUMBO_NODE_TEMPLATE) continue;
+        if (tag) {
+            elem = &t->nodes[i]->v.element;
+            name = element_name(elem, t->sanitize_names, buf, &sz);
+            if (sz != (size_t)tag_sz || memcmp(name, tag, sz) != 0) continue;
+        }
+        if (!(x = PyLong_FromSize_t(i))) { Py_DECREF(ans); return NULL; }
+        if (PyList_Append(ans, x) != 0) { Py_DECREF(x); Py_DECREF(ans); return NULL; }
+        Py_DECREF(x);
+    }
+    return ans;
+}
+
+// }}}
@@ -13,5 +13,30 @@
 
 PyObject*
 as_python_tree(GumboOutput *gumbo_output, Options *opts, PyObject *new_tag, PyObject *new_comment, PyObject *new_string, PyObject *append);
+PyObject*
+build_python_tree(GumboOutput *gumbo_output, Options *opts, PyObject *builder);
+PyObject*
+as_soup_tree(GumboOutput *gumbo_output, Options *opts, PyObject *new_tag, PyObject *new_comment, PyObject *new_string, PyObject *list_attributes);
+PyObject*
+as_etree_tree(GumboOutput *gumbo_output, Options *opts, PyObject *element, PyObject *subelement, PyObject *comment);
+
+typedef struct NativeTree NativeTree;
+NativeTree*
+alloc_native_tree(GumboOutput *output, PyObject *data, bool sanitize_names, bool maybe_xhtml, size_t stack_size);
+void
+free_native_tree(NativeTree *t);
+void
+close_native_tree(NativeTree *t);
+GumboOutput*
+native_tree_output(NativeTree *t, bool *maybe_xhtml);
+void
+release_native_tree_output(NativeTree *t);
+PyObject*
+native_tree_node(NativeTree *t, Py_ssize_t idx);
+PyObject*
+native_tree_text(NativeTree *t, Py_ssize_t idx);
+PyObject*
+native_tree_iter(NativeTree *t, Py_ssize_t idx, const char *tag, Py_ssize_t tag_sz);
+
 bool
 set_known_tag_names(PyObject *val, PyObject*);
@@ -0,0 +1,251 @@
+/*
+ * compact.c
+ * Copyright (C) 2026 Kovid Goyal <kovid at kovidgoyal.net>
+ *
+ * Distributed under terms of the Apache 2.0 license.
+ */
+
+// Rebuild a libxml2 document from the compact binary tree format written by
+// html5_parser.compact.dump(). The layout (all integers are little endian
+// uint32) is:
+//
+//   header:  magic[8] version num_strings num_words blob_size num_top
+//            doctype_name doctype_public doctype_system
+//   strings: num_strings * (blob offset, length), entry 0 is NULL
+//   words:   the node table, in document order, see below
+//   blob:    NUL terminated UTF-8 text referenced by strings and nodes
+//
+// Node records are:
+//   ELEMENT: type name ns_href ns_prefix line num_nsdefs num_attrs num_children
+//            num_nsdefs * (prefix href) num_attrs * (name ns_href value_offset value_length)
+//   TEXT, COMMENT, CDATA: type offset length
+// The children of an element immediately follow it.
+
+#include <string.h>
+#include <stdlib.h>
+#include <stdint.h>
+
+#include "compact.h"
+#include <libxml/tree.h>
+#include <libxml/dict.h>
+
+#define MAGIC "H5PCMPT"
+#define FORMAT_VERSION 1
+#define HEADER_WORDS 8
+#define HEADER_SIZE (8 + 4 * HEADER_WORDS)
+
+enum { ELEMENT_RECORD = 1, TEXT_RECORD, COMMENT_RECORD, CDATA_RECORD };
+
+// Stack {{{
+
+#define Item1 xmlNodePtr
+#define Item2 uint32_t
+#define StackItemClass StackItem
+#define StackClass Stack
+#include "stack.h"
+
+// }}}
+
+typedef struct {
+    const unsigned char *words, *blob;
+    size_t num_words, pos, blob_size;
+    uint32_t num_strings;
+    const xmlChar **strings;
+    const char *errmsg;
+} Reader;
+
+static inline uint32_t
+read_u32(const unsigned char *p) {
+    return (uint32_t)p[0] | ((uint32_t)p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static inline bool
+next_word(Reader *r, uint32_t *ans) {
+    if (UNLIKELY(r->pos >= r->num_words)) { r->errmsg = "Truncated node table"; return false; }
+    *ans = read_u32(r->words + 4 * (r->pos++));
+    return true;
+}
+
+static inline bool
+get_string(Reader *r, uint32_t idx, const xmlChar **ans) {
+    if (UNLIKELY(idx >= r->num_strings)) { r->errmsg = "Invalid string reference"; return false; }
+    *ans = r->strings[idx];
+    return true;
+}
+
+static inline bool
+get_text(Reader *r, uint32_t offset, uint32_t length, const xmlChar **ans) {
+    if (UNLIKELY((size_t)offset + length >= r->blob_size || r->blob[(size_t)offset + length])) {
+        r->errmsg = "Invalid text reference"; return false;
+    }
+    *ans = BAD_CAST (r->blob + offset);
+    return true;
+}
+
+static inline xmlNsPtr
+shadowed_namespace(xmlNodePtr node, const xmlChar *href, const xmlChar *prefix, bool any_prefix) {
+    // Trees from the converter can refer to a declaration that is shadowed by
+    // a nearer one with the same prefix, so search every declaration of the
+    // ancestors, not just the ones in scope
+    for (; node && node->type == XML_ELEMENT_NODE; node = node->parent) {
+        for (xmlNsPtr ns = node->nsDef; ns; ns = ns->next) {
+            if (xmlStrEqual(ns->href, href) && (any_prefix ? ns->prefix != NULL : xmlStrEqual(ns->prefix, prefix))) return ns;
+        }
+    }
+    return NULL;
+}
+
+static inline xmlNsPtr
+find_namespace(xmlDocPtr doc, xmlNodePtr node, const xmlChar *href, const xmlChar *prefix, bool attribute) {
+    xmlNsPtr ans = xmlSearchNs(doc, node, prefix);
+    if (ans && xmlStrEqual(ans->href, href)) return ans;
+    if (!attribute && (ans = shadowed_namespace(node, href, prefix, false))) return ans;
+    ans = xmlSearchNsByHref(doc, node, href);
+    if (ans) return ans;
+    if (attribute && (ans = shadowed_namespace(node, href, NULL, true))) return ans;
+    return xmlNewNs(node, href, prefix);
+}
+
+static inline xmlNodePtr
+read_element(Reader *r, xmlDocPtr doc, xmlNodePtr parent, uint32_t *num_children) {
+#define W(x) if (UNLIKELY(!next_word(r, &x))) return NULL;
+#define S(idx, x) if (UNLIKELY(!get_string(r, idx, &x))) return NULL;
+    uint32_t name_idx, href_idx, prefix_idx, line, num_nsdefs, num_attrs, a, b, c, d;
+    const xmlChar *name, *href, *prefix, *value;
+    xmlNodePtr node;
+    xmlNsPtr ns;
+    W(name_idx); W(href_idx); W(prefix_idx); W(line); W(num_nsdefs); W(num_attrs); W(*num_children);
+    S(name_idx, name);
+    if (UNLIKELY(!name)) { r->errmsg = "Element with no name"; return NULL; }
+    // name is a dict string so it is never freed, even on error
+    node = xmlNewDocNodeEatName(doc, NULL, (xmlChar*)name, NULL);
+    if (UNLIKELY(!node)) return NULL;
+    node->line = line;
+    if (UNLIKELY(!xmlAddChild(parent, node))) { xmlFreeNode(node); r->errmsg = "Invalid node placement"; return NULL; }
+    for (uint32_t i = 0; i < num_nsdefs; i++) {
+        W(a); W(b); S(a, prefix); S(b, href);
+        // Failure here means a duplicate prefix, which we ignore, as does the
+        // main converter
+        if (href) xmlNewNs(node, href, prefix);
+    }
+    S(href_idx, href); S(prefix_idx, prefix);
+    if (href) {
+        ns = find_namespace(doc, node, href, prefix, false);
+        if (UNLIKELY(!ns)) { r->errmsg = "Invalid namespace"; return NULL; }
+        xmlSetNs(node, ns);
+    }
+    for (uint32_t i = 0; i < num_attrs; i++) {
+        W(a); W(b); W(c); W(d);
+        S(a, name); S(b, href);
+        if (UNLIKELY(!name)) { r->errmsg = "Attribute with no name"; return NULL; }
+        if (UNLIKELY(!get_text(r, c, d, &value))) return NULL;
+        ns = NULL;
+        if (href) {
+            ns = find_namespace(doc, node, href, NULL, true);
+            if (UNLIKELY(!ns)) { r->errmsg = "Invalid namespace"; return NULL; }
+        }
+        if (UNLIKELY(!xmlNewNsPropEatName(node, ns, (xmlChar*)name, value))) return NULL;
+    }
+    return node;
+#undef W
+#undef S
+}
+
+static inline xmlNodePtr
+read_node(Reader *r, xmlDocPtr doc, xmlNodePtr parent, uint32_t *num_children) {
+    uint32_t type, offset, length;
+    const xmlChar *text;
+    xmlNodePtr node = NULL;
+    *num_children = 0;
+    if (UNLIKELY(!next_word(r, &type))) return NULL;
+    if (type == ELEMENT_RECORD) return read_element(r, doc, parent, num_children);
+    if (UNLIKELY(!next_word(r, &offset) || !next_word(r, &length) || !get_text(r, offset, length, &text))) return NULL;
+    switch (type) {
+        case TEXT_RECORD:
+            node = xmlNewDocTextLen(doc, text, length);
+            break;
+        case COMMENT_RECORD:
+            node = xmlNewDocComment(doc, text);
+            break;
+        case CDATA_RECORD:
+            node = xmlNewCDataBlock(doc, text, length);
+            break;
+        default:
+            r->errmsg = "Unknown node type";
+            return NULL;
+    }
+    if (UNLIKELY(!node)) return NULL;
+    if (UNLIKELY(!xmlAddChild(parent, node))) { xmlFreeNode(node); r->errmsg = "Invalid node placement"; return NULL; }
+    return node;
+}
+
+static inline bool
+read_tree(Reader *r, xmlDocPtr doc, uint32_t num_top) {
+    bool ok = true;
+    xmlNodePtr node;
+    uint32_t num_children;
+    Stack *stack = Stack_alloc(64);
+    if (!stack) return false;
+    if (num_top) ok = Stack_push(stack, (xmlNodePtr)doc, num_top);
+    while (ok && stack->length > 0) {
+        StackItem *top = stack->items + stack->length - 1;
+        if (top->xml == 0) { stack->length--; continue; }
+        top->xml--;
+        node = read_node(r, doc, top->gumbo, &num_children);
+        if (UNLIKELY(!node)) ok = false;
+        else if (num_children) ok = Stack_push(stack, node, num_children);
+    }
+    Stack_free(stack);
+    return ok;
+}
+
+libxml_doc*
+load_compact_tree(const unsigned char *data, size_t sz, const char **errmsg) {
+#define FAIL(x) { *errmsg = x; goto end; }
+    uint32_t h[HEADER_WORDS];
+    xmlDocPtr doc = NULL;
+    Reader r = {0};
+    bool ok = false;
+    *errmsg = NULL;
+
+    if (sz < HEADER_SIZE || memcmp(data, MAGIC, sizeof(MAGIC)) != 0) FAIL("Not a compact tree file");
+    for (int i = 0; i < HEADER_WORDS; i++) h[i] = read_u32(data + 8 + 4 * i);
+    if (h[0] != FORMAT_VERSION) FAIL("Unsupported compact tree format version");
+    r.num_strings = h[1]; r.num_words = h[2]; r.blob_size = h[3];
+    if (!r.num_strings || (sz - HEADER_SIZE) / 8 < r.num_strings) FAIL("Truncated string table");
+    r.words = data + HEADER_SIZE + 8 * (size_t)r.num_strings;
+    if ((size_t)(data + sz - r.words) / 4 < r.num_words) FAIL("Truncated node table");
+    r.blob = r.words + 4 * r.num_words;
+    if ((size_t)(data + sz - r.blob) < r.blob_size) FAIL("Truncated text blob");
+
+    doc = xmlNewDoc(BAD_CAST "1.0");
+    if (!doc) goto end;
+    if (!doc->dict) {
+        doc->dict = xmlDictCreate();
+        if (!doc->dict) goto end;
+    }
+    doc->encoding = xmlStrdup(BAD_CAST "UTF-8");
+    r.strings = calloc(r.num_strings, sizeof(xmlChar*));
+    if (!r.strings) goto end;
+    for (uint32_t i = 1; i < r.num_strings; i++) {
+        const unsigned char *entry = data + HEADER_SIZE + 8 * (size_t)i;
+        uint32_t offset = read_u32(entry), length = read_u32(entry + 4);
+        const xmlChar *text;
+        if (!get_text(&r, offset, length, &text)) FAIL(r.errmsg);
+        r.strings[i] = xmlDictLookup(doc->dict, text, length);
+        if (!r.strings[i]) goto end;
+    }
+    if (h[5]) {
+        const xmlChar *name, *public_id, *system_id;
+        if (!get_string(&r, h[5], &name) || !get_string(&r, h[6], &public_id) || !get_string(&r, h[7], &system_id)) FAIL(r.errmsg);
+        if (!xmlCreateIntSubset(doc, name, public_id, system_id)) goto end;
+    }
+    if (!read_tree(&r, doc, h[4])) FAIL(r.errmsg);
+    if (r.pos != r.num_words) FAIL("Trailing data in node table");
+    ok = true;
+#undef FAIL
+end:
+    free((void*)r.strings);
+    if (!ok && doc) { xmlFreeDoc(doc); doc = NULL; }
+    return doc;
+}
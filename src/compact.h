@@ -0,0 +1,11 @@
+/*
+ * Copyright (C) 2026 Kovid Goyal <kovid at kovidgoyal.net>
+ *
+ * Distributed under terms of the Apache 2.0 license.
+ */
+
+#pragma once
+
+#include "as-libxml.h"
+
+libxml_doc* load_compact_tree(const unsigned char *data, size_t sz, const char **errmsg);
@@ -8,6 +8,7 @@
 
 #include "../gumbo/gumbo.h"
 #include <stdbool.h>
+#include <string.h>
 
 #ifdef _MSC_VER
 #define UNUSED 
@@ -29,8 +30,8 @@
 #define MAX_TAG_NAME_SZ 100
 
 typedef struct {
-    unsigned int stack_size;
-    bool keep_doctype, namespace_elements, sanitize_names;
+    unsigned int stack_size, intern_max_len;
+    bool keep_doctype, namespace_elements, sanitize_names, shared_dict;
     const void* line_number_attr;
     GumboOptions gumbo_opts;
 } Options;
@@ -41,6 +42,8 @@ typedef enum {
   HTML_ATTR_LAST,
 } HTMLAttr;
 
+extern const char* ATTR_NAMES[];
+
 
 // We only allow subset of the valid characters defined in the XML spec for
 // performance, as the following tests can be run directly on UTF-8 without
@@ -78,4 +81,21 @@ sanitize_name(char *name) {
     }
     return i;
 }
+
+static inline const char*
+sanitized_name(const char *name, char *buf, size_t bufsz, size_t *sz) {
+    // Like sanitize_name() but does not modify name, so that the gumbo parse
+    // tree can be converted more than once. Returns name itself if it is
+    // valid, otherwise a sanitized copy of it in buf.
+    size_t i;
+    if (UNLIKELY(name[0] == 0)) { *sz = 0; return name; }
+    if (LIKELY(VALID_FIRST_CHAR(name[0]))) {
+        for (i = 1; name[i] != 0 && VALID_CHAR(name[i]); i++);
+        if (LIKELY(name[i] == 0)) { *sz = i; return name; }
+    }
+    i = MIN(strlen(name), bufsz - 1);
+    memcpy(buf, name, i); buf[i] = 0;
+    *sz = sanitize_name(buf);
+    return buf;
+}
 #endif
@@ -9,8 +9,15 @@ import importlib
 import sys
 from collections import namedtuple
 from locale import getpreferredencoding
+from time import perf_counter
 from typing import TYPE_CHECKING
 
+from .cache import ParseCache
+from .document import ParsedDocument
+from .metrics import instrumented
+from .sampler import SlowDocumentSampler
+from .stats import ParseStats, add_time, timed
+
 if TYPE_CHECKING:
     from typing import Literal, Optional, Union, overload, reveal_type
     from xml.dom.minidom import Document
@@ -19,9 +26,11 @@ if TYPE_CHECKING:
     from bs4 import BeautifulSoup
     from lxml.etree import _Element as LxmlElement
     from lxml.html import HtmlElement
-    ReturnType = Union[LxmlElement, HtmlElement, Element, Document, BeautifulSoup]
+
+    from .native import Element as NativeElement
+    ReturnType = Union[LxmlElement, HtmlElement, Element, Document, BeautifulSoup, NativeElement]
 else:
-    _Element = ReturnType = HtmlElement = Element = Document = BeautifulSoup = None
+    _Element = ReturnType = HtmlElement = Element = Document = BeautifulSoup = NativeElement = None
 
 
 if not hasattr(sys, 'generating_docs_via_sphinx'):
@@ -93,10 +102,13 @@ def safe_get_preferred_encoding():
             pass
 
 
-def as_utf8(bytes_or_unicode, transport_encoding=None, fallback_encoding=None):
+def as_utf8(bytes_or_unicode, transport_encoding=None, fallback_encoding=None, stats=None):
+    if stats is not None:
+        start = perf_counter()
     if isinstance(bytes_or_unicode, bytes):
         data = bytes_or_unicode
         if transport_encoding:
+            source = 'transport'
             if transport_encoding.lower() not in passthrough_encodings:
                 data = bytes_or_unicode.decode(transport_encoding).encode('utf-8')
         else:
@@ -104,13 +116,24 @@ def as_utf8(bytes_or_unicode, transport_encoding=None, fallback_encoding=None):
             # https://www.w3.org/TR/2011/WD-html5-20110113/parsing.html#determining-the-character-encoding
             bom = check_bom(data)
             if bom is not None:
+                source = 'bom'
                 data = data[len(bom):]
+                if stats is not None:
+                    start = add_time(stats, 'sniff_time', start)
                 if bom is not codecs.BOM_UTF8:
                     data = data.decode(BOMS[bom]).encode('utf-8')
             else:
-                encoding = (
-                    check_for_meta_charset(data) or detect_encoding(data) or fallback_encoding or
-                    safe_get_preferred_encoding() or 'cp-1252')
+                encoding, source = check_for_meta_charset(data), 'meta'
+                if stats is not None:
+                    start = add_time(stats, 'sniff_time', start)
+                if not encoding:
+                    encoding, source = detect_encoding(data), 'chardet'
+                    if stats is not None:
+                        start = add_time(stats, 'chardet_time', start)
+                if not encoding:
+                    encoding, source = fallback_encoding, 'fallback'
+                if not encoding:
+                    encoding, source = safe_get_preferred_encoding() or 'cp-1252', 'locale'
                 if encoding and encoding.lower() not in passthrough_encodings:
                     if encoding == 'x-user-defined':
                         # https://encoding.spec.whatwg.org/#x-user-defined
@@ -123,17 +146,34 @@ def as_utf8(bytes_or_unicode, transport_encoding=None, fallback_encoding=None):
                     else:
                         data = data.decode(encoding).encode('utf-8')
     else:
+        source = 'unicode'
         data = bytes_or_unicode.encode('utf-8')
+    if stats is not None:
+        add_time(stats, 'transcode_time', start)
+        stats.encoding_source = source
     return data
 
 
+def normalize_fragment_context(fragment_context):
+    fragment_namespace = html_parser.GUMBO_NAMESPACE_HTML
+    if fragment_context:
+        fragment_context = fragment_context.lower()
+        if ':' in fragment_context:
+            ns, fragment_context = fragment_context.split(':', 1)
+            fragment_namespace = {
+                'svg': html_parser.GUMBO_NAMESPACE_SVG, 'math': html_parser.GUMBO_NAMESPACE_MATHML,
+                'html': html_parser.GUMBO_NAMESPACE_HTML
+            }[ns]
+    return fragment_context, fragment_namespace
+
+
 def normalize_treebuilder(x):
     if hasattr(x, 'lower'):
         x = x.lower()
     return {'lxml.etree': 'lxml', 'etree': 'stdlib_etree'}.get(x, x)
 
 
-NAMESPACE_SUPPORTING_BUILDERS = frozenset('lxml stdlib_etree dom lxml_html'.split())
+NAMESPACE_SUPPORTING_BUILDERS = frozenset('lxml stdlib_etree dom dom_lazy lxml_html'.split())
 
 if TYPE_CHECKING:
     @overload
@@ -147,6 +187,11 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> LxmlElement: ...
 
     @overload
@@ -160,6 +205,11 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> HtmlElement: ...
 
     @overload
@@ -173,11 +223,16 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> Element: ...
 
     @overload
     def parse(
-        html: Union[bytes, str], transport_encoding:Optional[str], namespace_elements: bool, treebuilder: Literal['dom'],
+        html: Union[bytes, str], transport_encoding:Optional[str], namespace_elements: bool, treebuilder: Literal['dom', 'dom_lazy'],
         fallback_encoding: Optional[str] = ...,
         keep_doctype: bool = ...,
         maybe_xhtml: bool = ...,
@@ -186,8 +241,31 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> Document: ...
 
+    @overload
+    def parse(
+        html: Union[bytes, str], transport_encoding:Optional[str], namespace_elements: bool, treebuilder: Literal['native'],
+        fallback_encoding: Optional[str] = ...,
+        keep_doctype: bool = ...,
+        maybe_xhtml: bool = ...,
+        return_root: bool = ...,
+        line_number_attr:Optional[str] = ...,
+        sanitize_names: bool = ...,
+        stack_size: int = ...,
+        fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
+    ) -> NativeElement: ...
+
     @overload
     def parse(
         html: Union[bytes, str], transport_encoding:Optional[str], namespace_elements: bool, treebuilder: Literal['soup'],
@@ -199,6 +277,11 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> BeautifulSoup: ...
 
     @overload
@@ -215,6 +298,11 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> LxmlElement: ...
 
 
@@ -232,6 +320,11 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> HtmlElement: ...
 
     @overload
@@ -248,6 +341,11 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> Element: ...
 
     @overload
@@ -255,7 +353,7 @@ if TYPE_CHECKING:
         html: Union[bytes, str],
         transport_encoding: Optional[str] = ...,
         namespace_elements: bool = ...,
-        treebuilder: Literal['dom'] = ...,
+        treebuilder: Literal['dom', 'dom_lazy'] = ...,
         fallback_encoding: Optional[str] = ...,
         keep_doctype: bool = ...,
         maybe_xhtml: bool = ...,
@@ -264,8 +362,34 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> Document: ...
 
+    @overload
+    def parse(  # type: ignore
+        html: Union[bytes, str],
+        transport_encoding: Optional[str] = ...,
+        namespace_elements: bool = ...,
+        treebuilder: Literal['native'] = ...,
+        fallback_encoding: Optional[str] = ...,
+        keep_doctype: bool = ...,
+        maybe_xhtml: bool = ...,
+        return_root: bool = ...,
+        line_number_attr:Optional[str] = ...,
+        sanitize_names: bool = ...,
+        stack_size: int = ...,
+        fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
+    ) -> NativeElement: ...
+
     @overload
     def parse(
         html: Union[bytes, str],
@@ -280,14 +404,20 @@ if TYPE_CHECKING:
         sanitize_names: bool = ...,
         stack_size: int = ...,
         fragment_context: Optional[str] = ...,
+        cache: Optional[ParseCache] = ...,
+        shared_dict: bool = ...,
+        intern_max_len: int = ...,
+        single_pass: bool = ...,
+        stats: Optional[ParseStats] = ...,
     ) -> BeautifulSoup: ...
 
 
+@instrumented
 def parse(
     html: 'Union[bytes, str]',
     transport_encoding: 'Optional[str]' = None,
     namespace_elements: 'bool' = False,
-    treebuilder: "Literal['lxml', 'lxml_html', 'etree', 'dom', 'soup']" = 'lxml',
+    treebuilder: "Literal['lxml', 'lxml_html', 'etree', 'dom', 'dom_lazy', 'soup', 'native']" = 'lxml',
     fallback_encoding: 'Optional[str]' = None,
     keep_doctype: 'bool' = True,
     maybe_xhtml: 'bool' = False,
@@ -296,6 +426,11 @@ def parse(
     sanitize_names: 'bool' = True,
     stack_size: 'int' = 16 * 1024,
     fragment_context: 'Optional[str]' = None,
+    cache: 'Optional[ParseCache]' = None,
+    shared_dict: 'bool' = False,
+    intern_max_len: 'int' = 0,
+    single_pass: 'bool' = False,
+    stats: 'Optional[ParseStats]' = None,
 ) -> ReturnType:
     '''
     Parse the specified :attr:`html` and return the parsed representation.
@@ -314,10 +449,21 @@ def parse(
           * `lxml <https://lxml.de>`_  -- the default, and fastest
           * `lxml_html <https://lxml.de>`_  -- tree of lxml.html.HtmlElement, same speed as lxml
             (new in *0.4.10*)
-          * etree (the python stdlib :mod:`xml.etree.ElementTree`)
+          * etree (the python stdlib :mod:`xml.etree.ElementTree`), built directly
+            in C, unless ``maybe_xhtml`` or ``cache`` is used (new in *0.4.13*)
           * dom (the python stdlib :mod:`xml.dom.minidom`)
+          * dom_lazy -- a read-only facade implementing the :mod:`xml.dom.minidom`
+            API, whose nodes are created only when they are accessed, so it is much
+            faster than dom when only part of the tree is visited (new in *0.4.13*)
           * `soup <https://www.crummy.com/software/BeautifulSoup>`_ -- BeautifulSoup,
             which must be installed or it will raise an :class:`ImportError`
+          * native -- a read-only tree of lightweight nodes backed directly by
+            the parser's own data structures, that does not use lxml. Nodes have
+            ``tag``, ``attrs``, ``children``, ``text`` (all descendant text),
+            ``iter(tag)``, ``find(tag)`` and ``findall(tag)``. It is the fastest to
+            build, useful for extracting data. It does not support ``line_number_attr``,
+            nodes have a ``sourceline`` instead, and ignores ``namespace_elements``, ``shared_dict`` and ``intern_max_len``,
+            which apply only to libxml2 based trees (new in *0.4.13*)
 
     :param fallback_encoding: If no encoding could be detected, then use this encoding.
         Defaults to an encoding based on system locale.
@@ -354,27 +500,98 @@ def parse(
         is a fragment. Common choices are ``div`` or ``body``. To use SVG or MATHML tags
         prefix the tag name with ``svg:`` or ``math:`` respectively. Note that currently
         using a non-HTML fragment_context is not supported. New in *0.4.10*.
+
+    :param cache: An optional :class:`ParseCache`. If the same HTML has already
+        been parsed with the same options, a copy of the cached tree is
+        returned instead of parsing again. Ignored by the ``soup`` and
+        ``native`` treebuilders. New in *0.4.13*.
+
+    :param shared_dict: If True, the names in the tree are stored in a
+        sub-dictionary of a process wide dictionary that already contains the
+        names of all standard HTML tags and attributes, and common attribute
+        values. This reduces the memory used by each tree, which is useful when
+        keeping many trees alive. New in *0.4.13*.
+
+    :param intern_max_len: If greater than zero, attribute values and text
+        shorter than this many bytes are stored in the dictionary of the
+        document, so that repeated values such as class names or whitespace
+        between tags are stored only once. Reduces the memory used by large
+        trees, at a small cost in parsing speed. New in *0.4.13*.
+
+    :param single_pass: If True, the lxml tree is built while the HTML is being
+        parsed, instead of being converted from the finished parse tree
+        afterwards. The resulting tree is identical. Uses less memory and is
+        usually faster, as the closed parts of the parse tree are freed while
+        parsing. Has no effect with ``maybe_xhtml``, ``cache`` or the
+        ``etree``, ``soup`` and ``native`` treebuilders. New in *0.4.13*.
+
+    :param stats: An optional :class:`ParseStats` that is filled in with
+        statistics about this parse, such as the memory it used and the time
+        taken by each phase of parsing. Memory is not measured when ``cache``
+        is used. New in *0.4.13*.
     '''
-    data = as_utf8(html or b'', transport_encoding, fallback_encoding)
+    data = as_utf8(html or b'', transport_encoding, fallback_encoding, stats)
     treebuilder = normalize_treebuilder(treebuilder)
     if treebuilder == 'soup':
         from .soup import parse
-        return parse(
-            data, return_root=return_root, keep_doctype=keep_doctype, stack_size=stack_size)
+        return timed(
+            stats, 'parse_time', parse, data, return_root=return_root, keep_doctype=keep_doctype, stack_size=stack_size)
     if treebuilder not in NAMESPACE_SUPPORTING_BUILDERS:
         namespace_elements = False
-    fragment_namespace = html_parser.GUMBO_NAMESPACE_HTML
-    if fragment_context:
-        fragment_context = fragment_context.lower()
-        if ':' in fragment_context:
-            ns, fragment_context = fragment_context.split(':', 1)
-            fragment_namespace = {
-                'svg': html_parser.GUMBO_NAMESPACE_SVG, 'math': html_parser.GUMBO_NAMESPACE_MATHML,
-                'html': html_parser.GUMBO_NAMESPACE_HTML
-            }[ns]
+    fragment_context, fragment_namespace = normalize_fragment_context(fragment_context)
+
+    options = dict(
+        namespace_elements=namespace_elements or maybe_xhtml,
+        keep_doctype=keep_doctype,
+        maybe_xhtml=maybe_xhtml,
+        line_number_attr=line_number_attr,
+        sanitize_names=sanitize_names,
+        stack_size=stack_size,
+        fragment_context=fragment_context,
+        fragment_namespace=fragment_namespace,
+        shared_dict=shared_dict,
+        intern_max_len=intern_max_len,
+    )
+    if treebuilder == 'native':
+        if line_number_attr:
+            raise ValueError('The native treebuilder does not support line_number_attr, use the sourceline of its nodes')
+        from .native import parse
+        return timed(stats, 'parse_time', parse, data, return_root=return_root, **options)
+    if treebuilder == 'stdlib_etree' and cache is None and not maybe_xhtml:
+        from .stdlib_etree import parse
+        return timed(stats, 'parse_time', parse, data, return_root=return_root, **options)
+    if cache is None:
+        capsule = html_parser.parse(data, single_pass=single_pass, stats=stats, **options)
+    else:
+        capsule = timed(stats, 'parse_time', cache.parse, data, options)
 
-    capsule = html_parser.parse(
-        data,
+    return tree_from_capsule(capsule, treebuilder, return_root, stats)
+
+
+def parse_raw(
+    html: 'Union[bytes, str]',
+    transport_encoding: 'Optional[str]' = None,
+    namespace_elements: 'bool' = False,
+    fallback_encoding: 'Optional[str]' = None,
+    keep_doctype: 'bool' = True,
+    maybe_xhtml: 'bool' = False,
+    line_number_attr: 'Optional[str]' = None,
+    sanitize_names: 'bool' = True,
+    stack_size: 'int' = 16 * 1024,
+    fragment_context: 'Optional[str]' = None,
+    shared_dict: 'bool' = False,
+    intern_max_len: 'int' = 0,
+) -> 'ParsedDocument':
+    '''
+    Parse the specified :attr:`html` once, returning a
+    :class:`ParsedDocument` that can be converted into trees of several
+    different types, without parsing the HTML again for each one. The
+    parameters have the same meaning as for :func:`parse` and apply to all
+    trees created from the document. New in *0.4.13*.
+    '''
+    data = as_utf8(html or b'', transport_encoding, fallback_encoding)
+    fragment_context, fragment_namespace = normalize_fragment_context(fragment_context)
+    options = dict(
         namespace_elements=namespace_elements or maybe_xhtml,
         keep_doctype=keep_doctype,
         maybe_xhtml=maybe_xhtml,
@@ -383,17 +600,66 @@ def parse(
         stack_size=stack_size,
         fragment_context=fragment_context,
         fragment_namespace=fragment_namespace,
-        )
+        shared_dict=shared_dict,
+        intern_max_len=intern_max_len,
+    )
+    capsule = html_parser.parse_native(
+        data, maybe_xhtml=maybe_xhtml, sanitize_names=sanitize_names, stack_size=stack_size,
+        fragment_context=fragment_context, fragment_namespace=fragment_namespace)
+    return ParsedDocument(capsule, options)
+
 
+def tree_from_capsule(capsule, treebuilder, return_root, stats=None):
     interpreter = None
     if treebuilder == 'lxml_html':
         from lxml.html import HTMLParser
         interpreter = HTMLParser()
-    ans = etree.adopt_external_document(capsule, parser=interpreter)
+    ans = timed(stats, 'adopt_time', etree.adopt_external_document, capsule, parser=interpreter)
     if treebuilder in ('lxml', 'lxml_html'):
         return ans.getroot() if return_root else ans
     m = importlib.import_module('html5_parser.' + treebuilder)
-    return m.adapt(ans, return_root=return_root)
+    return timed(stats, 'treebuilder_time', m.adapt, ans, return_root=return_root)
+
+
+def dump_compact(tree, path):
+    '''
+    Save the specified lxml tree (as returned by :func:`parse`) to :attr:`path`
+    in a compact binary format that can be loaded again by :func:`load_compact`
+    without re-parsing the original HTML. The file is typically 1.5 to 2 times
+    the size of the UTF-8 HTML. New in *0.4.13*.
+
+    :param tree: Either the root element or the element tree of the document.
+    :param path: The path of the file to write to.
+    '''
+    from .compact import dump  # delay load
+    dump(tree, path)
+
+
+def load_compact(
+    path: 'str',
+    treebuilder: "Literal['lxml', 'lxml_html', 'etree', 'dom', 'dom_lazy']" = 'lxml',
+    return_root: 'bool' = True,
+) -> ReturnType:
+    '''
+    Load a tree saved by :func:`dump_compact`. The file is memory mapped and
+    the tree is rebuilt directly from it, in C, without running the HTML 5
+    parsing algorithm. For the ``lxml`` treebuilder this is about 4 to 10 times
+    faster than parsing, depending on the document. The other treebuilders
+    convert the lxml tree in Python, so loading is only 1.5 to 2 times faster
+    than parsing for ``etree``, and takes about as long as parsing for ``dom``.
+    New in *0.4.13*.
+
+    :param path: The path of the file to load.
+    :param treebuilder: The type of tree to return, see :func:`parse`. The
+        ``soup`` and ``native`` treebuilders are not supported.
+    :param return_root: If True, return the root node of the document, otherwise
+        return the tree object for the document.
+    '''
+    treebuilder = normalize_treebuilder(treebuilder)
+    if treebuilder in ('soup', 'native'):
+        raise ValueError('The {} treebuilder is not supported for compact trees'.format(treebuilder))
+    from .compact import load  # delay load
+    return tree_from_capsule(load(path), treebuilder, return_root)
 
 
 if TYPE_CHECKING:
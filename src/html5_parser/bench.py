@@ -0,0 +1,894 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+# Benchmarks for html5-parser, run with: python -m html5_parser.bench --help
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import gc
+import gzip
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tarfile
+import zlib
+from time import perf_counter
+
+from . import ParseStats, parse, version
+from .stats import TIME_FIELDS
+
+TREEBUILDERS = ('lxml', 'lxml_html', 'etree', 'dom', 'dom_lazy', 'soup', 'native')
+
+# Reading corpora {{{
+
+
+def read_directory(path):
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.startswith('.'):
+                q = os.path.join(dirpath, name)
+                with open(q, 'rb') as f:
+                    yield os.path.relpath(q, path), f.read(), None
+
+
+def read_tar(path):
+    with tarfile.open(path) as tf:
+        for member in tf:
+            if member.isfile():
+                yield member.name, tf.extractfile(member).read(), None
+
+
+def dechunk(data):
+    ans, pos = [], 0
+    while True:
+        eol = data.find(b'\r\n', pos)
+        if eol < 0:
+            break
+        size = int(data[pos:eol].split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        ans.append(data[eol + 2:eol + 2 + size])
+        pos = eol + 4 + size
+    return b''.join(ans)
+
+
+def parse_headers(raw):
+    headers = {}
+    for line in raw.split(b'\r\n'):
+        k, sep, v = line.partition(b':')
+        if sep:
+            headers[k.strip().decode('latin1').lower()] = v.strip().decode('latin1')
+    return headers
+
+
+def http_payload(block):
+    # Return the HTML body and its charset from a HTTP response, or None if it is not HTML
+    head, sep, body = block.partition(b'\r\n\r\n')
+    if not sep:
+        return None, None
+    headers = parse_headers(head.partition(b'\r\n')[2])
+    ctype = headers.get('content-type', 'text/html')
+    if 'html' not in ctype.lower():
+        return None, None
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = dechunk(body)
+    encoding = headers.get('content-encoding', '').lower()
+    try:
+        if encoding in ('gzip', 'x-gzip'):
+            body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+    except Exception:
+        return None, None
+    m = re.search(r'charset\s*=\s*["\']?([-\w.:]+)', ctype, flags=re.I)
+    return body, (m.group(1) if m else None)
+
+
+def read_warc(path):
+    # Only the HTML documents in response and resource records are used
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    num = 0
+    with opener(path, 'rb') as f:
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if not line.startswith(b'WARC/'):
+                continue
+            raw = []
+            while True:
+                line = f.readline()
+                if not line or line in (b'\r\n', b'\n'):
+                    break
+                raw.append(line.rstrip(b'\r\n'))
+            headers = parse_headers(b'\r\n'.join(raw))
+            block = f.read(int(headers.get('content-length', 0)))
+            rtype = headers.get('warc-type')
+            num += 1
+            name = headers.get('warc-target-uri') or 'record-%d' % num
+            if rtype == 'response':
+                body, charset = http_payload(block)
+                if body is not None:
+                    yield name, body, charset
+            elif rtype == 'resource' and 'html' in headers.get('content-type', 'text/html').lower():
+                yield name, block, None
+
+
+def read_corpus(path):
+    ' Yield (name, data, transport_encoding) for every document in a directory, tar archive or WARC file '
+    if os.path.isdir(path):
+        return read_directory(path)
+    q = path.lower()
+    if q.endswith('.warc') or q.endswith('.warc.gz'):
+        return read_warc(path)
+    if tarfile.is_tarfile(path):
+        return read_tar(path)
+    raise ValueError('%s is not a directory, tar archive or WARC file' % path)
+# }}}
+
+# Measurement {{{
+
+
+def peak_rss():
+    ' The peak resident memory of this process in bytes or None if it cannot be measured '
+    try:
+        import resource
+    except ImportError:
+        return None
+    ans = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return ans if sys.platform == 'darwin' else ans * 1024
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(latencies, num_bytes, errors):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'documents': len(latencies), 'bytes': num_bytes, 'errors': errors, 'seconds': total,
+        'throughput': num_bytes / total if total else 0,
+        'latency': {
+            'min': latencies[0] if latencies else 0, 'mean': total / len(latencies) if latencies else 0,
+            'p50': percentile(latencies, 0.5),
+            'p90': percentile(latencies, 0.9), 'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else 0},
+        'peak_rss': peak_rss(),
+    }
+
+
+def time_parse(data, repeat, **kw):
+    ' The fastest of repeat parses of data, in seconds. Like timeit, garbage collection is disabled while parsing. '
+    best = None
+    for i in range(repeat):
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = perf_counter()
+            parse(data, **kw)
+            elapsed = perf_counter() - start
+        finally:
+            if gc_enabled:
+                gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def new_report(kind, source):
+    return {
+        'kind': kind, 'source': source, 'html5_parser': '.'.join(map(str, version)),
+        'python': platform.python_version(), 'platform': platform.platform(), 'results': {}}
+# }}}
+
+# Replaying a corpus {{{
+
+
+def replay_corpus(path, treebuilders=('lxml',), repeat=1, limit=None, report_errors=True):
+    '''
+    Parse every document in the corpus at path with each treebuilder, returning
+    a report. The treebuilders are run one after the other, so the peak memory
+    reported for each is the peak of the process up to the end of its run.
+    '''
+    report = new_report('replay', os.path.abspath(path))
+    for treebuilder in treebuilders:
+        latencies, num_bytes, errors = [], 0, 0
+        for i, (name, data, encoding) in enumerate(read_corpus(path)):
+            if limit is not None and i >= limit:
+                break
+            try:
+                latencies.append(time_parse(data, repeat, transport_encoding=encoding, treebuilder=treebuilder))
+            except Exception as e:
+                errors += 1
+                if report_errors:
+                    print('Failed to parse', name, 'with', treebuilder, 'error:', e, file=sys.stderr)
+                continue
+            num_bytes += len(data)
+        report['results'][treebuilder] = summarize(latencies, num_bytes, errors)
+    return report
+
+
+def format_size(num):
+    if num is None:
+        return 'n/a'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num) < 1024:
+            break
+        num /= 1024.
+    return '%.1f %s' % (num, unit)
+
+
+def print_report(report, out=sys.stdout):
+    print('{:12s}|{:>7s}|{:>11s}|{:>9s}|{:>9s}|{:>9s}|{:>9s}|{:>10s}'.format(
+        'Treebuilder', 'Docs', 'MB/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'Peak RSS'), file=out)
+    print('-' * 82, file=out)
+    for name, r in report['results'].items():
+        lat = r['latency']
+        print('{:12s}|{:7d}|{:11.2f}|{:9.3f}|{:9.3f}|{:9.3f}|{:9.3f}|{:>10s}'.format(
+            name, r['documents'], r['throughput'] / 1e6, lat['p50'] * 1000, lat['p90'] * 1000,
+            lat['p99'] * 1000, lat['max'] * 1000, format_size(r['peak_rss'])), file=out)
+# }}}
+
+# Comparing reports {{{
+
+
+# The metrics compared between reports, and whether larger values are better
+COMPARED = (('throughput', True), ('latency.p50', False), ('latency.p90', False), ('latency.p99', False))
+
+
+def metric(result, name):
+    for part in name.split('.'):
+        result = result[part]
+    return result
+
+
+def diff_reports(old, new, threshold=5):
+    '''
+    Compare two reports, returning a list of (treebuilder, metric, old value,
+    new value, percent change, is_regression). A regression is a change for
+    the worse of more than threshold percent.
+    '''
+    ans = []
+    for treebuilder, nr in new['results'].items():
+        orr = old['results'].get(treebuilder)
+        if orr is None:
+            continue
+        for name, larger_is_better in COMPARED:
+            a, b = metric(orr, name), metric(nr, name)
+            change = ((b - a) / a * 100) if a else 0
+            worse = -change if larger_is_better else change
+            ans.append((treebuilder, name, a, b, change, worse > threshold))
+    return ans
+
+
+def print_diff(rows, out=sys.stdout):
+    print('Throughput in MB/s, latencies in ms', file=out)
+    print('{:12s}|{:12s}|{:>12s}|{:>12s}|{:>9s}|'.format('Treebuilder', 'Metric', 'Old', 'New', 'Change'), file=out)
+    print('-' * 62, file=out)
+    for treebuilder, name, a, b, change, regression in rows:
+        scale = 1e-6 if name == 'throughput' else 1000
+        print('{:12s}|{:12s}|{:12.3f}|{:12.3f}|{:+8.1f}%|{}'.format(
+            treebuilder, name, a * scale, b * scale, change, ' REGRESSION' if regression else ''), file=out)
+# }}}
+
+# Synthetic documents {{{
+# Each generator returns a document of about size characters that exercises
+# one of the expensive paths in the parser. They are seeded, so every run
+# parses exactly the same documents.
+
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod',
+         'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua', 'caf\xe9', '中文')
+ENTITIES = ('&amp;', '&lt;', '&gt;', '&quot;', '&nbsp;', '&copy;', '&eacute;', '&hellip;', '&mdash;', '&rarr;',
+            '&NotNestedGreaterGreater;', '&#160;', '&#x2603;', '&#128512;', '&amp', '&notin', '&unknown;')
+FORMATTING = ('a', 'b', 'big', 'code', 'em', 'font', 'i', 'nobr', 's', 'small', 'strike', 'strong', 'tt', 'u')
+
+
+def words(rng, num):
+    return ' '.join(rng.choice(WORDS) for i in range(num))
+
+
+def generate(size, chunk):
+    ans, total = [], 0
+    while total < size:
+        x = chunk()
+        ans.append(x)
+        total += len(x)
+    return ''.join(ans)
+
+
+def reference(rng, size):
+    # Ordinary, well formed prose, used to normalize the throughput of the other scenarios
+    def chunk():
+        return '<p class="text">{} <a href="/{}">{}</a> {}. <em>{}</em></p>\n'.format(
+            words(rng, 20), rng.randint(0, 10000), words(rng, 3), words(rng, 15), words(rng, 4))
+    return '<!DOCTYPE html><html><head><title>Reference</title></head><body>' + generate(size, chunk)
+
+
+def deep_nesting(rng, size, depth=2000):
+    def chunk():
+        tags = [rng.choice(('div', 'span', 'section', 'blockquote')) for i in range(depth)]
+        return ''.join('<%s>' % t for t in tags) + words(rng, 3) + ''.join('</%s>' % t for t in reversed(tags))
+    return generate(size, chunk)
+
+
+def wide_nodes(rng, size, width=5000):
+    def chunk():
+        return '<ul>{}</ul><div>{}</div>'.format(
+            ''.join('<li>' + rng.choice(WORDS) for i in range(width)), words(rng, width))
+    return generate(size, chunk)
+
+
+def entity_heavy_text(rng, size):
+    def chunk():
+        return '<p title="{}">{}</p>\n'.format(
+            ''.join(rng.choice(ENTITIES) for i in range(10)), ' '.join(
+                rng.choice(ENTITIES) if rng.random() < 0.7 else rng.choice(WORDS) for i in range(100)))
+    return generate(size, chunk)
+
+
+def huge_attribute_counts(rng, size, count=1000):
+    def chunk():
+        attrs = ' '.join('data-{}{}="{}"'.format(rng.choice(WORDS)[:4], rng.randint(0, 10 * count), rng.choice(WORDS))
+                         for i in range(count))
+        return '<div {}>{}</div>\n'.format(attrs, words(rng, 5))
+    return generate(size, chunk)
+
+
+def foreign_content(rng, size):
+    def chunk():
+        return (
+            '<svg viewBox="0 0 100 100" preserveAspectRatio="none"><defs><linearGradient gradientUnits="userSpaceOnUse">'
+            '<stop offset="0"/></linearGradient></defs><g><path d="M {0} {1} L {1} {0}"/><text textLength="{0}">{2}</text>'
+            '<a xlink:href="#x{0}"><circle cx="{0}" cy="{1}" r="4"/></a><foreignObject><p>{2}</p></foreignObject>'
+            '<clippath><rect/></clippath></g></svg><math><mi>x</mi><mo>=</mo><mfrac><mn>{0}</mn><mn>{1}</mn></mfrac>'
+            '<annotation-xml encoding="text/html"><b>{2}</b></annotation-xml><mglyph/><mtext><i>{2}</i></mtext></math>\n'
+        ).format(rng.randint(0, 100), rng.randint(0, 100), words(rng, 4))
+    return generate(size, chunk)
+
+
+def misnested_tables(rng, size):
+    # Foster parenting, implied table elements and formatting elements crossing cells,
+    # the closing </b> stops the depth of the tree growing with the size of the document
+    def chunk():
+        return (
+            '<table><tr><td>{0}</td>{0}<b>{1}<tr><td><table><td>{0}<form><tr>{1}</form></table><p>{0}'
+            '</td><caption>{1}<table><tbody><col><td>{0}</b></table>{1}</table></b>\n'
+        ).format(words(rng, 3), words(rng, 2))
+    return generate(size, chunk)
+
+
+def unclosed_formatting(rng, size, run=50):
+    # Long runs of formatting elements, closed in the wrong order around
+    # blocks, make the adoption agency algorithm and the reconstruction of
+    # active formatting elements expensive. They are all closed at the end, so
+    # the depth of the tree does not grow with the size of the document.
+    def chunk():
+        tags = [rng.choice(FORMATTING) for i in range(run)]
+        ans = ''.join('<%s>' % t for t in tags) + '<p>' + words(rng, 3)
+        shuffled = rng.sample(tags, len(tags))
+        ans += ''.join('</%s><div>%s</div>' % (t, rng.choice(WORDS)) for t in shuffled)
+        # The adoption agency gives up after a few iterations, leaving some elements open
+        return ans + '</p>' + ''.join('</%s>' % t for t in reversed(tags)) + '\n'
+    return generate(size, chunk)
+
+
+SCENARIOS = {f.__name__: f for f in (
+    reference, deep_nesting, wide_nodes, entity_heavy_text, huge_attribute_counts, foreign_content,
+    misnested_tables, unclosed_formatting)}
+
+
+def synthetic_document(name, size=1024 * 1024, seed=0):
+    ' The synthetic document for the named scenario, as UTF-8 encoded bytes '
+    return SCENARIOS[name](random.Random(seed), size).encode('utf-8')
+# }}}
+
+# Synthetic benchmarks {{{
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench-baselines.json')
+
+
+def available_treebuilders(treebuilders=TREEBUILDERS):
+    ' The treebuilders whose dependencies are installed '
+    ans = []
+    for treebuilder in treebuilders:
+        try:
+            parse(b'<p>x', treebuilder=treebuilder)
+        except ImportError as e:
+            print('Skipping the', treebuilder, 'treebuilder:', e, file=sys.stderr)
+        else:
+            ans.append(treebuilder)
+    return tuple(ans)
+
+
+def run_synthetic(scenarios=tuple(SCENARIOS), treebuilders=TREEBUILDERS, size=1024 * 1024, repeat=5, seed=0):
+    '''
+    Time parsing the document for each scenario with each treebuilder,
+    returning a report whose results are named ``scenario:treebuilder``.
+    The reference scenario is always included.
+    '''
+    report = new_report('synthetic', 'size={} seed={}'.format(size, seed))
+    scenarios = ('reference',) + tuple(x for x in scenarios if x != 'reference')
+    docs = {name: synthetic_document(name, size, seed) for name in scenarios}
+    for treebuilder in available_treebuilders(treebuilders):
+        # Interleave the repetitions of the scenarios so that changes in the
+        # load on the machine affect them all equally
+        latencies = {name: [] for name in scenarios}
+        for i in range(repeat):
+            for name in scenarios:
+                latencies[name].append(time_parse(docs[name], 1, treebuilder=treebuilder))
+        for name in scenarios:
+            report['results'][name + ':' + treebuilder] = summarize(latencies[name], len(docs[name]) * repeat, 0)
+    return report
+
+
+def best_throughput(result):
+    return result['bytes'] / result['documents'] / result['latency']['min'] if result['latency']['min'] else 0
+
+
+def relative_throughputs(report):
+    # The best throughput of every scenario relative to that of the reference
+    # document with the same treebuilder, comparable between machines
+    ans = {}
+    for key, r in report['results'].items():
+        name, treebuilder = key.split(':')
+        ref = report['results'].get('reference:' + treebuilder)
+        if name != 'reference' and ref and best_throughput(ref):
+            ans[key] = best_throughput(r) / best_throughput(ref)
+    return ans
+
+
+def check_baselines(report, baselines, tolerance=25):
+    '''
+    Return a list of (name, baseline, measured) for every relative throughput
+    that is more than tolerance percent below its baseline.
+    '''
+    ans = []
+    for key, val in sorted(relative_throughputs(report).items()):
+        base = baselines.get(key)
+        if base is not None and val < base * (1 - tolerance / 100):
+            ans.append((key, base, val))
+    return ans
+
+
+def missing_baselines(report, baselines):
+    ' The names of the relative throughputs in report that have no baseline '
+    return sorted(key for key in relative_throughputs(report) if key not in baselines)
+
+
+def print_synthetic(report, baselines, out=sys.stdout):
+    relative = relative_throughputs(report)
+    print('{:36s}|{:>9s}|{:>9s}|{:>9s}|{:>9s}'.format('Scenario', 'MB/s', 'p50 ms', 'Relative', 'Baseline'), file=out)
+    print('-' * 76, file=out)
+    for key, r in report['results'].items():
+        rel, base = relative.get(key), baselines.get(key)
+        print('{:36s}|{:9.2f}|{:9.3f}|{:>9s}|{:>9s}'.format(
+            key, r['throughput'] / 1e6, r['latency']['p50'] * 1000, '' if rel is None else '%.3f' % rel,
+            '' if base is None else '%.3f' % base), file=out)
+# }}}
+
+# Memory benchmarks {{{
+# Peak memory can only be measured reliably in a fresh process, so every
+# measurement is made by running measure_memory() in a new interpreter.
+
+
+MEMORY_SIZES = (1024 * 1024 // 10, 1024 * 1024, 10 * 1024 * 1024)
+
+
+def proc_status():
+    ans = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            k, sep, v = line.partition(':')
+            if k in ('VmRSS', 'VmHWM'):
+                ans[k] = int(v.split()[0]) * 1024
+    return ans
+
+
+def reset_peak_rss():
+    # Supported on Linux only, elsewhere the peak includes everything before the parse
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except EnvironmentError:
+        pass
+
+
+def release_free_memory():
+    # Return the memory freed by the parser to the OS, so that the retained
+    # memory is that used by the tree and not free space in the heap
+    try:
+        import ctypes
+        ctypes.CDLL(None).malloc_trim(0)
+    except Exception:
+        pass
+
+
+def current_rss():
+    ' The current and peak resident memory of this process, in bytes '
+    try:
+        s = proc_status()
+        return s['VmRSS'], s['VmHWM']
+    except EnvironmentError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        raise SystemExit('Measuring memory on this platform needs psutil')
+    return psutil.Process().memory_info().rss, peak_rss()
+
+
+def measure_memory(path, treebuilder):
+    ' Measure the memory used to parse the file at path with treebuilder, returning a dict '
+    import tracemalloc
+    with open(path, 'rb') as f:
+        data = f.read()
+    parse(b'<p>x', treebuilder=treebuilder)  # import everything the treebuilder needs
+    gc.collect()
+    release_free_memory()
+    reset_peak_rss()
+    before = current_rss()[0]
+    root = parse(data, treebuilder=treebuilder)
+    peak = current_rss()[1]
+    gc.collect()
+    release_free_memory()
+    retained = current_rss()[0]
+    del root
+    gc.collect()
+    # tracemalloc uses a lot of memory itself, so measure the python heap in a
+    # second parse
+    tracemalloc.start()
+    root = parse(data, treebuilder=treebuilder)
+    gc.collect()
+    python_heap, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'bytes': len(data), 'peak_rss': peak - before, 'retained_rss': retained - before,
+        'python_heap': python_heap, 'python_peak': python_peak}
+
+
+def measure_memory_in_subprocess(path, treebuilder):
+    import subprocess
+    env = dict(os.environ)
+    # Use the same html5_parser package in the child
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env.get('PYTHONPATH'))))
+    p = subprocess.Popen([
+        sys.executable, '-c', 'import sys, json; from html5_parser.bench import measure_memory;'
+        ' print(json.dumps(measure_memory(*sys.argv[1:])))', path, treebuilder], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = p.communicate()
+    if p.returncode != 0:
+        raise Exception('Measuring memory failed with error: ' + stderr.decode('utf-8', 'replace'))
+    return json.loads(stdout.decode('utf-8').splitlines()[-1])
+
+
+def run_memory(treebuilders=TREEBUILDERS, sizes=MEMORY_SIZES, scenario='reference', files=(), seed=0):
+    '''
+    Measure the memory needed to parse documents with each treebuilder,
+    returning a report whose results are named ``treebuilder:document``. The
+    documents are the given files or, if there are none, the synthetic
+    documents of the specified scenario in the specified sizes.
+    '''
+    import shutil
+    import tempfile
+    report = new_report('memory', ', '.join(files) if files else '{} sizes={} seed={}'.format(
+        scenario, ','.join(map(str, sizes)), seed))
+    tdir = tempfile.mkdtemp()
+    try:
+        if not files:
+            files = []
+            for size in sizes:
+                files.append(os.path.join(tdir, '%s-%d.html' % (scenario, size)))
+                with open(files[-1], 'wb') as f:
+                    f.write(synthetic_document(scenario, size, seed))
+        for treebuilder in available_treebuilders(treebuilders):
+            for path in files:
+                key = treebuilder + ':' + os.path.basename(path)
+                try:
+                    report['results'][key] = measure_memory_in_subprocess(path, treebuilder)
+                except Exception as e:
+                    print('Skipping', key, str(e).strip(), file=sys.stderr)
+    finally:
+        shutil.rmtree(tdir)
+    return report
+
+
+def print_memory(report, out=sys.stdout):
+    print('Peak and retained are the growth in resident memory caused by parsing, Python is the part'
+          ' of the retained memory allocated by python', file=out)
+    print('{:32s}|{:>10s}|{:>10s}|{:>10s}|{:>10s}|{:>9s}|{:>9s}|{:>9s}'.format(
+        'Treebuilder:document', 'Size', 'Peak', 'Retained', 'Python', 'Peak/B', 'Kept/B', 'Python%'), file=out)
+    print('-' * 106, file=out)
+    for key, r in report['results'].items():
+        size = r['bytes'] or 1
+        print('{:32s}|{:>10s}|{:>10s}|{:>10s}|{:>10s}|{:9.2f}|{:9.2f}|{:9.1f}'.format(
+            key, format_size(r['bytes']), format_size(r['peak_rss']), format_size(r['retained_rss']),
+            format_size(r['python_heap']), r['peak_rss'] / size, r['retained_rss'] / size,
+            100 * r['python_heap'] / r['retained_rss'] if r['retained_rss'] > 0 else 0), file=out)
+# }}}
+
+# Thread scaling benchmarks {{{
+# Phases of parse() that always hold the GIL. The other phases release it
+# while running in C, except that for the treebuilders that do not use lxml,
+# parse_time includes building the tree in python.
+GIL_PHASES = frozenset(('sniff_time', 'chardet_time', 'transcode_time', 'adopt_time', 'treebuilder_time'))
+
+
+def thread_counts(max_threads):
+    ans, n = [], 1
+    while n < max_threads:
+        ans.append(n)
+        n *= 2
+    ans.append(max_threads)
+    return tuple(ans)
+
+
+def parse_in_threads(docs, num_threads, treebuilder, passes=1):
+    # Parse every document passes times using num_threads threads that share
+    # the documents, returning the wall clock time, the latency of every parse
+    # and the total time spent in each phase
+    from threading import Barrier, Lock, Thread
+    work = iter(docs * passes)
+    lock = Lock()
+    barrier = Barrier(num_threads + 1)
+    latencies, phases = [], dict.fromkeys(TIME_FIELDS, 0.0)
+    errors = []
+
+    def worker():
+        my_latencies, my_phases = [], dict.fromkeys(TIME_FIELDS, 0.0)
+        barrier.wait()
+        try:
+            while True:
+                with lock:
+                    doc = next(work, None)
+                if doc is None:
+                    break
+                stats = ParseStats(memory=False)
+                start = perf_counter()
+                parse(doc[1], transport_encoding=doc[2], treebuilder=treebuilder, stats=stats)
+                my_latencies.append(perf_counter() - start)
+                for k in TIME_FIELDS:
+                    my_phases[k] += getattr(stats, k)
+        except Exception as e:
+            errors.append(e)
+        with lock:
+            latencies.extend(my_latencies)
+            for k, v in my_phases.items():
+                phases[k] += v
+
+    threads = [Thread(target=worker, name='ParseWorker-%d' % i) for i in range(num_threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = perf_counter()
+    for t in threads:
+        t.join()
+    wall = perf_counter() - start
+    if errors:
+        raise errors[0]
+    return wall, latencies, phases
+
+
+def run_threads(docs, treebuilders=('lxml',), max_threads=None, passes=1):
+    '''
+    Parse the documents, a list of (name, data, transport_encoding), with 1
+    to max_threads threads for each treebuilder, returning a report whose
+    results are named ``treebuilder:threads``.
+    '''
+    max_threads = max_threads or os.cpu_count() or 1
+    report = new_report('threads', '{} documents, {} passes'.format(len(docs), passes))
+    num_bytes = sum(len(d[1]) for d in docs) * passes
+    for treebuilder in available_treebuilders(treebuilders):
+        parse(docs[0][1], transport_encoding=docs[0][2], treebuilder=treebuilder)  # warm up
+        base = None
+        for n in thread_counts(max_threads):
+            wall, latencies, phases = parse_in_threads(docs, n, treebuilder, passes)
+            r = summarize(latencies, num_bytes, 0)
+            r['seconds'], r['throughput'], r['threads'] = wall, num_bytes / wall, n
+            base = base or r['throughput']
+            r['speedup'] = r['throughput'] / base
+            # The Karp-Flatt metric, an estimate of the serial fraction of the work
+            r['serial_fraction'] = (n / r['speedup'] - 1) / (n - 1) if n > 1 else 0
+            r['phases'] = {k: v / len(latencies) for k, v in phases.items()}
+            report['results'][treebuilder + ':' + str(n)] = r
+    return report
+
+
+def print_threads(report, out=sys.stdout):
+    rows = {}
+    for key, r in report['results'].items():
+        rows.setdefault(key.rpartition(':')[0], []).append(r)
+    phases = [k for k in TIME_FIELDS if any(r['phases'][k] for rs in rows.values() for r in rs)]
+    for treebuilder, rs in rows.items():
+        print('Treebuilder:', treebuilder, file=out)
+        print('{:>7s}|{:>9s}|{:>8s}|{:>8s}|'.format('Threads', 'MB/s', 'Speedup', 'Serial%') + '|'.join(
+            '{:>12s}'.format(k[:-5] + ('*' if k in GIL_PHASES else '')) for k in phases), file=out)
+        print('-' * (36 + 13 * len(phases)), file=out)
+        for r in rs:
+            print('{:7d}|{:9.2f}|{:8.2f}|{:8.1f}|'.format(
+                r['threads'], r['throughput'] / 1e6, r['speedup'], r['serial_fraction'] * 100) + '|'.join(
+                    '{:12.3f}'.format(r['phases'][k] * 1000) for k in phases), file=out)
+        first, last = rs[0], rs[-1]
+        growth = {k: last['phases'][k] - first['phases'][k] for k in phases}
+        total = sum(growth.values())
+        if len(rs) > 1 and total > 0:
+            print('Slowdown per document from {} to {} threads, by phase: {}'.format(
+                first['threads'], last['threads'], ', '.join(
+                    '{} {:+.3f} ms ({:.0f}%)'.format(k[:-5], v * 1000, 100 * v / total) for k, v in sorted(
+                        growth.items(), key=lambda x: -x[1]) if v > 0)), file=out)
+        print(file=out)
+    print('Phase columns are milliseconds per document, * marks phases that hold the GIL', file=out)
+# }}}
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def treebuilder_list(x):
+    ans = tuple(t.strip() for t in x.split(','))
+    for t in ans:
+        if t not in TREEBUILDERS:
+            raise argparse.ArgumentTypeError('Unknown treebuilder: %s' % t)
+    return ans
+
+
+def cmd_replay(opts):
+    report = replay_corpus(opts.corpus, opts.treebuilders, repeat=max(1, opts.repeat), limit=opts.limit)
+    print_report(report)
+    if opts.output:
+        save_report(report, opts.output)
+
+
+def cmd_synthetic(opts):
+    report = run_synthetic(opts.scenarios, opts.treebuilders, size=opts.size, repeat=max(1, opts.repeat), seed=opts.seed)
+    baselines, checked = {}, True
+    if os.path.exists(opts.baselines):
+        b = load_report(opts.baselines)
+        if (b['size'], b['seed']) == (opts.size, opts.seed):
+            baselines = b['relative_throughput']
+        else:
+            checked = False
+            print('The baselines were measured with a different size or seed, not checking them', file=sys.stderr)
+    print_synthetic(report, baselines)
+    if opts.output:
+        save_report(report, opts.output)
+    if opts.update_baselines:
+        baselines.update((k, round(v, 3)) for k, v in relative_throughputs(report).items())
+        save_report({'size': opts.size, 'seed': opts.seed, 'relative_throughput': baselines}, opts.baselines)
+        return
+    failed = check_baselines(report, baselines, opts.tolerance)
+    for key, base, val in failed:
+        print('{} is slower than its baseline: {:.3f} < {:.3f}'.format(key, val, base), file=sys.stderr)
+    # A scenario without a baseline is not checked at all, so it must not pass silently
+    missing = missing_baselines(report, baselines) if checked else []
+    for key in missing:
+        print('{} has no baseline, store one with --update-baselines'.format(key), file=sys.stderr)
+    if failed or missing:
+        raise SystemExit(1)
+
+
+def cmd_memory(opts):
+    report = run_memory(opts.treebuilders, opts.sizes, opts.scenario, opts.files, opts.seed)
+    print_memory(report)
+    if opts.output:
+        save_report(report, opts.output)
+
+
+def cmd_threads(opts):
+    if opts.corpus:
+        docs = list(read_corpus(opts.corpus))[:opts.limit]
+    else:
+        # The synthetic documents have no <meta> charset, so avoid spending most
+        # of the time looking for one by telling the parser they are UTF-8
+        docs = [('reference-%d' % i, synthetic_document('reference', opts.size, seed=i), 'utf-8')
+                for i in range(opts.documents)]
+    if not docs:
+        raise SystemExit('No documents found in: ' + opts.corpus)
+    report = run_threads(docs, opts.treebuilders, opts.threads, passes=max(1, opts.repeat))
+    print_threads(report)
+    if opts.output:
+        save_report(report, opts.output)
+
+
+def size_list(x):
+    return tuple(int(float(t.strip()) * 1024 * 1024) for t in x.split(','))
+
+
+def scenario_list(x):
+    ans = tuple(t.strip() for t in x.split(','))
+    for t in ans:
+        if t not in SCENARIOS:
+            raise argparse.ArgumentTypeError('Unknown scenario: %s' % t)
+    return ans
+
+
+def cmd_diff(opts):
+    rows = diff_reports(load_report(opts.old), load_report(opts.new), opts.threshold)
+    print_diff(rows)
+    if any(r[-1] for r in rows):
+        raise SystemExit(1)
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(prog='python -m html5_parser.bench', description='Benchmark html5-parser')
+    s = p.add_subparsers(dest='command')
+    s.required = True
+
+    r = s.add_parser('replay', help='Parse every document in a corpus and report the performance')
+    r.add_argument('corpus', help='A directory of HTML files, a tar archive of them or a WARC file')
+    r.add_argument('--treebuilders', '-t', default=('lxml',), type=treebuilder_list,
+                   help='Comma separated list of treebuilders to use, from: ' + ', '.join(TREEBUILDERS))
+    r.add_argument('--repeat', '-r', default=1, type=int, help='Number of times to parse each document, the fastest is used')
+    r.add_argument('--limit', type=int, help='Only use this many documents from the corpus')
+    r.add_argument('--output', '-o', help='Save the report as JSON to this file')
+    r.set_defaults(func=cmd_replay)
+
+    y = s.add_parser('synthetic', help='Parse generated documents that exercise the expensive paths in the parser')
+    y.add_argument('--scenarios', default=tuple(SCENARIOS), type=scenario_list,
+                   help='Comma separated list of scenarios to run, from: ' + ', '.join(SCENARIOS))
+    y.add_argument('--treebuilders', '-t', default=TREEBUILDERS, type=treebuilder_list,
+                   help='Comma separated list of treebuilders to use, by default all that are available')
+    y.add_argument('--size', default=1024 * 1024, type=int, help='The approximate size of each document in characters')
+    y.add_argument('--seed', default=0, type=int, help='The seed for the random number generator')
+    y.add_argument('--repeat', '-r', default=5, type=int, help='Number of times to parse each document')
+    y.add_argument('--output', '-o', help='Save the report as JSON to this file')
+    y.add_argument('--baselines', default=BASELINES, help='The file containing the baseline relative throughputs')
+    y.add_argument('--tolerance', default=25, type=float,
+                   help='How many percent below its baseline a relative throughput can be before it is a failure')
+    y.add_argument('--update-baselines', action='store_true', help='Save the measured relative throughputs as the baselines')
+    y.set_defaults(func=cmd_synthetic)
+
+    m = s.add_parser('memory', help='Measure the memory used to parse documents, with each treebuilder')
+    m.add_argument('files', nargs='*', help='The documents to parse, by default synthetic documents are used')
+    m.add_argument('--treebuilders', '-t', default=TREEBUILDERS, type=treebuilder_list,
+                   help='Comma separated list of treebuilders to use, by default all that are available')
+    m.add_argument('--sizes', default=MEMORY_SIZES, type=size_list,
+                   help='Comma separated list of the sizes of the synthetic documents, in MB, by default: 0.1,1,10')
+    m.add_argument('--scenario', default='reference', choices=tuple(SCENARIOS), help='The synthetic document to use')
+    m.add_argument('--seed', default=0, type=int, help='The seed for the random number generator')
+    m.add_argument('--output', '-o', help='Save the report as JSON to this file')
+    m.set_defaults(func=cmd_memory)
+
+    t = s.add_parser('threads', help='Parse a corpus with increasing numbers of threads and report the scaling')
+    t.add_argument('corpus', nargs='?', help='A directory of HTML files, a tar archive of them or a WARC file,'
+                   ' by default synthetic documents are used')
+    t.add_argument('--treebuilders', '-t', default=('lxml',), type=treebuilder_list,
+                   help='Comma separated list of treebuilders to use, from: ' + ', '.join(TREEBUILDERS))
+    t.add_argument('--threads', '-j', default=os.cpu_count() or 1, type=int,
+                   help='The maximum number of threads, powers of two up to it are used. Default: the number of CPUs')
+    t.add_argument('--repeat', '-r', default=1, type=int, help='Number of times to parse the whole corpus')
+    t.add_argument('--limit', type=int, help='Only use this many documents from the corpus')
+    t.add_argument('--documents', default=64, type=int, help='The number of synthetic documents')
+    t.add_argument('--size', default=64 * 1024, type=int,
+                   help='The approximate size of each synthetic document in characters')
+    t.add_argument('--output', '-o', help='Save the report as JSON to this file')
+    t.set_defaults(func=cmd_threads)
+
+    d = s.add_parser('diff', help='Compare two JSON reports, exiting with an error if performance has regressed')
+    d.add_argument('old', help='The report to compare against')
+    d.add_argument('new', help='The new report')
+    d.add_argument('--threshold', default=5, type=float, help='The percentage change that is a regression')
+    d.set_defaults(func=cmd_diff)
+
+    opts = p.parse_args(args)
+    opts.func(opts)
+
+
+if __name__ == '__main__':
+    main()
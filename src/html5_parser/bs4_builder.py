@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import codecs
+
+from bs4.builder import HTMLTreeBuilder, builder_registry
+from bs4.element import Comment, Doctype, NavigableString, Tag
+
+NAME = 'html5-parser'
+
+
+def normalize_encoding(name):
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return name.lower()
+
+
+class HTML5ParserTreeBuilder(HTMLTreeBuilder):
+
+    '''
+    A BeautifulSoup tree builder that uses html5-parser. Importing this module
+    registers it, after which ``BeautifulSoup(markup, 'html5-parser')`` parses
+    markup with html5-parser, detecting the encoding of bytes the same way as
+    :func:`html5_parser.parse`, except that encodings in ``exclude_encodings``
+    are skipped. Only the ``html5-parser`` and ``html5_parser`` features are
+    registered, so the builders bs4 picks for ``html`` and ``permissive`` are
+    not changed.
+    '''
+
+    NAME = NAME
+    ALTERNATE_NAMES = ['html5_parser']
+    features = [NAME, 'html5_parser']
+    is_xml = False
+    picklable = True
+    encoding = None
+
+    def prepare_markup(self, markup, user_specified_encoding=None, document_declared_encoding=None, exclude_encodings=None):
+        # Decoding is done by feed(), using as_utf8() with the encoding found
+        # here, which bs4 stores as the original_encoding of the soup
+        self.encoding = None
+        if isinstance(markup, bytes):
+            self.encoding, declared = self.detect_encoding(markup, user_specified_encoding, exclude_encodings or ())
+            document_declared_encoding = declared or document_declared_encoding
+        yield (markup, self.encoding, document_declared_encoding, False)
+
+    def detect_encoding(self, markup, transport_encoding, exclude_encodings):
+        ' Return the encoding of markup, in the order used by as_utf8(), and the encoding declared by its <meta> tag '
+        from html5_parser import BOMS, check_bom, check_for_meta_charset, detect_encoding, safe_get_preferred_encoding
+        if transport_encoding:
+            return transport_encoding, None
+        bom = check_bom(markup)
+        if bom is not None:
+            return BOMS[bom], None
+        excluded = frozenset(map(normalize_encoding, exclude_encodings))
+
+        def usable(encoding):
+            return bool(encoding) and normalize_encoding(encoding) not in excluded
+
+        declared = check_for_meta_charset(markup)
+        if usable(declared):
+            return declared, declared
+        encoding = detect_encoding(markup)
+        if usable(encoding):
+            return encoding, declared
+        for encoding in (safe_get_preferred_encoding(), 'windows-1252'):
+            if usable(encoding):
+                return encoding, declared
+        raise ValueError('All the candidate encodings for the markup are excluded')
+
+    def feed(self, markup):
+        from html5_parser import as_utf8, check_bom, html_parser
+        soup = self.soup
+        classes = getattr(soup, 'element_classes', {})
+        tag_class = classes.get(Tag, Tag)
+        encoding = self.encoding
+        if isinstance(markup, bytes) and (encoding == 'x-user-defined' or check_bom(markup) is not None):
+            encoding = None  # as_utf8() finds the same encoding and handles these cases itself
+        data = as_utf8(markup or b'', encoding)
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+
+        def new_tag(name, attrs):
+            return tag_class(soup, name=name, attrs=attrs, builder=self)
+
+        def add_doctype(name, public_id, system_id):
+            soup.append(classes.get(Doctype, Doctype).for_name_and_ids(name, public_id or None, system_id or None))
+
+        list_attributes = self.cdata_list_attributes
+        if list_attributes:
+            list_attributes = {k: frozenset(v) for k, v in list_attributes.items()}
+        root = html_parser.parse_soup(
+            data, new_tag, classes.get(Comment, Comment), classes.get(NavigableString, NavigableString),
+            list_attributes or None, add_doctype)
+        soup.append(root)
+
+    def test_fragment_to_document(self, fragment):
+        return '<html><head></head><body>%s</body></html>' % fragment
+
+
+builder_registry.register(HTML5ParserTreeBuilder)
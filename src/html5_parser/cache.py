@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+
+from .stats import ParseStats
+
+
+class ParseCache(object):
+    '''
+    An in-memory, least recently used cache of parsed documents. Pass an
+    instance of this class as the ``cache`` parameter to
+    :func:`html5_parser.parse` and parsing the same HTML with the same options
+    again will return a copy of the cached document instead of re-parsing it.
+
+    Documents are keyed by a hash of their contents and all the options that
+    affect the parsed tree. The size of a document is the memory used by its
+    tree, as counted by ``libxml_bytes`` in :class:`html5_parser.ParseStats`,
+    which is typically several times the size of the HTML. When the total
+    size exceeds :attr:`max_bytes`, the least recently used documents are
+    evicted. The :attr:`hits`, :attr:`misses` and :attr:`evictions` attributes
+    count cache activity. Instances are thread safe.
+
+    :param max_bytes: The maximum total memory used by the cached trees.
+    '''
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def parse(self, data, options):
+        from . import html_parser
+        key = blake2b(data, digest_size=20).digest(), tuple(sorted(options.items()))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            return html_parser.clone_doc(entry[0])
+        stats = ParseStats()
+        capsule = html_parser.parse(data, stats=stats, **options)
+        size = stats.libxml_bytes
+        if size > self.max_bytes:
+            return capsule
+        ans = html_parser.clone_doc(capsule)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = capsule, size
+                self.current_bytes += size
+                while self.current_bytes > self.max_bytes:
+                    self.current_bytes -= self.entries.popitem(last=False)[1][1]
+                    self.evictions += 1
+        return ans
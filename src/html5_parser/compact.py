@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import mmap
+import struct
+import sys
+from array import array
+
+from lxml import etree
+
+# See src/compact.c for a description of the format
+MAGIC = b'H5PCMPT\0'
+VERSION = 1
+HEADER = struct.Struct('<8s8I')
+ELEMENT, TEXT, COMMENT = 1, 2, 3
+
+
+class Writer(object):
+
+    def __init__(self):
+        self.strings = {}
+        self.string_table = array('I', (0, 0))
+        self.words = array('I')
+        self.blob = bytearray()
+
+    def text(self, x):
+        raw = x.encode('utf-8')
+        offset = len(self.blob)
+        self.blob += raw
+        self.blob.append(0)
+        return offset, len(raw)
+
+    def string(self, x):
+        if x is None:
+            return 0
+        ans = self.strings.get(x)
+        if ans is None:
+            ans = self.strings[x] = len(self.string_table) // 2
+            self.string_table.extend(self.text(x))
+        return ans
+
+    def add_text(self, kind, x):
+        self.words.append(kind)
+        self.words.extend(self.text(x))
+
+    def add_element(self, elem, nsdefs, children):
+        s = self.string
+        tag = elem.tag
+        href = None
+        if tag.startswith('{'):
+            href, _, tag = tag[1:].partition('}')
+        attrs = elem.items()
+        self.words.extend((
+            ELEMENT, s(tag), s(href), s(elem.prefix if href else None), elem.sourceline or 0,
+            len(nsdefs), len(attrs), len(children)))
+        for prefix, href in nsdefs:
+            self.words.extend((s(prefix), s(href)))
+        for name, val in attrs:
+            href = None
+            if name.startswith('{'):
+                href, _, name = name[1:].partition('}')
+            self.words.extend((s(name), s(href)))
+            self.words.extend(self.text(val))
+
+    def header(self, num_top, doctype):
+        name, public_id, system_id = map(self.string, doctype)
+        return HEADER.pack(
+            MAGIC, VERSION, len(self.string_table) // 2, len(self.words), len(self.blob), num_top,
+            name, public_id, system_id)
+
+
+def children_of(elem):
+    ans = []
+    if elem.text:
+        ans.append(elem.text)
+    for child in elem.iterchildren():
+        if child.tag is etree.Comment or isinstance(child.tag, str):
+            ans.append(child)
+        if child.tail:
+            ans.append(child.tail)
+    return ans
+
+
+def namespace_definitions(root):
+    # Yield the namespaces declared on each element below root, in document
+    # order. Unlike nsmap, this includes redundant redeclarations.
+    nsdefs = []
+    for event, x in etree.iterwalk(root, events=('start', 'start-ns')):
+        if event == 'start':
+            yield nsdefs
+            nsdefs = []
+        else:
+            nsdefs.append((x[0] or None, x[1]))
+
+
+def dump(tree, path):
+    if hasattr(tree, 'getroottree'):
+        tree = tree.getroottree()
+    root = tree.getroot()
+    w = Writer()
+    top = list(root.itersiblings(preceding=True))[::-1] + [root] + list(root.itersiblings())
+    top = [x for x in top if x is root or x.tag is etree.Comment]
+    # Elements are visited in the same order as by namespace_definitions()
+    nsdefs = namespace_definitions(root)
+    stack = top[::-1]
+    while stack:
+        node = stack.pop()
+        if not hasattr(node, 'tag'):
+            w.add_text(TEXT, node)
+        elif node.tag is etree.Comment:
+            w.add_text(COMMENT, node.text or '')
+        else:
+            children = children_of(node)
+            w.add_element(node, next(nsdefs), children)
+            stack.extend(reversed(children))
+    docinfo = tree.docinfo
+    doctype = (docinfo.root_name, docinfo.public_id, docinfo.system_url) if docinfo.doctype else (None, None, None)
+    header = w.header(len(top), doctype)
+    if sys.byteorder != 'little':
+        w.string_table.byteswap(), w.words.byteswap()
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(w.string_table.tobytes())
+        f.write(w.words.tobytes())
+        f.write(w.blob)
+
+
+def load(path):
+    from . import html_parser
+    with open(path, 'rb') as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise ValueError('{} is not a compact tree file'.format(path))
+        with m:
+            return html_parser.load_compact(m)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+
+class ParsedDocument(object):
+    '''
+    A parsed HTML document, as returned by :func:`html5_parser.parse_raw`,
+    that can be converted into any number of trees of different types without
+    parsing the HTML again. The parse tree is freed when :meth:`close` is
+    called, when the ``with`` block using the document ends or when the
+    document is garbage collected. Trees that have already been converted
+    remain valid after the document is closed, except native trees.
+    '''
+
+    def __init__(self, capsule, options):
+        self._capsule, self.options = capsule, options
+
+    @property
+    def closed(self):
+        return self._capsule is None
+
+    def _tree(self):
+        if self._capsule is None:
+            raise ValueError('The parsed document has been closed')
+        return self._capsule
+
+    def to_lxml(self, return_root=True, treebuilder='lxml'):
+        ' Return an lxml tree, ``treebuilder`` can also be ``lxml_html`` '
+        from . import html_parser, tree_from_capsule
+        return tree_from_capsule(html_parser.parse(self._tree(), **self.options), treebuilder, return_root)
+
+    def to_etree(self, return_root=True):
+        ' Return a :mod:`xml.etree.ElementTree` tree '
+        from . import html_parser, tree_from_capsule
+        if self.options['maybe_xhtml']:
+            return tree_from_capsule(html_parser.parse(self._tree(), **self.options), 'stdlib_etree', return_root)
+        from .stdlib_etree import parse
+        return parse(self._tree(), return_root=return_root, **self.options)
+
+    def to_soup(self, return_root=True):
+        ' Return a BeautifulSoup tree '
+        from .soup import parse
+        return parse(
+            self._tree(), return_root=return_root, keep_doctype=self.options['keep_doctype'],
+            stack_size=self.options['stack_size'])
+
+    def to_native(self, return_root=True):
+        ' Return a tree of the type created by the ``native`` treebuilder, which is valid only until the document is closed '
+        from .native import from_tree
+        return from_tree(self._tree(), return_root)
+
+    def to_text(self):
+        ' Return the text of all text nodes in the document, concatenated '
+        from . import html_parser
+        return html_parser.native_text(self._tree(), 0)
+
+    def close(self):
+        if self._capsule is not None:
+            from . import html_parser
+            html_parser.close_native(self._capsule)
+            self._capsule = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *a):
+        self.close()
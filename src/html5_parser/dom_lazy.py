@@ -0,0 +1,471 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+# A read-only xml.dom.minidom compatible facade over an lxml tree. Proxy
+# objects are created only for the nodes that are actually accessed, so unlike
+# html5_parser.dom.adapt() the cost is proportional to the part of the tree
+# that is visited, not to the size of the document. The tree presented is the
+# same as the one built by html5_parser.dom.adapt().
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import xml.dom
+from collections import OrderedDict
+from xml.dom import EMPTY_NAMESPACE, Node, NoModificationAllowedErr
+
+from lxml.etree import _Comment
+
+from .dom import attr_name_parts, elem_name_parts
+
+try:
+    dict_items = dict.iteritems  # type: ignore
+except AttributeError:
+    dict_items = dict.items
+
+
+def write_data(writer, data):
+    if data:
+        writer.write(data.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;'))
+
+
+def split_qname(qname):
+    prefix, sep, local_name = qname.partition(':')
+    return (prefix, local_name) if sep else (None, qname)
+
+
+def read_only(*a, **kw):
+    raise NoModificationAllowedErr('Trees created by the dom_lazy treebuilder are read only')
+
+
+class LazyNode(Node):
+
+    __slots__ = ('ownerDocument', '_parent', '_index')
+    attributes = None
+    childNodes = ()
+    nodeValue = None
+    namespaceURI = localName = prefix = None
+    appendChild = insertBefore = removeChild = replaceChild = normalize = read_only
+
+    def __init__(self, document, parent=None, index=None):
+        self.ownerDocument, self._parent, self._index = document, parent, index
+
+    @property
+    def parentNode(self):
+        return self._parent
+
+    @property
+    def firstChild(self):
+        c = self.childNodes
+        return c[0] if c else None
+
+    @property
+    def lastChild(self):
+        c = self.childNodes
+        return c[-1] if c else None
+
+    def _sibling(self, delta):
+        parent = self.parentNode
+        if parent is None or parent.nodeType == Node.DOCUMENT_NODE:
+            return None
+        siblings = parent.childNodes  # sets self._index
+        i = self._index + delta
+        return siblings[i] if 0 <= i < len(siblings) else None
+
+    @property
+    def previousSibling(self):
+        return self._sibling(-1)
+
+    @property
+    def nextSibling(self):
+        return self._sibling(1)
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+    def hasAttributes(self):
+        return False
+
+    def isSameNode(self, other):
+        return self is other
+
+    def toprettyxml(self, indent='\t', newl='\n', encoding=None):
+        writer = io.StringIO()
+        if self.nodeType == Node.DOCUMENT_NODE:
+            self.writexml(writer, '', indent, newl, encoding)
+        else:
+            self.writexml(writer, '', indent, newl)
+        ans = writer.getvalue()
+        return ans if encoding is None else ans.encode(encoding, 'xmlcharrefreplace')
+
+    def toxml(self, encoding=None):
+        return self.toprettyxml('', '', encoding)
+
+
+class CharacterData(LazyNode):
+
+    __slots__ = ('data',)
+
+    def __init__(self, document, data, parent, index):
+        LazyNode.__init__(self, document, parent, index)
+        self.data = data
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+    @property
+    def length(self):
+        return len(self.data)
+
+    def substringData(self, offset, count):
+        return self.data[offset:offset+count]
+
+    def __repr__(self):
+        return '<DOM %s node %r>' % (self.__class__.__name__, self.data[:10])
+
+
+class Text(CharacterData):
+
+    __slots__ = ()
+    nodeType = Node.TEXT_NODE
+    nodeName = '#text'
+
+    @property
+    def wholeText(self):
+        return self.data
+
+    def writexml(self, writer, indent='', addindent='', newl=''):
+        write_data(writer, '%s%s%s' % (indent, self.data, newl))
+
+
+class Comment(CharacterData):
+
+    __slots__ = ()
+    nodeType = Node.COMMENT_NODE
+    nodeName = '#comment'
+
+    def writexml(self, writer, indent='', addindent='', newl=''):
+        writer.write('%s<!--%s-->%s' % (indent, self.data, newl))
+
+
+class Attr(LazyNode):
+
+    __slots__ = ('namespaceURI', 'name', 'localName', 'prefix', 'value', 'ownerElement')
+    nodeType = Node.ATTRIBUTE_NODE
+    specified = True
+
+    def __init__(self, element, uri, qname, value):
+        LazyNode.__init__(self, element.ownerDocument)
+        self.ownerElement, self.namespaceURI, self.name, self.value = element, uri, qname, value
+        self.prefix, self.localName = split_qname(qname)
+
+    @property
+    def nodeName(self):
+        return self.name
+
+    @property
+    def nodeValue(self):
+        return self.value
+
+    @property
+    def parentNode(self):
+        return None
+
+    def __repr__(self):
+        return '<DOM Attr %s=%r>' % (self.name, self.value)
+
+
+class NamedNodeMap(object):
+
+    # A read-only version of the NamedNodeMap from xml.dom.minidom
+
+    __slots__ = ('_attrs',)
+
+    def __init__(self, attrs):
+        self._attrs = attrs
+
+    @property
+    def length(self):
+        return len(self._attrs)
+
+    def __len__(self):
+        return len(self._attrs)
+
+    def item(self, index):
+        return self._attrs[index] if 0 <= index < len(self._attrs) else None
+
+    def keys(self):
+        return [a.name for a in self._attrs]
+
+    def keysNS(self):
+        return [(a.namespaceURI, a.localName) for a in self._attrs]
+
+    def values(self):
+        return list(self._attrs)
+
+    def items(self):
+        return [(a.name, a.value) for a in self._attrs]
+
+    def itemsNS(self):
+        return [((a.namespaceURI, a.localName), a.value) for a in self._attrs]
+
+    def getNamedItem(self, name):
+        for a in self._attrs:
+            if a.name == name:
+                return a
+
+    def getNamedItemNS(self, uri, local_name):
+        for a in self._attrs:
+            if a.namespaceURI == uri and a.localName == local_name:
+                return a
+
+    def __contains__(self, key):
+        if isinstance(key, tuple):
+            return self.getNamedItemNS(*key) is not None
+        return self.getNamedItem(key) is not None
+
+    def __getitem__(self, key):
+        ans = self.getNamedItemNS(*key) if isinstance(key, tuple) else self.getNamedItem(key)
+        if ans is None:
+            raise KeyError(key)
+        return ans
+
+    def get(self, key, default=None):
+        ans = self.getNamedItemNS(*key) if isinstance(key, tuple) else self.getNamedItem(key)
+        return default if ans is None else ans
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    setNamedItem = setNamedItemNS = removeNamedItem = removeNamedItemNS = read_only
+
+
+def iter_matching(src, uri, local_name, prefix=False):
+    if uri == '*':
+        tag = '{*}' + local_name if local_name != '*' else None
+    else:
+        tag = '{%s}%s' % (uri or '', local_name)
+    for elem in src.iterdescendants(tag):
+        if not isinstance(elem, _Comment) and isinstance(elem.tag, str) and (prefix is False or elem.prefix == prefix):
+            yield elem
+
+
+class Element(LazyNode):
+
+    __slots__ = ('_src', '_children', '_attrs', 'namespaceURI', 'tagName')
+    nodeType = Node.ELEMENT_NODE
+    setAttribute = setAttributeNS = removeAttribute = removeAttributeNS = setIdAttribute = read_only
+
+    def __init__(self, document, src):
+        LazyNode.__init__(self, document)
+        self._src = src
+        self._children = self._attrs = None
+        self.namespaceURI, self.tagName = elem_name_parts(src)
+
+    @property
+    def nodeName(self):
+        return self.tagName
+
+    @property
+    def prefix(self):
+        return split_qname(self.tagName)[0]
+
+    @property
+    def localName(self):
+        return split_qname(self.tagName)[1]
+
+    @property
+    def parentNode(self):
+        if self._parent is None:
+            p = self._src.getparent()
+            self._parent = self.ownerDocument if p is None else self.ownerDocument._wrap(p)
+        return self._parent
+
+    @property
+    def childNodes(self):
+        if self._children is None:
+            doc, src = self.ownerDocument, self._src
+            self._children = ans = []
+            if src.text:
+                ans.append(Text(doc, src.text, self, 0))
+            for child in src.iterchildren():
+                if isinstance(child, _Comment):
+                    c = Comment(doc, (child.text or '').replace('--', '—'), self, len(ans))
+                else:
+                    c = doc._wrap(child)
+                    c._parent, c._index = self, len(ans)
+                ans.append(c)
+                if child.tail:
+                    ans.append(Text(doc, child.tail, self, len(ans)))
+        return self._children
+
+    def _get_attributes(self):
+        if self._attrs is None:
+            src = self._src
+            # Added the way setAttributeNS() adds them in the dom treebuilder.
+            # An attribute with the same namespace and local name as an
+            # earlier one, such as xml:lang after lang with sanitize_names=False,
+            # only updates the value of the earlier one, which keeps its name.
+            # minidom also renames that Attr node, but keeps it under the old
+            # name, which it uses for output and getAttribute(), as here.
+            # Otherwise an attribute replaces any earlier one with the same
+            # qualified name and moves to the end.
+            attrs, by_ns = OrderedDict(), {}
+
+            def add(uri, qname, value):
+                a = Attr(self, uri, qname, value)
+                prev = by_ns.get((uri, a.localName))
+                if prev is not None:
+                    prev.value = value
+                    return
+                prev = attrs.pop(qname, None)
+                if prev is not None:
+                    del by_ns[(prev.namespaceURI, prev.localName)]
+                attrs[qname] = by_ns[(uri, a.localName)] = a
+
+            changed = src.nsmap
+            if changed:
+                p = src.getparent()
+                if p is not None:
+                    # Only add namespace declarations different from the parent's
+                    p = p.nsmap or {}
+                    changed = {k: v for k, v in dict_items(changed) if v != p.get(k)}
+                for prefix, uri in dict_items(changed):
+                    add('xmlns', ('xmlns:' + prefix) if prefix else 'xmlns', uri)
+            for name, val in src.items():
+                add(*attr_name_parts(name, src, val))
+            self._attrs = list(attrs.values())
+        return self._attrs
+
+    @property
+    def attributes(self):
+        return NamedNodeMap(self._get_attributes())
+
+    def hasAttributes(self):
+        return bool(self._get_attributes())
+
+    def getAttributeNode(self, name):
+        return NamedNodeMap(self._get_attributes()).getNamedItem(name)
+
+    def getAttributeNodeNS(self, uri, local_name):
+        return NamedNodeMap(self._get_attributes()).getNamedItemNS(uri, local_name)
+
+    def getAttribute(self, name):
+        a = self.getAttributeNode(name)
+        return '' if a is None else a.value
+
+    def getAttributeNS(self, uri, local_name):
+        a = self.getAttributeNodeNS(uri, local_name)
+        return '' if a is None else a.value
+
+    def hasAttribute(self, name):
+        return self.getAttributeNode(name) is not None
+
+    def hasAttributeNS(self, uri, local_name):
+        return self.getAttributeNodeNS(uri, local_name) is not None
+
+    def getElementsByTagName(self, name):
+        return self.ownerDocument._matching(self._src, name)
+
+    def getElementsByTagNameNS(self, uri, local_name):
+        return self.ownerDocument._matching_ns(self._src, uri, local_name)
+
+    def writexml(self, writer, indent='', addindent='', newl=''):
+        writer.write(indent + '<' + self.tagName)
+        for a in self._get_attributes():
+            writer.write(' %s="' % a.name)
+            write_data(writer, a.value)
+            writer.write('"')
+        children = self.childNodes
+        if children:
+            writer.write('>')
+            if len(children) == 1 and children[0].nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
+                children[0].writexml(writer, '', '', '')
+            else:
+                writer.write(newl)
+                for node in children:
+                    node.writexml(writer, indent + addindent, addindent, newl)
+                writer.write(indent)
+            writer.write('</%s>%s' % (self.tagName, newl))
+        else:
+            writer.write('/>%s' % newl)
+
+    def __repr__(self):
+        return '<DOM Element: %s at %#x>' % (self.tagName, id(self))
+
+
+class Document(LazyNode):
+
+    __slots__ = ('_root', '_nodes', 'doctype')
+    nodeType = Node.DOCUMENT_NODE
+    nodeName = '#document'
+    implementation = xml.dom.getDOMImplementation('minidom')
+    createElement = createElementNS = createTextNode = createComment = importNode = read_only
+
+    def __init__(self, source_tree):
+        LazyNode.__init__(self, self)
+        self.ownerDocument = None
+        self._nodes = {}
+        self.doctype = source_tree.docinfo.doctype
+        self._root = source_tree.getroot()
+
+    def _wrap(self, src):
+        ans = self._nodes.get(src)
+        if ans is None:
+            ans = self._nodes[src] = Element(self, src)
+        return ans
+
+    def _matching(self, src, name):
+        if name == '*':
+            return [self._wrap(e) for e in iter_matching(src, '*', '*')]
+        prefix, local_name = split_qname(name)
+        return [self._wrap(e) for e in iter_matching(src, '*', local_name, prefix)]
+
+    def _matching_ns(self, src, uri, local_name):
+        if uri not in ('*', EMPTY_NAMESPACE):
+            return [self._wrap(e) for e in iter_matching(src, uri, local_name)]
+        ans = []
+        for e in iter_matching(src, '*', local_name):
+            w = self._wrap(e)
+            if uri == '*' or w.namespaceURI is None:
+                ans.append(w)
+        return ans
+
+    @property
+    def documentElement(self):
+        return self._wrap(self._root)
+
+    @property
+    def childNodes(self):
+        return [self.documentElement]
+
+    def getElementsByTagName(self, name):
+        root = self._root
+        ans = self._matching(root, name)
+        if name == '*' or self.documentElement.tagName == name:
+            ans.insert(0, self.documentElement)
+        return ans
+
+    def getElementsByTagNameNS(self, uri, local_name):
+        root = self.documentElement
+        ans = self._matching_ns(self._root, uri, local_name)
+        if (uri == '*' or uri == root.namespaceURI) and local_name in ('*', root.localName):
+            ans.insert(0, root)
+        return ans
+
+    def writexml(self, writer, indent='', addindent='', newl='', encoding=None):
+        if encoding is None:
+            writer.write('<?xml version="1.0" ?>' + newl)
+        else:
+            writer.write('<?xml version="1.0" encoding="%s"?>%s' % (encoding, newl))
+        self.documentElement.writexml(writer, indent, addindent, newl)
+
+    def __repr__(self):
+        return '<DOM Document at %#x>' % id(self)
+
+
+def adapt(source_tree, return_root=True, **kw):
+    doc = Document(source_tree)
+    return doc.documentElement if return_root else doc
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+'''
+Process wide metrics about all calls to :func:`html5_parser.parse`. Collection
+is off by default, turn it on with :func:`enable`. The metrics are counters and
+histograms with fixed buckets, so collecting them costs only a few
+microseconds per parse, little enough to leave on all the time. Use
+:func:`snapshot` to export them periodically to your monitoring system.
+'''
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from bisect import bisect_left
+from functools import wraps
+from inspect import signature
+from threading import Lock
+from time import perf_counter
+
+from .stats import ParseStats
+
+# Upper bounds in seconds, the last bucket is for everything larger
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+enabled = False
+lock = Lock()
+# Called after each parse, when set, see the sampler module
+sampler = None
+
+
+class Histogram(object):
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, val):
+        self.counts[bisect_left(self.bounds, val)] += 1
+        self.sum += val
+
+    def snapshot(self):
+        # Cumulative counts, as used by Prometheus
+        buckets, total = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return {'buckets': buckets, 'count': total, 'sum': self.sum}
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.documents = self.bytes = 0
+        self.parse_seconds, self.convert_seconds = Histogram(), Histogram()
+        self.encoding_sources = {}
+        self.exceptions = {}
+
+    def snapshot(self):
+        return {
+            'documents': self.documents, 'bytes': self.bytes,
+            'parse_seconds': self.parse_seconds.snapshot(), 'convert_seconds': self.convert_seconds.snapshot(),
+            'encoding_sources': dict(self.encoding_sources), 'exceptions': dict(self.exceptions),
+        }
+
+
+current = Metrics()
+
+
+def enable():
+    ' Start collecting metrics '
+    global enabled
+    enabled = True
+
+
+def disable():
+    ' Stop collecting metrics, the values collected so far are kept '
+    global enabled
+    enabled = False
+
+
+def snapshot(reset=False):
+    '''
+    Return the current values of all metrics as a dictionary:
+
+      * ``documents`` -- the number of documents parsed
+      * ``bytes`` -- the total size of the documents, in characters for
+        documents that were not bytes
+      * ``parse_seconds`` -- a histogram of the total time taken by each call
+        to :func:`html5_parser.parse`
+      * ``convert_seconds`` -- a histogram of the time taken to build the
+        requested tree from the parse tree, for treebuilders that use libxml2
+      * ``encoding_sources`` -- the number of documents whose encoding was
+        found in each way, see :attr:`html5_parser.ParseStats.encoding_source`
+      * ``exceptions`` -- the number of failed parses by exception class name
+
+    Histograms are dictionaries with ``count``, ``sum`` and ``buckets``, a
+    list of ``(upper bound, cumulative count)`` pairs.
+
+    :param reset: If True, all metrics are reset to zero atomically with
+        taking the snapshot.
+    '''
+    global current
+    with lock:
+        ans = current.snapshot()
+        if reset:
+            current = Metrics()
+    return ans
+
+
+def reset():
+    ' Reset all metrics to zero '
+    snapshot(reset=True)
+
+
+def record(size, elapsed, stats, exception=None):
+    with lock:
+        m = current
+        m.documents += 1
+        m.bytes += size
+        m.parse_seconds.observe(elapsed)
+        if exception is not None:
+            name = exception.__class__.__name__
+            m.exceptions[name] = m.exceptions.get(name, 0) + 1
+        if stats.encoding_source is not None:
+            m.encoding_sources[stats.encoding_source] = m.encoding_sources.get(stats.encoding_source, 0) + 1
+        if stats.convert_time or stats.adopt_time:
+            m.convert_seconds.observe(stats.convert_time + stats.adopt_time + stats.treebuilder_time)
+
+
+def finished(parse, html, args, kw, elapsed, stats, exception=None):
+    if enabled:
+        record(len(html or b''), elapsed, stats, exception)
+    s = sampler
+    if s is not None:
+        s(parse, html, args, kw, elapsed, stats, exception)
+
+
+def instrumented(parse):
+    # Wrap parse() so that it records metrics, when they are enabled
+    pos = tuple(signature(parse).parameters).index('stats') - 1
+
+    @wraps(parse)
+    def wrapper(html, *args, **kw):
+        if not enabled and sampler is None:
+            return parse(html, *args, **kw)
+        stats = args[pos] if len(args) > pos else kw.get('stats')
+        if stats is None:
+            stats = ParseStats(memory=False)
+            if len(args) > pos:
+                args = args[:pos] + (stats,) + args[pos+1:]
+            else:
+                kw['stats'] = stats
+        start = perf_counter()
+        try:
+            ans = parse(html, *args, **kw)
+        except Exception as e:
+            finished(parse, html, args, kw, perf_counter() - start, stats, e)
+            raise
+        finished(parse, html, args, kw, perf_counter() - start, stats)
+        return ans
+    return wrapper
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+# A read-only tree backed directly by the gumbo parse tree, which is kept alive
+# for as long as any node of the tree is. Node objects are created only when
+# they are accessed, so building the tree costs only the parse itself.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from . import html_parser
+
+DOCUMENT, ELEMENT, TEXT, CDATA, COMMENT, WHITESPACE, TEMPLATE = range(7)
+NAMESPACES = ('http://www.w3.org/1999/xhtml', 'http://www.w3.org/2000/svg', 'http://www.w3.org/1998/Math/MathML')
+
+
+def node_at(tree, idx):
+    data = html_parser.native_node(tree, idx)
+    cls = NODE_TYPES[data[0]]
+    return cls(tree, idx, data)
+
+
+class Node(object):
+
+    __slots__ = ('_tree', '_idx', '_parent')
+
+    def __init__(self, tree, idx, data):
+        self._tree, self._idx, self._parent = tree, idx, data[1]
+
+    @property
+    def parent(self):
+        ' The parent of this node, None for the document '
+        return None if self._parent < 0 else node_at(self._tree, self._parent)
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and other._tree is self._tree and other._idx == self._idx
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._tree), self._idx))
+
+
+class TextNode(Node):
+
+    __slots__ = ('text',)
+    children = ()
+
+    def __init__(self, tree, idx, data):
+        Node.__init__(self, tree, idx, data)
+        self.text = data[2]
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.text[:20])
+
+
+class Text(TextNode):
+    __slots__ = ()
+
+
+class Comment(TextNode):
+    __slots__ = ()
+
+
+class ParentNode(Node):
+
+    __slots__ = ('_child_indices', '_children')
+
+    @property
+    def children(self):
+        ' A tuple of the child nodes, created on first access '
+        if self._children is None:
+            self._children = tuple(node_at(self._tree, i) for i in self._child_indices)
+        return self._children
+
+    @property
+    def text(self):
+        ' The text of all descendant text nodes '
+        return html_parser.native_text(self._tree, self._idx)
+
+    def iter(self, tag=None):
+        ' Iterate over this element (if it is one) and all descendant elements, optionally only those with the specified tag name '
+        tree = self._tree
+        for i in html_parser.native_iter(tree, self._idx, tag):
+            yield node_at(tree, i)
+
+    def find(self, tag):
+        ' The first descendant element with the specified tag name or None '
+        for i in html_parser.native_iter(self._tree, self._idx, tag):
+            if i != self._idx:
+                return node_at(self._tree, i)
+
+    def findall(self, tag):
+        ' A list of all descendant elements with the specified tag name '
+        tree, idx = self._tree, self._idx
+        return [node_at(tree, i) for i in html_parser.native_iter(tree, idx, tag) if i != idx]
+
+
+class Element(ParentNode):
+
+    __slots__ = ('tag', 'namespace', 'attrs', 'sourceline')
+
+    def __init__(self, tree, idx, data):
+        Node.__init__(self, tree, idx, data)
+        self.tag, ns, self.attrs, self.sourceline, self._child_indices = data[2:]
+        self.namespace = NAMESPACES[ns]
+        self._children = None
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    def __repr__(self):
+        return '<Element %s at %#x>' % (self.tag, id(self))
+
+
+class Document(ParentNode):
+
+    __slots__ = ('doctype',)
+
+    def __init__(self, tree, idx, data):
+        Node.__init__(self, tree, idx, data)
+        self._child_indices, self.doctype = data[2:]
+        self._children = None
+
+    @property
+    def root(self):
+        ' The root element of the document '
+        for c in self.children:
+            if isinstance(c, Element):
+                return c
+
+    def __repr__(self):
+        return '<Document at %#x>' % id(self)
+
+
+NODE_TYPES = {
+    DOCUMENT: Document, ELEMENT: Element, TEMPLATE: Element, TEXT: Text, WHITESPACE: Text, CDATA: Text, COMMENT: Comment}
+
+
+def parse(data, return_root=True, maybe_xhtml=False, sanitize_names=True, stack_size=16 * 1024,
+          fragment_context=None, fragment_namespace=None, **kw):
+    # Options that apply only to libxml2 based trees, such as shared_dict, are
+    # ignored. parse() rejects line_number_attr.
+    if fragment_namespace is None:
+        fragment_namespace = html_parser.GUMBO_NAMESPACE_HTML
+    tree = html_parser.parse_native(
+        data, maybe_xhtml=maybe_xhtml, sanitize_names=sanitize_names, stack_size=stack_size,
+        fragment_context=fragment_context, fragment_namespace=fragment_namespace)
+    return from_tree(tree, return_root)
+
+
+def from_tree(tree, return_root=True):
+    doc = node_at(tree, 0)
+    return doc.root if return_root else doc
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+# Re-parse the documents saved by a SlowDocumentSampler under a profiler.
+# Usage: python -m html5_parser.replay <directory>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import sys
+from time import perf_counter
+
+from . import ParseStats, parse
+from .sampler import load_samples
+from .stats import TIME_FIELDS
+
+
+def replay(directory, repeat=1, profiler=None):
+    ' Parse every saved document repeat times, returning a list of (name, original metadata, best time, ParseStats) '
+    ans = []
+    for name, html, meta in load_samples(directory):
+        best = best_stats = None
+        for i in range(repeat):
+            stats = ParseStats()
+            if profiler is not None:
+                profiler.enable()
+            start = perf_counter()
+            try:
+                parse(html, stats=stats, **meta['options'])
+            except Exception as e:
+                print('Parsing', name, 'failed with error:', e, file=sys.stderr)
+            elapsed = perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            if best is None or elapsed < best:
+                best, best_stats = elapsed, stats
+        ans.append((name, meta, best, best_stats))
+    return ans
+
+
+def report(results, out=sys.stdout):
+    for name, meta, elapsed, stats in results:
+        print('{}: {:,} {} with {}'.format(
+            name, meta['size'], 'bytes' if meta['input_type'] == 'bytes' else 'characters',
+            ', '.join('%s=%r' % x for x in sorted(meta['options'].items()))), file=out)
+        print('  {:18s} {:>12s} {:>12s}'.format('Phase', 'Saved (ms)', 'Now (ms)'), file=out)
+        for x in TIME_FIELDS + ('total_time',):
+            before = sum(meta['timings'].get(f, 0) for f in TIME_FIELDS) if x == 'total_time' else meta['timings'].get(x, 0)
+            print('  {:18s} {:12.3f} {:12.3f}'.format(x, before * 1000, getattr(stats, x) * 1000), file=out)
+        print('  {:18s} {:12.3f} {:12.3f}'.format('elapsed', meta['elapsed'] * 1000, elapsed * 1000), file=out)
+        print('  peak parser memory: {:,} bytes, tree memory: {:,} bytes'.format(
+            stats.gumbo_peak_bytes, stats.libxml_bytes), file=out)
+        print(file=out)
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(
+        prog='python -m html5_parser.replay',
+        description='Parse the documents saved by a SlowDocumentSampler again, under a profiler')
+    p.add_argument('directory', help='The directory the documents were saved in')
+    p.add_argument('--repeat', '-r', default=1, type=int, help='Number of times to parse each document, the fastest is reported')
+    p.add_argument('--sort', default='cumulative', help='The sort order for the profile, see pstats.Stats.sort_stats()')
+    p.add_argument('--limit', default=30, type=int, help='Number of functions to show in the profile')
+    p.add_argument('--no-profile', action='store_true', help='Do not run the profiler')
+    opts = p.parse_args(args)
+    profiler = None
+    if not opts.no_profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    results = replay(opts.directory, repeat=max(1, opts.repeat), profiler=profiler)
+    if not results:
+        raise SystemExit('No saved documents found in: ' + opts.directory)
+    report(results)
+    if profiler is not None:
+        import pstats
+        pstats.Stats(profiler).sort_stats(opts.sort).print_stats(opts.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import os
+import time
+from inspect import signature
+from threading import Lock
+
+from . import metrics
+
+# Arguments of parse() that are not saved with a sample
+UNSAVED_ARGS = frozenset(('html', 'cache', 'stats'))
+
+
+class SlowDocumentSampler(object):
+    '''
+    Save the documents that are slow to parse, so that they can be examined
+    later with ``python -m html5_parser.replay``. Once :meth:`install` is
+    called, every call to :func:`html5_parser.parse` that takes at least
+    :attr:`min_seconds` or whose input has at least :attr:`min_bytes` bytes
+    (characters for unicode input) is saved to :attr:`directory`, as a file
+    containing the input and a JSON file containing the parse options and
+    the time taken by each phase of the parse, see :class:`html5_parser.ParseStats`.
+
+    :param directory: The directory in which to save documents, created if it
+        does not exist.
+    :param min_seconds: The minimum time taken to parse a document for it to
+        be saved.
+    :param min_bytes: The minimum size of a document for it to be saved.
+    :param min_interval: The minimum number of seconds between saving two
+        documents.
+    :param max_samples: The maximum number of documents saved by this sampler.
+    '''
+
+    def __init__(self, directory, min_seconds=None, min_bytes=None, min_interval=60, max_samples=100):
+        if min_seconds is None and min_bytes is None:
+            raise ValueError('At least one of min_seconds and min_bytes must be specified')
+        self.directory = directory
+        self.min_seconds, self.min_bytes = min_seconds, min_bytes
+        self.min_interval, self.max_samples = min_interval, max_samples
+        self.captured = 0
+        self.last_capture = None
+        self.lock = Lock()
+
+    def install(self):
+        ' Start sampling calls to :func:`html5_parser.parse`, replacing any previously installed sampler '
+        metrics.sampler = self
+
+    def uninstall(self):
+        ' Stop sampling '
+        if metrics.sampler is self:
+            metrics.sampler = None
+
+    def is_slow(self, size, elapsed):
+        return (self.min_seconds is not None and elapsed >= self.min_seconds) or (
+            self.min_bytes is not None and size >= self.min_bytes)
+
+    def __call__(self, parse, html, args, kw, elapsed, stats, exception=None):
+        size = len(html or b'')
+        if not self.is_slow(size, elapsed):
+            return
+        now = time.monotonic()
+        with self.lock:
+            if self.captured >= self.max_samples or (
+                    self.last_capture is not None and now - self.last_capture < self.min_interval):
+                return
+            self.captured += 1
+            self.last_capture = now
+            num = self.captured
+        try:
+            self.save(parse, html or b'', args, kw, elapsed, stats, exception, num)
+        except EnvironmentError:
+            pass  # Sampling must never cause parsing to fail
+
+    def save(self, parse, html, args, kw, elapsed, stats, exception, num):
+        bound = signature(parse).bind(html, *args, **kw)
+        options = {k: v for k, v in bound.arguments.items() if k not in UNSAVED_ARGS}
+        is_bytes = isinstance(html, bytes)
+        meta = {
+            'options': options, 'input_type': 'bytes' if is_bytes else 'str', 'size': len(html),
+            'elapsed': elapsed, 'timings': stats.as_dict(), 'time': time.time(),
+            'exception': None if exception is None else exception.__class__.__name__,
+        }
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        name = os.path.join(self.directory, '%s-%d-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), num))
+        with open(name + '.html', 'wb') as f:
+            f.write(html if is_bytes else html.encode('utf-8'))
+        with open(name + '.json', 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True, default=repr)
+
+
+def load_samples(directory):
+    ' Yield (name, html, metadata) for every document saved by a sampler in directory, oldest first '
+    for x in sorted(os.listdir(directory)):
+        if x.endswith('.json'):
+            base = os.path.join(directory, x[:-5])
+            with open(base + '.json') as f:
+                meta = json.load(f)
+            with open(base + '.html', 'rb') as f:
+                html = f.read()
+            if meta['input_type'] == 'str':
+                html = html.decode('utf-8')
+            yield os.path.basename(base), html, meta
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from time import perf_counter
+
+MEMORY_FIELDS = ('gumbo_peak_bytes', 'gumbo_total_bytes', 'libxml_bytes', 'elements', 'attributes', 'text_nodes')
+TIME_FIELDS = (
+    'sniff_time', 'chardet_time', 'transcode_time', 'parse_time', 'convert_time', 'adopt_time', 'treebuilder_time')
+
+
+class ParseStats(object):
+    '''
+    Statistics about a single parse. Pass an instance of this class as the
+    ``stats`` parameter to :func:`html5_parser.parse` and it is filled in when
+    the parse completes.
+
+    The :attr:`gumbo_peak_bytes` and :attr:`gumbo_total_bytes` attributes are
+    the maximum memory used by the HTML parser at any one time and the total
+    memory it allocated. :attr:`libxml_bytes` is the memory allocated by
+    libxml2 while building the tree, which is approximately the memory used by
+    the tree. :attr:`elements`, :attr:`attributes` and :attr:`text_nodes` count
+    the nodes in the tree. Memory is measured by counting allocations, so these
+    are only collected by the treebuilders that use libxml2, that is, all
+    except ``etree``, ``soup`` and ``native``.
+
+    The time in seconds taken by each phase of the parse is stored in:
+    :attr:`sniff_time` (looking for a BOM or a ``<meta>`` charset),
+    :attr:`chardet_time` (detecting the encoding statistically),
+    :attr:`transcode_time` (converting the input to UTF-8),
+    :attr:`parse_time` (running the HTML 5 parsing algorithm),
+    :attr:`convert_time` (building the libxml2 tree),
+    :attr:`adopt_time` (wrapping the libxml2 tree for lxml) and
+    :attr:`treebuilder_time` (building the requested type of tree from the
+    lxml tree). The treebuilders that do not use libxml2 and the
+    ``single_pass`` option build their tree while parsing, so that is
+    included in :attr:`parse_time`. :attr:`total_time` is the sum of them all.
+
+    :attr:`encoding_source` is how the encoding of the input was found, one
+    of ``unicode`` (the input was not bytes), ``transport``, ``bom``,
+    ``meta``, ``chardet``, ``fallback`` or ``locale``.
+
+    :param memory: If False, memory is not measured, which makes collecting
+        the statistics cheaper.
+    '''
+
+    __slots__ = MEMORY_FIELDS + TIME_FIELDS + ('encoding_source', 'memory')
+
+    def __init__(self, memory=True):
+        for x in MEMORY_FIELDS:
+            setattr(self, x, 0)
+        for x in TIME_FIELDS:
+            setattr(self, x, 0.0)
+        self.encoding_source = None
+        self.memory = memory
+
+    @property
+    def total_time(self):
+        return sum(getattr(self, x) for x in TIME_FIELDS)
+
+    def as_dict(self):
+        return {x: getattr(self, x) for x in MEMORY_FIELDS + TIME_FIELDS + ('encoding_source',)}
+
+    def __repr__(self):
+        return 'ParseStats(%s)' % ', '.join('%s=%r' % x for x in self.as_dict().items())
+
+
+def add_time(stats, name, start):
+    # Add the time since start to the named phase and return the current time
+    now = perf_counter()
+    setattr(stats, name, getattr(stats, name) + now - start)
+    return now
+
+
+def timed(stats, name, func, *args, **kw):
+    # Call func, adding the time it takes to the named phase
+    if stats is None:
+        return func(*args, **kw)
+    start = perf_counter()
+    ans = func(*args, **kw)
+    add_time(stats, name, start)
+    return ans
@@ -6,8 +6,6 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import sys
 
-from lxml.etree import _Comment
-
 if sys.version_info.major < 3:
     from xml.etree.cElementTree import Element, SubElement, ElementTree, Comment, register_namespace
 else:
@@ -26,9 +24,25 @@ def convert_elem(src, parent=None):
     return ans
 
 
+def parse(data, return_root=True, namespace_elements=False, line_number_attr=None, sanitize_names=True,
+          stack_size=16 * 1024, fragment_context=None, fragment_namespace=None, **kw):
+    # Build the tree directly in C, without going via libxml2 and lxml
+    from . import html_parser
+    if fragment_namespace is None:
+        fragment_namespace = html_parser.GUMBO_NAMESPACE_HTML
+    root = html_parser.parse_etree(
+        data, Element, SubElement, Comment, namespace_elements=namespace_elements,
+        line_number_attr=line_number_attr, sanitize_names=sanitize_names, stack_size=stack_size,
+        fragment_context=fragment_context, fragment_namespace=fragment_namespace)
+    return root if return_root else ElementTree(root)
+
+
 def adapt(src_tree, return_root=True, **kw):
+    from lxml.etree import _Comment
     src_root = src_tree.getroot()
     dest_root = convert_elem(src_root)
+    # For fragments the root is the context element, which can have text
+    dest_root.text, dest_root.tail = src_root.text, src_root.tail
     stack = [(src_root, dest_root)]
     while stack:
         src, dest = stack.pop()
@@ -0,0 +1,121 @@
+/*
+ * parse-stats.c
+ * Copyright (C) 2026 Kovid Goyal <kovid at kovidgoyal.net>
+ *
+ * Distributed under terms of the Apache 2.0 license.
+ */
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#define _POSIX_C_SOURCE 199309L
+#include <time.h>
+#endif
+#include <stdlib.h>
+#include <string.h>
+#include <libxml/xmlmemory.h>
+
+#include "data-types.h"
+#include "parse-stats.h"
+
+// Counting allocators for gumbo and libxml2. They are installed the first time
+// memory accounting is used and count allocations only in the thread that
+// started accounting, passing everything else straight through. gumbo
+// allocations made while counting store their size before the returned memory,
+// so that frees can be counted too. This works because all memory gumbo
+// allocates while parsing a document is freed in the same thread before
+// accounting is stopped. libxml2 memory outlives the parse, so only its
+// allocations are counted.
+
+#ifdef _MSC_VER
+#define THREAD_LOCAL __declspec(thread)
+#else
+#define THREAD_LOCAL __thread
+#endif
+
+static THREAD_LOCAL ParseStats *current = NULL;
+static bool installed = false;
+static xmlFreeFunc xml_free = NULL;
+static xmlMallocFunc xml_malloc = NULL;
+static xmlReallocFunc xml_realloc = NULL;
+static xmlStrdupFunc xml_strdup = NULL;
+
+typedef union { size_t size; double d; void *p; long double ld; } Header;
+
+static void*
+gumbo_counting_realloc(void *ptr, size_t size) {
+    ParseStats *s = current;
+    if (LIKELY(!s)) return realloc(ptr, size);
+    Header *h = ptr ? ((Header*)ptr) - 1 : NULL;
+    size_t old = h ? h->size : 0;
+    h = realloc(h, size + sizeof(Header));
+    if (UNLIKELY(!h)) return NULL;
+    h->size = size;
+    s->gumbo_current_bytes = s->gumbo_current_bytes - old + size;
+    if (size > old) s->gumbo_total_bytes += size - old;
+    s->gumbo_peak_bytes = MAX(s->gumbo_peak_bytes, s->gumbo_current_bytes);
+    return h + 1;
+}
+
+static void
+gumbo_counting_free(void *ptr) {
+    ParseStats *s = current;
+    if (LIKELY(!s)) { free(ptr); return; }
+    if (!ptr) return;
+    Header *h = ((Header*)ptr) - 1;
+    s->gumbo_current_bytes -= h->size;
+    free(h);
+}
+
+static void*
+xml_counting_malloc(size_t size) {
+    if (current) current->libxml_bytes += size;
+    return xml_malloc(size);
+}
+
+static void*
+xml_counting_realloc(void *ptr, size_t size) {
+    // The previous size is unknown, so this over counts memory that grows
+    if (current) current->libxml_bytes += size;
+    return xml_realloc(ptr, size);
+}
+
+static char*
+xml_counting_strdup(const char *str) {
+    if (current) current->libxml_bytes += strlen(str) + 1;
+    return xml_strdup(str);
+}
+
+void
+start_memory_accounting(ParseStats *stats) {
+    // Must be called with the GIL held
+    if (!installed) {
+        installed = true;
+        gumbo_memory_set_allocator(gumbo_counting_realloc);
+        gumbo_memory_set_free(gumbo_counting_free);
+        xmlMemGet(&xml_free, &xml_malloc, &xml_realloc, &xml_strdup);
+        xmlMemSetup(xml_free, xml_counting_malloc, xml_counting_realloc, xml_counting_strdup);
+    }
+    current = stats;
+}
+
+void
+stop_memory_accounting(void) {
+    current = NULL;
+}
+
+double
+monotonic_time(void) {
+    // In seconds, can be called without the GIL
+#ifdef _WIN32
+    static LARGE_INTEGER frequency = {0};
+    LARGE_INTEGER now;
+    if (!frequency.QuadPart) QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&now);
+    return (double)now.QuadPart / (double)frequency.QuadPart;
+#else
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double)ts.tv_sec + ts.tv_nsec / 1e9;
+#endif
+}
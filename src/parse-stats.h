@@ -0,0 +1,19 @@
+/*
+ * Copyright (C) 2026 Kovid Goyal <kovid at kovidgoyal.net>
+ *
+ * Distributed under terms of the Apache 2.0 license.
+ */
+
+#pragma once
+
+#include <stddef.h>
+
+typedef struct {
+    size_t gumbo_current_bytes, gumbo_peak_bytes, gumbo_total_bytes, libxml_bytes;
+    size_t elements, attributes, text_nodes;
+    double parse_time, convert_time;
+} ParseStats;
+
+void start_memory_accounting(ParseStats *stats);
+void stop_memory_accounting(void);
+double monotonic_time(void);
@@ -12,38 +12,93 @@
 #include "../gumbo/gumbo.h"
 #include "as-libxml.h"
 #include "as-python-tree.h"
+#include "compact.h"
+#include "parse-stats.h"
 
 static char *NAME =  "libxml2:xmlDoc";
 static char *DESTRUCTOR = "destructor:xmlFreeDoc";
 
+static inline void
+set_conversion_error(const char *errmsg) {
+    if (errmsg) PyErr_SetString(PyExc_Exception, errmsg);
+    else PyErr_NoMemory();
+}
+
 static inline libxml_doc*
-convert_tree(GumboOutput *output, Options *opts) {
+convert_tree(GumboOutput *output, Options *opts, bool owned, ParseStats *stats) {
+    // An owned tree is not used after conversion, so its nodes are freed as
+    // they are converted
     char *errmsg = NULL;
     libxml_doc *doc = NULL;
+    double start;
+
+    if (owned) {
+        Py_BEGIN_ALLOW_THREADS;
+        start = stats ? monotonic_time() : 0;
+        doc = convert_gumbo_tree_to_libxml_tree(output, opts, true, &errmsg);
+        if (stats) stats->convert_time = monotonic_time() - start;
+        Py_END_ALLOW_THREADS;
+    } else {
+        start = stats ? monotonic_time() : 0;
+        doc = convert_gumbo_tree_to_libxml_tree(output, opts, false, &errmsg);
+        if (stats) stats->convert_time = monotonic_time() - start;
+    }
+    if (doc == NULL) set_conversion_error(errmsg);
+    return doc;
+}
 
+static inline libxml_doc*
+parse_single_pass(PyObject *data, Options *opts, const GumboTag context, GumboNamespaceEnum context_namespace, ParseStats *stats) {
+    char *errmsg = NULL;
+    libxml_doc *doc = NULL;
+    const char *buffer = NULL;
+    Py_ssize_t sz = 0;
+    if (!PyArg_Parse(data, "s#", &buffer, &sz)) return NULL;
     Py_BEGIN_ALLOW_THREADS;
-    doc = convert_gumbo_tree_to_libxml_tree(output, opts, &errmsg);
+    // Conversion happens during parsing, so it is all counted as parse time
+    double start = stats ? monotonic_time() : 0;
+    doc = parse_to_libxml_tree(buffer, (size_t)sz, context, context_namespace, opts, &errmsg);
+    if (stats) stats->parse_time = monotonic_time() - start;
     Py_END_ALLOW_THREADS;
-    if (doc == NULL) {
-        if (errmsg) PyErr_SetString(PyExc_Exception, errmsg);
-        else PyErr_NoMemory();
-    }
+    if (doc == NULL) set_conversion_error(errmsg);
     return doc;
 }
 
-static libxml_doc*
-parse_with_options(const char* buffer, size_t buffer_length, Options *opts, const GumboTag context, GumboNamespaceEnum context_namespace) {
+static char *NATIVE_TREE_NAME = "html5_parser:NativeTree";
+
+static void
+free_native_capsule(PyObject *capsule) {
+    NativeTree *t = PyCapsule_GetPointer(capsule, NATIVE_TREE_NAME);
+    if (t) free_native_tree(t);
+}
+
+static inline GumboOutput*
+parse_or_reuse(PyObject *data, GumboOptions *gumbo_opts, const GumboTag context, GumboNamespaceEnum context_namespace, bool *owned, ParseStats *stats) {
+    // data is either the UTF-8 encoded HTML to parse or a tree returned by
+    // parse_native(), which is reused rather than parsed again, in which case
+    // the parse options are those that were used for the tree.
+    const char *buffer = NULL;
+    Py_ssize_t sz = 0;
     GumboOutput *output = NULL;
-    libxml_doc* doc = NULL;
+    if (PyCapsule_IsValid(data, NATIVE_TREE_NAME)) {
+        *owned = false;
+        return native_tree_output(PyCapsule_GetPointer(data, NATIVE_TREE_NAME), &(gumbo_opts->use_xhtml_rules));
+    }
+    if (!PyArg_Parse(data, "s#", &buffer, &sz)) return NULL;
+    *owned = true;
     Py_BEGIN_ALLOW_THREADS;
-    output = gumbo_parse_fragment(&(opts->gumbo_opts), buffer, buffer_length, context, context_namespace);
+    double start = stats ? monotonic_time() : 0;
+    output = gumbo_parse_fragment(gumbo_opts, buffer, (size_t)sz, context, context_namespace);
+    if (stats) stats->parse_time = monotonic_time() - start;
     Py_END_ALLOW_THREADS;
     if (output == NULL) PyErr_NoMemory();
-    else {
-        doc = convert_tree(output, opts);
-        gumbo_destroy_output(output);
-    }
-    return doc;
+    return output;
+}
+
+static inline void
+release_output(PyObject *data, GumboOutput *output, bool owned) {
+    if (owned) gumbo_destroy_output(output);
+    else release_native_tree_output(PyCapsule_GetPointer(data, NATIVE_TREE_NAME));
 }
 
 static void
@@ -64,26 +119,51 @@ encapsulate(libxml_doc* doc) {
     return ans;
 }
 
+static inline bool
+set_stats(PyObject *stats, ParseStats *s) {
+#define S(name) { \
+    PyObject *v = PyLong_FromSize_t(s->name); \
+    if (!v) return false; \
+    int ret = PyObject_SetAttrString(stats, #name, v); Py_DECREF(v); \
+    if (ret != 0) return false; \
+}
+    S(gumbo_peak_bytes); S(gumbo_total_bytes); S(libxml_bytes);
+    S(elements); S(attributes); S(text_nodes);
+#undef S
+#define T(name) { \
+    PyObject *v = PyFloat_FromDouble(s->name); \
+    if (!v) return false; \
+    int ret = PyObject_SetAttrString(stats, #name, v); Py_DECREF(v); \
+    if (ret != 0) return false; \
+}
+    T(parse_time); T(convert_time);
+#undef T
+    return true;
+}
+
 static PyObject *
 parse(PyObject UNUSED *self, PyObject *args, PyObject *kwds) {
     libxml_doc *doc = NULL;
-    const char *buffer = NULL;
-    Py_ssize_t sz = 0;
+    GumboOutput *output = NULL;
+    bool owned;
     Options opts = {0};
     opts.stack_size = 16 * 1024;
-    PyObject *kd = Py_True, *mx = Py_False, *ne = Py_False, *sn = Py_True;
+    PyObject *data, *kd = Py_True, *mx = Py_False, *ne = Py_False, *sn = Py_True, *sd = Py_False, *sp = Py_False, *stats = Py_None;
     char *fragment_context = NULL; Py_ssize_t fragment_context_sz = 0;
     opts.gumbo_opts = kGumboDefaultOptions;
     opts.gumbo_opts.max_errors = 0;  // We discard errors since we are not reporting them anyway
     GumboNamespaceEnum fragment_namespace = GUMBO_NAMESPACE_HTML;
+    ParseStats pstats = {0};
 
-    static char *kwlist[] = {"data", "namespace_elements", "keep_doctype", "maybe_xhtml", "line_number_attr", "sanitize_names", "stack_size", "fragment_context", "fragment_namespace", NULL};
+    static char *kwlist[] = {"data", "namespace_elements", "keep_doctype", "maybe_xhtml", "line_number_attr", "sanitize_names", "stack_size", "fragment_context", "fragment_namespace", "shared_dict", "intern_max_len", "single_pass", "stats", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s#|OOOzOIz#i", kwlist, &buffer, &sz, &ne, &kd, &mx, &(opts.line_number_attr), &sn, &(opts.stack_size), &fragment_context, &fragment_context_sz, &fragment_namespace)) return NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OOOzOIz#iOIOO", kwlist, &data, &ne, &kd, &mx, &(opts.line_number_attr), &sn, &(opts.stack_size), &fragment_context, &fragment_context_sz, &fragment_namespace, &sd, &(opts.intern_max_len), &sp, &stats)) return NULL;
     opts.namespace_elements = PyObject_IsTrue(ne);
     opts.keep_doctype = PyObject_IsTrue(kd);
     opts.sanitize_names = PyObject_IsTrue(sn);
     opts.gumbo_opts.use_xhtml_rules = PyObject_IsTrue(mx);
+    opts.shared_dict = PyObject_IsTrue(sd);
+    if (opts.shared_dict && !init_shared_dict()) return PyErr_NoMemory();
     GumboTag context = GUMBO_TAG_LAST;
     if (fragment_context && fragment_context_sz > 0) {
         context = gumbo_tagn_enum(fragment_context, fragment_context_sz);
@@ -92,48 +172,308 @@ parse(PyObject UNUSED *self, PyObject *args, PyObject *kwds) {
             return NULL;
         }
     }
-    doc = parse_with_options(buffer, (size_t)sz, &opts, context, fragment_namespace);
+    bool reuse = PyCapsule_IsValid(data, NATIVE_TREE_NAME);
+    ParseStats *ps = stats == Py_None ? NULL : &pstats;
+    bool count_memory = false;
+    if (ps) {
+        PyObject *m = PyObject_GetAttrString(stats, "memory");
+        if (!m) return NULL;
+        // The memory of a reused tree was allocated by an earlier parse
+        count_memory = PyObject_IsTrue(m) && !reuse;
+        Py_DECREF(m);
+    }
+    if (count_memory) start_memory_accounting(ps);
+    // Resolving namespace prefixes with maybe_xhtml depends on the final
+    // ancestors of an element, so that needs the complete parse tree
+    if (PyObject_IsTrue(sp) && !opts.gumbo_opts.use_xhtml_rules && !reuse) {
+        doc = parse_single_pass(data, &opts, context, fragment_namespace, ps);
+    } else {
+        output = parse_or_reuse(data, &(opts.gumbo_opts), context, fragment_namespace, &owned, ps);
+        if (output) {
+            // A reused tree may be converted concurrently in other threads
+            doc = convert_tree(output, &opts, owned, ps);
+            release_output(data, output, owned);
+        }
+    }
+    if (count_memory) stop_memory_accounting();
     if (!doc) return NULL;
+    if (ps) {
+        if (count_memory) count_libxml_nodes(doc, ps);
+        if (!set_stats(stats, ps)) { free_libxml_doc(doc); return NULL; }
+    }
     return encapsulate(doc);
 }
 
 
 static PyObject *
 parse_and_build(PyObject UNUSED *self, PyObject *args) {
+    GumboOutput *output = NULL;
+    bool owned;
+    PyObject *data, *new_tag, *new_comment, *ans, *new_doctype, *append, *new_string, *ret;
+    Options opts = {0};
+    opts.stack_size = 16 * 1024;
+    opts.gumbo_opts = kGumboDefaultOptions;
+    opts.gumbo_opts.max_errors = 0;  // We discard errors since we are not reporting them anyway
+
+    if (!PyArg_ParseTuple(args, "OOOOOO|I", &data, &new_tag, &new_comment, &new_string, &append, &new_doctype, &(opts.stack_size))) return NULL;
+    output = parse_or_reuse(data, &(opts.gumbo_opts), GUMBO_TAG_LAST, GUMBO_NAMESPACE_HTML, &owned, NULL);
+    if (output == NULL) return NULL;
+    GumboDocument* document = &(output->document->v.document);
+
+    if (new_doctype != Py_None && document->has_doctype) {
+        ret = PyObject_CallFunction(new_doctype, "sss", document->name, document->public_identifier, document->system_identifier);
+        if (ret == NULL) { release_output(data, output, owned); return NULL; }
+        Py_CLEAR(ret);
+    }
+    ans = as_python_tree(output, &opts, new_tag, new_comment, new_string, append);
+    release_output(data, output, owned);
+    return ans;
+}
+
+
+static PyObject *
+parse_etree(PyObject UNUSED *self, PyObject *args, PyObject *kwds) {
+    GumboOutput *output = NULL;
+    bool owned;
+    PyObject *data, *element, *subelement, *comment, *ne = Py_False, *sn = Py_True, *ans;
+    Options opts = {0};
+    opts.stack_size = 16 * 1024;
+    char *fragment_context = NULL; Py_ssize_t fragment_context_sz = 0;
+    opts.gumbo_opts = kGumboDefaultOptions;
+    opts.gumbo_opts.max_errors = 0;  // We discard errors since we are not reporting them anyway
+    GumboNamespaceEnum fragment_namespace = GUMBO_NAMESPACE_HTML;
+    GumboTag context = GUMBO_TAG_LAST;
+
+    static char *kwlist[] = {"data", "element", "subelement", "comment", "namespace_elements", "line_number_attr", "sanitize_names", "stack_size", "fragment_context", "fragment_namespace", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OOOO|OzOIz#i", kwlist, &data, &element, &subelement, &comment, &ne, &(opts.line_number_attr), &sn, &(opts.stack_size), &fragment_context, &fragment_context_sz, &fragment_namespace)) return NULL;
+    opts.namespace_elements = PyObject_IsTrue(ne);
+    opts.sanitize_names = PyObject_IsTrue(sn);
+    if (fragment_context && fragment_context_sz > 0) {
+        context = gumbo_tagn_enum(fragment_context, fragment_context_sz);
+        if (context == GUMBO_TAG_UNKNOWN) {
+            PyErr_Format(PyExc_KeyError, "Unknown fragment_context tag name: %s", fragment_context);
+            return NULL;
+        }
+    }
+    output = parse_or_reuse(data, &(opts.gumbo_opts), context, fragment_namespace, &owned, NULL);
+    if (output == NULL) return NULL;
+    ans = as_etree_tree(output, &opts, element, subelement, comment);
+    release_output(data, output, owned);
+    return ans;
+}
+
+static PyObject *
+parse_native(PyObject UNUSED *self, PyObject *args, PyObject *kwds) {
+    GumboOutput *output = NULL;
+    NativeTree *tree;
+    PyObject *data, *mx = Py_False, *sn = Py_True, *ans;
+    GumboOptions gumbo_opts = kGumboDefaultOptions;
+    gumbo_opts.max_errors = 0;  // We discard errors since we are not reporting them anyway
+    unsigned int stack_size = 16 * 1024;
+    char *fragment_context = NULL; Py_ssize_t fragment_context_sz = 0;
+    GumboNamespaceEnum fragment_namespace = GUMBO_NAMESPACE_HTML;
+    GumboTag context = GUMBO_TAG_LAST;
+
+    static char *kwlist[] = {"data", "maybe_xhtml", "sanitize_names", "stack_size", "fragment_context", "fragment_namespace", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|OOIz#i", kwlist, &PyBytes_Type, &data, &mx, &sn, &stack_size, &fragment_context, &fragment_context_sz, &fragment_namespace)) return NULL;
+    gumbo_opts.use_xhtml_rules = PyObject_IsTrue(mx);
+    if (fragment_context && fragment_context_sz > 0) {
+        context = gumbo_tagn_enum(fragment_context, fragment_context_sz);
+        if (context == GUMBO_TAG_UNKNOWN) {
+            PyErr_Format(PyExc_KeyError, "Unknown fragment_context tag name: %s", fragment_context);
+            return NULL;
+        }
+    }
+    Py_BEGIN_ALLOW_THREADS;
+    output = gumbo_parse_fragment(&gumbo_opts, PyBytes_AS_STRING(data), (size_t)PyBytes_GET_SIZE(data), context, fragment_namespace);
+    Py_END_ALLOW_THREADS;
+    if (output == NULL) return PyErr_NoMemory();
+    tree = alloc_native_tree(output, data, PyObject_IsTrue(sn), gumbo_opts.use_xhtml_rules, stack_size);
+    if (!tree) return NULL;
+    ans = PyCapsule_New(tree, NATIVE_TREE_NAME, free_native_capsule);
+    if (!ans) free_native_tree(tree);
+    return ans;
+}
+
+static PyObject *
+native_node(PyObject UNUSED *self, PyObject *args) {
+    PyObject *capsule;
+    Py_ssize_t idx;
+    NativeTree *t;
+    if (!PyArg_ParseTuple(args, "On", &capsule, &idx)) return NULL;
+    if (!(t = PyCapsule_GetPointer(capsule, NATIVE_TREE_NAME))) return NULL;
+    return native_tree_node(t, idx);
+}
+
+static PyObject *
+native_text(PyObject UNUSED *self, PyObject *args) {
+    PyObject *capsule;
+    Py_ssize_t idx;
+    NativeTree *t;
+    if (!PyArg_ParseTuple(args, "On", &capsule, &idx)) return NULL;
+    if (!(t = PyCapsule_GetPointer(capsule, NATIVE_TREE_NAME))) return NULL;
+    return native_tree_text(t, idx);
+}
+
+static PyObject *
+close_native(PyObject UNUSED *self, PyObject *capsule) {
+    NativeTree *t;
+    if (!(t = PyCapsule_GetPointer(capsule, NATIVE_TREE_NAME))) return NULL;
+    close_native_tree(t);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+native_iter(PyObject UNUSED *self, PyObject *args) {
+    PyObject *capsule;
+    Py_ssize_t idx, tag_sz = 0;
+    const char *tag = NULL;
+    NativeTree *t;
+    if (!PyArg_ParseTuple(args, "On|z#", &capsule, &idx, &tag, &tag_sz)) return NULL;
+    if (!(t = PyCapsule_GetPointer(capsule, NATIVE_TREE_NAME))) return NULL;
+    return native_tree_iter(t, idx, tag, tag_sz);
+}
+
+static PyObject *
+parse_soup(PyObject UNUSED *self, PyObject *args) {
+    GumboOutput *output = NULL;
+    bool owned;
+    PyObject *data, *new_tag, *new_comment, *new_string, *list_attributes, *new_doctype, *ans, *ret;
+    Options opts = {0};
+    opts.stack_size = 16 * 1024;
+    opts.gumbo_opts = kGumboDefaultOptions;
+    opts.gumbo_opts.max_errors = 0;  // We discard errors since we are not reporting them anyway
+
+    if (!PyArg_ParseTuple(args, "OOOOOO|I", &data, &new_tag, &new_comment, &new_string, &list_attributes, &new_doctype, &(opts.stack_size))) return NULL;
+    if (list_attributes != Py_None && !PyDict_Check(list_attributes)) { PyErr_SetString(PyExc_TypeError, "list_attributes must be a dict or None"); return NULL; }
+    output = parse_or_reuse(data, &(opts.gumbo_opts), GUMBO_TAG_LAST, GUMBO_NAMESPACE_HTML, &owned, NULL);
+    if (output == NULL) return NULL;
+    GumboDocument* document = &(output->document->v.document);
+
+    if (new_doctype != Py_None && document->has_doctype) {
+        ret = PyObject_CallFunction(new_doctype, "sss", document->name, document->public_identifier, document->system_identifier);
+        if (ret == NULL) { release_output(data, output, owned); return NULL; }
+        Py_CLEAR(ret);
+    }
+    ans = as_soup_tree(output, &opts, new_tag, new_comment, new_string, list_attributes);
+    release_output(data, output, owned);
+    return ans;
+}
+
+static PyObject *
+parse_with_builder(PyObject UNUSED *self, PyObject *args) {
     const char *buffer = NULL;
     Py_ssize_t sz = 0;
     GumboOutput *output = NULL;
-    PyObject *new_tag, *new_comment, *ans, *new_doctype, *append, *new_string, *ret;
+    PyObject *builder, *ans, *ret;
     Options opts = {0};
     opts.stack_size = 16 * 1024;
     opts.gumbo_opts = kGumboDefaultOptions;
     opts.gumbo_opts.max_errors = 0;  // We discard errors since we are not reporting them anyway
 
-    if (!PyArg_ParseTuple(args, "s#OOOOO|I", &buffer, &sz, &new_tag, &new_comment, &new_string, &append, &new_doctype, &(opts.stack_size))) return NULL;
+    if (!PyArg_ParseTuple(args, "s#O|I", &buffer, &sz, &builder, &(opts.stack_size))) return NULL;
     Py_BEGIN_ALLOW_THREADS;
     output = gumbo_parse_with_options(&(opts.gumbo_opts), buffer, (size_t)sz);
     Py_END_ALLOW_THREADS;
-    if (output == NULL) PyErr_NoMemory();
+    if (output == NULL) return PyErr_NoMemory();
     GumboDocument* document = &(output->document->v.document);
 
-    if (new_doctype != Py_None && document->has_doctype) {
-        ret = PyObject_CallFunction(new_doctype, "sss", document->name, document->public_identifier, document->system_identifier);
+    if (document->has_doctype && PyObject_HasAttrString(builder, "new_doctype")) {
+        ret = PyObject_CallMethod(builder, "new_doctype", "sss", document->name, document->public_identifier, document->system_identifier);
         if (ret == NULL) { gumbo_destroy_output(output); return NULL; }
         Py_CLEAR(ret);
     }
-    ans = as_python_tree(output, &opts, new_tag, new_comment, new_string, append);
+    ans = build_python_tree(output, &opts, builder);
     gumbo_destroy_output(output);
     return ans;
 }
 
-
 static PyObject *
-clone_doc(PyObject UNUSED *self, PyObject *capsule) {
+clone_doc(PyObject UNUSED *self, PyObject *args, PyObject *kwds) {
+    PyObject *capsule, *subtree = Py_None, *sd = NULL, *seq = NULL, *ans = NULL;
+    Py_ssize_t count = -1, num;
+    unsigned int *path = NULL;
+    size_t path_len = 0;
+    libxml_doc *sdoc, **docs = NULL;
+    const char *errmsg = NULL;
+    bool shared_dict;
+    static char *kwlist[] = {"capsule", "subtree", "count", "shared_dict", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OnO", kwlist, &capsule, &subtree, &count, &sd)) return NULL;
     if (!PyCapsule_CheckExact(capsule)) { PyErr_SetString(PyExc_TypeError, "Must specify a capsule as the argument"); return NULL; }
-    libxml_doc *sdoc = PyCapsule_GetPointer(capsule, PyCapsule_GetName(capsule)), *doc;
+    sdoc = PyCapsule_GetPointer(capsule, PyCapsule_GetName(capsule));
     if (sdoc == NULL) return NULL;
-    doc = copy_libxml_doc(sdoc);
-    if (doc == NULL) return PyErr_NoMemory();
+    // Subtrees can only be cloned into a shared dictionary, full clones
+    // default to xmlCopyDoc() which is at least as fast
+    shared_dict = sd ? PyObject_IsTrue(sd) : subtree != Py_None;
+    if (subtree != Py_None) {
+        if (!shared_dict) { PyErr_SetString(PyExc_ValueError, "Cloning a subtree requires shared_dict=True"); return NULL; }
+        seq = PySequence_Fast(subtree, "subtree must be a sequence of child indices");
+        if (seq == NULL) return NULL;
+        path_len = PySequence_Fast_GET_SIZE(seq);
+        path = malloc(sizeof(unsigned int) * (path_len + 1));
+        if (path == NULL) { PyErr_NoMemory(); goto end; }
+        for (size_t i = 0; i < path_len; i++) {
+            unsigned long idx = PyLong_AsUnsignedLong(PySequence_Fast_GET_ITEM(seq, i));
+            if (PyErr_Occurred()) goto end;
+            path[i] = (unsigned int)idx;
+        }
+    }
+    num = count < 0 ? 1 : count;
+    docs = calloc(num + 1, sizeof(libxml_doc*));
+    if (docs == NULL) { PyErr_NoMemory(); goto end; }
+    Py_BEGIN_ALLOW_THREADS;
+    for (Py_ssize_t i = 0; i < num; i++) {
+        docs[i] = shared_dict ? clone_libxml_doc(sdoc, path, path_len, &errmsg) : copy_libxml_doc(sdoc);
+        if (docs[i] == NULL) break;
+    }
+    Py_END_ALLOW_THREADS;
+    for (Py_ssize_t i = 0; i < num; i++) {
+        if (docs[i] == NULL) {
+            if (errmsg) PyErr_SetString(PyExc_IndexError, errmsg);
+            else PyErr_NoMemory();
+            for (Py_ssize_t j = 0; j < i; j++) free_libxml_doc(docs[j]);
+            goto end;
+        }
+    }
+    if (count < 0) { ans = encapsulate(docs[0]); goto end; }
+    ans = PyList_New(num);
+    if (ans == NULL) {
+        for (Py_ssize_t i = 0; i < num; i++) free_libxml_doc(docs[i]);
+        goto end;
+    }
+    for (Py_ssize_t i = 0; i < num; i++) {
+        PyObject *c = encapsulate(docs[i]);
+        if (c == NULL) {
+            // encapsulate() frees the document on failure
+            for (Py_ssize_t j = i + 1; j < num; j++) free_libxml_doc(docs[j]);
+            Py_CLEAR(ans);
+            goto end;
+        }
+        PyList_SET_ITEM(ans, i, c);
+    }
+end:
+    Py_CLEAR(seq); free(path); free(docs);
+    return ans;
+}
+
+static PyObject *
+load_compact(PyObject UNUSED *self, PyObject *args) {
+    Py_buffer buf = {0};
+    libxml_doc *doc = NULL;
+    const char *errmsg = NULL;
+    if (!PyArg_ParseTuple(args, "y*", &buf)) return NULL;
+    Py_BEGIN_ALLOW_THREADS;
+    doc = load_compact_tree(buf.buf, (size_t)buf.len, &errmsg);
+    Py_END_ALLOW_THREADS;
+    PyBuffer_Release(&buf);
+    if (doc == NULL) {
+        if (errmsg) PyErr_SetString(PyExc_ValueError, errmsg);
+        else PyErr_NoMemory();
+        return NULL;
+    }
     return encapsulate(doc);
 }
 
@@ -147,8 +487,55 @@ methods[] = {
         "parse_and_build()\n\nParse specified bytestring which must be in the UTF-8 encoding and build a tree using the specified functions."
     },
 
-    {"clone_doc", clone_doc, METH_O,
-        "clone_doc()\n\nClone the specified document. Which must be a document returned by the parse() function."
+    {"parse_etree", (PyCFunction)(void(*)(void))(PyCFunctionWithKeywords)(parse_etree), METH_VARARGS | METH_KEYWORDS,
+        "parse_etree(data, element, subelement, comment, namespace_elements=False, line_number_attr=None, sanitize_names=True, stack_size, fragment_context=None, fragment_namespace)\n\n"
+        "Parse specified bytestring which must be in the UTF-8 encoding and build a tree of ElementTree elements, using the specified Element, SubElement and Comment factories."
+    },
+
+    {"parse_native", (PyCFunction)(void(*)(void))(PyCFunctionWithKeywords)(parse_native), METH_VARARGS | METH_KEYWORDS,
+        "parse_native(data, maybe_xhtml=False, sanitize_names=True, stack_size, fragment_context=None, fragment_namespace)\n\n"
+        "Parse specified bytestring which must be in the UTF-8 encoding and return a capsule wrapping the gumbo parse tree, for use with native_node(), native_text() and native_iter(). "
+        "It can also be passed instead of the data to parse(), parse_etree(), parse_soup() and parse_and_build() to convert the tree without parsing again."
+    },
+
+    {"native_node", native_node, METH_VARARGS,
+        "native_node(tree, index)\n\nReturn the data for the node at index in the tree returned by parse_native(). Nodes are indexed in document order, the document being 0."
+    },
+
+    {"native_text", native_text, METH_VARARGS,
+        "native_text(tree, index)\n\nReturn the text of all text nodes in the subtree rooted at the node at index."
+    },
+
+    {"native_iter", native_iter, METH_VARARGS,
+        "native_iter(tree, index, tag=None)\n\nReturn the indices of all elements in the subtree rooted at the node at index, optionally only those with the specified tag name."
+    },
+
+    {"close_native", close_native, METH_O,
+        "close_native(tree)\n\nFree the memory used by the tree returned by parse_native(). The tree can no longer be used after this."
+    },
+
+    {"parse_soup", (PyCFunction)parse_soup, METH_VARARGS,
+        "parse_soup(data, new_tag, new_comment, new_string, list_attributes, new_doctype, stack_size)\n\nParse specified bytestring which must be in the UTF-8 encoding and build a BeautifulSoup 4 tree."
+        " The tree linkage (parent, siblings, next and previous elements and contents) is set directly. list_attributes is a dict mapping tag names"
+        " (or * for all tags) to the names of attributes whose values are split into lists."
+    },
+
+    {"parse_with_builder", (PyCFunction)parse_with_builder, METH_VARARGS,
+        "parse_with_builder(data, builder, stack_size)\n\nParse specified bytestring which must be in the UTF-8 encoding and build a tree using the specified builder object."
+        " The builder must have the methods new_tag(name, attrs), new_comment(text), new_string(text) and append_many(parent, children)."
+        " append_many() is called once for every element that has children, with a list of all its children, before the children of those children are added."
+        " If the builder has a new_doctype(name, public_id, system_id) method it is called for the doctype, if any. Returns the root element."
+    },
+
+    {"clone_doc", (PyCFunction)(void(*)(void))(PyCFunctionWithKeywords)(clone_doc), METH_VARARGS | METH_KEYWORDS,
+        "clone_doc(capsule, subtree=None, count=None, shared_dict=None)\n\nClone the specified document. Which must be a document returned by the parse() function."
+        " If subtree is a sequence of child indices, only the element at that path from the root element is cloned, as the root of the new document."
+        " If count is specified, a list of count clones is returned. When shared_dict is True, the clones use the dictionary of the source document"
+        " for names, instead of copying them. It defaults to True for subtrees and False otherwise. The source document must not be modified while it is being cloned."
+    },
+
+    {"load_compact", load_compact, METH_VARARGS,
+        "load_compact()\n\nBuild a document from the specified buffer, which must be in the compact tree format."
     },
 
     {NULL, NULL, 0, NULL}
@@ -47,6 +47,15 @@ class AdaptTest(TestCase):
         if sys.version_info.major > 2:
             self.assertIn('<!--' + COMMENT + '-->', tostring(root).decode('ascii'))
 
+    def test_etree_direct(self):
+        from xml.etree.ElementTree import tostring
+        from html5_parser import ParseCache
+        html = HTML + '<p id=1 xmlns:foo=x>a<!--c-->b<custom-tag x-y=1 a"b=2>z</custom-tag>t'
+        for kw in ({}, {'namespace_elements': True}, {'line_number_attr': 'ln'}, {'fragment_context': 'div'}):
+            # Using a cache causes the tree to be built via libxml2 and adapt()
+            expected = parse(html, treebuilder='etree', cache=ParseCache(), **kw)
+            self.ae(tostring(expected), tostring(parse(html, treebuilder='etree', **kw)))
+
     def test_dom(self):
         root = parse(HTML, treebuilder='dom', namespace_elements=True)
         doc = root.ownerDocument
@@ -73,6 +82,36 @@ class AdaptTest(TestCase):
         self.ae(dict(svg.firstChild.attributes.itemsNS()), dict([((XLINK, u'href'), 'h')]))
         self.ae(root.lastChild.nodeValue, COMMENT.replace('--', '\u2014'))
 
+    def test_dom_lazy(self):
+        for kw in ({'namespace_elements': True}, {}, {'sanitize_names': False}, {'maybe_xhtml': True}):
+            expected = parse(HTML, treebuilder='dom', return_root=False, **kw)
+            doc = parse(HTML, treebuilder='dom_lazy', return_root=False, **kw)
+            self.ae(expected.toxml(), doc.toxml())
+            self.ae(expected.toprettyxml(), doc.toprettyxml())
+            self.ae(expected.doctype, doc.doctype)
+        root = doc.documentElement
+        self.assertIs(root.ownerDocument, doc)
+        self.assertIs(root.parentNode, doc)
+        p = doc.getElementsByTagName('p')[0]
+        self.assertIs(p, root.getElementsByTagName('body')[0].firstChild.nextSibling)
+        self.assertIs(p.parentNode.parentNode, root)
+        self.assertIs(p.nextSibling.previousSibling, p)
+        self.ae(p.firstChild.nextSibling.firstChild.data, 'test')
+        self.ae(root.lastChild.nodeValue, COMMENT.replace('--', '\u2014'))
+        svg = doc.getElementsByTagNameNS(SVG, 'svg')[0]
+        self.ae(svg.firstChild.getAttributeNS(XLINK, 'href'), 'h')
+        self.ae(dict(svg.firstChild.attributes.itemsNS()), {(XLINK, 'href'): 'h'})
+        from xml.dom import NoModificationAllowedErr
+        self.assertRaises(NoModificationAllowedErr, root.appendChild, p)
+        # Without sanitizing, lang and a literal xml:lang are the same attribute to minidom
+        html = '<p lang=a xml:lang=b id=x><p xml:lang=c lang=d>'
+        expected = parse(html, treebuilder='dom', sanitize_names=False)
+        root = parse(html, treebuilder='dom_lazy', sanitize_names=False)
+        self.ae(expected.toxml(), root.toxml())
+        for e, p in zip(expected.getElementsByTagName('p'), root.getElementsByTagName('p')):
+            self.ae(list(e.attributes.keys()), p.attributes.keys())
+            self.ae(e.getAttributeNS(None, 'lang'), p.getAttributeNS(None, 'lang'))
+
     def test_soup(self):
         from html5_parser.soup import set_soup_module
         soups = []
@@ -10,7 +10,7 @@ import codecs
 from lxml import etree
 
 from . import TestCase, tostring
-from html5_parser import check_for_meta_charset, html_parser, parse, check_bom, BOMS
+from html5_parser import check_for_meta_charset, html_parser, parse, check_bom, BOMS, ParseStats
 
 
 class BasicTests(TestCase):
@@ -26,6 +26,142 @@ class BasicTests(TestCase):
         root2 = etree.adopt_external_document(cap2).getroot()
         self.ae(tostring(root), tostring(root2))
 
+    def test_clone_doc(self):
+        html = '<!DOCTYPE html><!--c--><p id=1 xml:lang=en>a<b>b</b><svg><a xlink:href=x>t</a></svg>'
+        for kw in ({}, {'namespace_elements': True}, {'maybe_xhtml': True}, {'keep_doctype': False}):
+            capsule = html_parser.parse(html.encode('utf-8'), **kw)
+
+            def clone(**kw):
+                return etree.adopt_external_document(html_parser.clone_doc(capsule, **kw)).getroot()
+
+            root = clone()
+            t = clone(shared_dict=True).getroottree()
+            self.ae(tostring(root), tostring(t.getroot()))
+            self.ae(root.getroottree().docinfo.doctype, t.docinfo.doctype)
+            self.ae(tostring(root[1][0]), tostring(clone(subtree=(1, 0))))
+            self.ae(tostring(root[1][0][1]), tostring(clone(subtree=[1, 0, 1])))
+            for sd in (False, True):
+                clones = html_parser.clone_doc(capsule, count=3, shared_dict=sd)
+                self.ae(len(clones), 3)
+                for c in clones:
+                    self.ae(tostring(root), tostring(etree.adopt_external_document(c).getroot()))
+            self.assertRaises(IndexError, html_parser.clone_doc, capsule, subtree=(5,))
+            self.assertRaises(ValueError, html_parser.clone_doc, capsule, subtree=(1,), shared_dict=False)
+
+    def test_shared_dict(self):
+        html = '<p id=1 rel=nofollow>a<custom-tag x-y=1>b</custom-tag><svg><foreignObject/></svg>'
+        for kw in ({}, {'namespace_elements': True}, {'maybe_xhtml': True}, {'line_number_attr': 'ln'}):
+            root = parse(html, shared_dict=True, **kw)
+            self.ae(tostring(parse(html, **kw)), tostring(root))
+            # parse() always puts elements in namespaces with maybe_xhtml
+            raw = dict(kw, namespace_elements=True) if kw.get('maybe_xhtml') else kw
+            capsule = html_parser.clone_doc(html_parser.parse(html.encode('utf-8'), shared_dict=True, **raw))
+            clone = etree.adopt_external_document(html_parser.clone_doc(capsule, shared_dict=True)).getroot()
+            self.ae(tostring(root), tostring(clone))
+            for r in (root, clone):
+                self.ae(len(list(r.iter('{*}p'))), 1)
+                self.ae(len(list(r.iter('{*}custom-tag'))), 1)
+
+    def test_intern_strings(self):
+        html = '<p class=x>\n <a class=x rel=nofollow>t</a>\n <a class=x>a long text string</a>\n <svg xml:lang=en><a xlink:href=h/></svg>'
+        for kw in ({}, {'maybe_xhtml': True}, {'shared_dict': True}):
+            root = parse(html, intern_max_len=8, **kw)
+            self.ae(tostring(parse(html, **kw)), tostring(root))
+            # parse() always puts elements in namespaces with maybe_xhtml
+            raw = dict(kw, namespace_elements=True) if kw.get('maybe_xhtml') else kw
+            clone = etree.adopt_external_document(html_parser.clone_doc(
+                html_parser.parse(html.encode('utf-8'), intern_max_len=8, **raw))).getroot()
+            self.ae(tostring(root), tostring(clone))
+        # Modifying interned strings must not affect other nodes
+        root = parse(html, intern_max_len=8)
+        p = root[1][0]
+        p.text += 'x'
+        p[0].tail = 'y'
+        p[0].set('class', 'z')
+        self.ae((p.text, p[0].tail, p[1].tail), ('\n x', 'y', '\n '))
+        self.ae([a.get('class') for a in (p, p[0], p[1])], ['x', 'z', 'x'])
+
+    def test_parse_with_builder(self):
+        class Node(object):
+            def __init__(self, name, attrs):
+                self.name, self.attrs, self.children = name, attrs, []
+
+        def serialize(node):
+            if isinstance(node, Node):
+                return (node.name, node.attrs, [serialize(c) for c in node.children])
+            return node
+
+        class Builder(object):
+            new_tag, new_string, new_comment = Node, type(''), type('')
+            calls = 0
+
+            def append_many(self, parent, children):
+                self.calls += 1
+                parent.children.extend(children)
+
+            def new_doctype(self, *args):
+                self.doctype = args
+
+        html = '<!DOCTYPE html><p a=1>x<b>y<i>z</i></b><!--c--><svg><image xlink:href=h>'.encode('utf-8')
+        b = Builder()
+        root = html_parser.parse_with_builder(html, b)
+        self.ae(b.doctype, ('html', '', ''))
+        self.ae(b.calls, 6)
+        expected = html_parser.parse_and_build(
+            html, Node, type(''), type(''), lambda p, c: p.children.append(c), None)
+        self.ae(serialize(expected), serialize(root))
+
+    def test_single_pass(self):
+        for html in (
+            '<!DOCTYPE html><!--c--><p id=1>a<b>b<i>c</b>d</i>e<p>f',  # adoption agency
+            '<a>1<p>2</a>3</p><a><div><div>x</a>y',
+            '<table>a<tr>b<td>c</td>d</tr>e<b>f</table>g',  # foster parenting
+            '<p>x</p><frameset><frame></frameset>',
+            '<html a=1><body b=2><p>x<html c=3><body d=4 b=5>',  # attribute merging
+            '<isindex prompt=p action=a>',
+            '<p><svg><a xlink:href=h>t<b>u</svg><math><mi><p>x<b>y</math>',
+            '<template><tr><td>x</template><p>t\n\n<!--e-->',
+            '<svg><a xlink:href=h>t</a></svg><frameset>',  # destroyed nodes
+            '<table><form><tr><td>x</form><form>y</table><form>z',  # closed form elements
+            '<div><table><tr><td><b>1</td><td><i>2</table><svg><desc><b>3<p>4</b>5</svg></div>' * 3,
+        ):
+            for kw in ({}, {'namespace_elements': True}, {'line_number_attr': 'ln'}, {'keep_doctype': False},
+                       {'fragment_context': 'div'}, {'intern_max_len': 8}):
+                self.ae(tostring(parse(html, **kw)), tostring(parse(html, single_pass=True, **kw)), html)
+        html = '<p class=x>a<b>b</b> <i>c</i></p>\n<table><tr><td><b>d</td></table>' * 1000
+        default, single = ParseStats(), ParseStats()
+        parse(html, stats=default)
+        parse(html, stats=single, single_pass=True)
+        # The closed parts of the parse tree are freed while parsing
+        self.assertLess(10 * single.gumbo_peak_bytes, default.gumbo_peak_bytes)
+
+    def test_parse_stats(self):
+        html = '<p id=1 class=x>a<b>b</b><!--c--><svg><a xlink:href=h>t</a></svg>' * 10
+        stats = ParseStats()
+        parse(html, stats=stats)
+        self.ae((stats.elements, stats.attributes, stats.text_nodes), (3 + 40, 30, 30))
+        self.assertGreater(stats.gumbo_total_bytes, len(html))
+        self.assertGreaterEqual(stats.gumbo_total_bytes, stats.gumbo_peak_bytes)
+        self.assertGreater(stats.libxml_bytes, 0)
+        for kw in ({'single_pass': True}, {'treebuilder': 'dom'}, {'maybe_xhtml': True}):
+            s = ParseStats()
+            parse(html, stats=s, **kw)
+            self.ae((s.elements, s.attributes, s.text_nodes), (stats.elements, stats.attributes, stats.text_nodes))
+            self.assertGreater(s.gumbo_peak_bytes, 0)
+
+    def test_parse_timings(self):
+        html = '<p id=1 class=x>a<b>b</b><!--c--><svg><a xlink:href=h>t</a></svg>' * 10
+        stats = ParseStats()
+        parse(html.encode('utf-8'), stats=stats, treebuilder='dom')
+        for x in ('sniff_time', 'chardet_time', 'transcode_time', 'parse_time', 'convert_time', 'adopt_time', 'treebuilder_time'):
+            self.assertGreater(getattr(stats, x), 0, x)
+        self.assertAlmostEqual(stats.total_time, sum(v for k, v in stats.as_dict().items() if k.endswith('_time')))
+        for kw in ({'single_pass': True}, {'treebuilder': 'etree'}, {'treebuilder': 'native'}):
+            stats = ParseStats()
+            parse(html, stats=stats, **kw)
+            self.assertGreater(stats.parse_time, 0)
+            self.ae((stats.chardet_time, stats.convert_time, stats.treebuilder_time), (0, 0, 0))
+
     def test_stack(self):
         sz = 100
         raw = '\n'.join(['<p>{}'.format(i) for i in range(sz)])
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gzip
+import os
+import shutil
+import tarfile
+import tempfile
+
+from html5_parser import parse
+from html5_parser.bench import (
+    SCENARIOS, check_baselines, diff_reports, missing_baselines, read_corpus, relative_throughputs, replay_corpus,
+    run_memory, run_synthetic, run_threads, synthetic_document, thread_counts
+)
+
+from . import TestCase
+
+RESPONSE = (
+    b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=iso-8859-1\r\nTransfer-Encoding: chunked\r\n\r\n'
+    b'5\r\n<p>\xe9t\r\n4\r\n\xe9</p\r\n1\r\n>\r\n0\r\n\r\n')
+
+
+def warc_record(rtype, uri, block, ctype):
+    head = 'WARC/1.0\r\nWARC-Type: {}\r\nWARC-Target-URI: {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n\r\n'.format(
+        rtype, uri, ctype, len(block))
+    return head.encode('ascii') + block + b'\r\n\r\n'
+
+
+class BenchTest(TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir)
+
+    def test_corpus_formats(self):
+        docs = {'a.html': b'<p>one', os.path.join('sub', 'b.html'): b'<p>two'}
+        cdir = os.path.join(self.tdir, 'corpus')
+        for name, data in docs.items():
+            q = os.path.join(cdir, name)
+            if not os.path.exists(os.path.dirname(q)):
+                os.makedirs(os.path.dirname(q))
+            with open(q, 'wb') as f:
+                f.write(data)
+        self.ae(docs, {name: data for name, data, enc in read_corpus(cdir)})
+
+        tar = os.path.join(self.tdir, 'corpus.tar.gz')
+        with tarfile.open(tar, 'w:gz') as tf:
+            tf.add(cdir, arcname='corpus')
+        self.ae(sorted(docs.values()), sorted(data for name, data, enc in read_corpus(tar)))
+
+        warc = os.path.join(self.tdir, 'corpus.warc.gz')
+        with gzip.open(warc, 'wb') as f:
+            f.write(warc_record('warcinfo', '', b'software: test', 'application/warc-fields'))
+            f.write(warc_record('request', 'http://a', b'GET / HTTP/1.1\r\n\r\n', 'application/http'))
+            f.write(warc_record('response', 'http://a', RESPONSE, 'application/http; msgtype=response'))
+            f.write(warc_record('response', 'http://b', b'HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n\r\nxxx', 'application/http'))
+            f.write(warc_record('resource', 'http://c', b'<p>three', 'text/html'))
+        self.ae([('http://a', b'<p>\xe9t\xe9</p>', 'iso-8859-1'), ('http://c', b'<p>three', None)], list(read_corpus(warc)))
+
+        report = replay_corpus(warc, treebuilders=('lxml', 'etree'), repeat=2)
+        for name in ('lxml', 'etree'):
+            r = report['results'][name]
+            self.ae((r['documents'], r['bytes'], r['errors']), (2, 18, 0))
+            self.assertGreater(r['throughput'], 0)
+            self.assertLessEqual(r['latency']['p50'], r['latency']['max'])
+
+    def test_diff(self):
+        def report(throughput, p50):
+            return {'results': {'lxml': {'throughput': throughput, 'latency': {'p50': p50, 'p90': p50, 'p99': p50}}}}
+
+        def regressions(old, new, threshold=5):
+            return [row[1] for row in diff_reports(old, new, threshold) if row[-1]]
+
+        self.ae(regressions(report(100, 1), report(97, 1.02)), [])
+        self.ae(regressions(report(100, 1), report(90, 1)), ['throughput'])
+        self.ae(regressions(report(100, 1), report(200, 1.5)), ['latency.p50', 'latency.p90', 'latency.p99'])
+        self.ae(regressions(report(100, 1), report(90, 1.5), threshold=60), [])
+        self.ae(diff_reports(report(100, 1), {'results': {}}), [])
+
+    def test_synthetic(self):
+        for name in SCENARIOS:
+            doc = synthetic_document(name, size=5000, seed=1)
+            self.ae(doc, synthetic_document(name, size=5000, seed=1))
+            self.assertNotEqual(doc, synthetic_document(name, size=5000, seed=2))
+            self.assertGreaterEqual(len(doc), 5000)
+            root = parse(doc, treebuilder='etree')
+            self.ae(root.tag, 'html')
+        root = parse(synthetic_document('foreign_content', 1000), treebuilder='etree')
+        self.assertTrue(root.findall('.//svg/g/foreignObject/p'))
+        self.assertTrue(root.findall('.//math/annotation-xml/b'))
+
+        report = run_synthetic(('deep_nesting',), ('etree',), size=1000, repeat=2)
+        self.ae(set(report['results']), {'reference:etree', 'deep_nesting:etree'})
+        relative = relative_throughputs(report)
+        self.ae(set(relative), {'deep_nesting:etree'})
+        val = relative['deep_nesting:etree']
+        self.ae(check_baselines(report, {'deep_nesting:etree': val * 1.2}), [])
+        self.ae(check_baselines(report, {'deep_nesting:etree': val * 2}), [('deep_nesting:etree', val * 2, val)])
+        self.ae(check_baselines(report, {}), [])
+        self.ae(missing_baselines(report, {}), ['deep_nesting:etree'])
+        self.ae(missing_baselines(report, {'deep_nesting:etree': val}), [])
+
+    def test_memory(self):
+        report = run_memory(('etree',), sizes=(20000,))
+        r = report['results']['etree:reference-20000.html']
+        self.assertGreaterEqual(r['bytes'], 20000)
+        self.assertGreater(r['python_heap'], r['bytes'])
+        self.assertGreaterEqual(r['python_peak'], r['python_heap'])
+        for x in ('peak_rss', 'retained_rss'):
+            self.assertIsInstance(r[x], int)
+
+    def test_threads(self):
+        self.ae(thread_counts(1), (1,))
+        self.ae(thread_counts(6), (1, 2, 4, 6))
+        docs = [('d%d' % i, synthetic_document('reference', 5000, seed=i), 'utf-8') for i in range(5)]
+        report = run_threads(docs, ('etree',), max_threads=2, passes=2)
+        self.ae(set(report['results']), {'etree:1', 'etree:2'})
+        for n, r in enumerate(report['results'].values()):
+            self.ae(r['threads'], n + 1)
+            self.ae(r['documents'], 10)
+            self.ae(r['bytes'], 2 * sum(len(d[1]) for d in docs))
+            self.assertGreater(r['phases']['parse_time'], 0)
+        self.ae(report['results']['etree:1']['speedup'], 1)
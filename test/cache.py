@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from html5_parser import ParseCache, ParseStats, parse
+
+from . import TestCase, tostring
+
+
+class CacheTest(TestCase):
+
+    def test_cache_hits(self):
+        cache = ParseCache()
+        html = '<p id=1>xxx<svg><image xlink:href="h">'
+        first = parse(html, cache=cache)
+        second = parse(html, cache=cache)
+        self.ae((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+        self.ae(tostring(first), tostring(second))
+        self.ae(tostring(first), tostring(parse(html)))
+        # Hits must return independent copies
+        first.set('attr', 'abc')
+        self.assertIsNone(second.get('attr'))
+        self.assertIsNone(parse(html, cache=cache).get('attr'))
+        # Changing options is a miss
+        parse(html, cache=cache, namespace_elements=True)
+        self.ae((cache.hits, cache.misses, len(cache)), (2, 2, 2))
+        parse(html, cache=cache, treebuilder='soup')
+        self.ae((cache.hits, cache.misses, len(cache)), (2, 2, 2))
+
+    def test_cache_eviction(self):
+        docs = ['<p>{}</p>'.format(str(i) * 30) for i in range(3)]
+        stats = ParseStats()
+        parse(docs[0], stats=stats)
+        # Entries are charged with the memory used by their trees, not the size of the HTML
+        size = stats.libxml_bytes
+        self.assertGreater(size, 2 * len(docs[0]))
+        cache = ParseCache(max_bytes=size * 5 // 2)
+        for html in docs:
+            parse(html, cache=cache)
+        self.ae((cache.evictions, len(cache)), (1, 2))
+        self.ae(cache.current_bytes, 2 * size)
+        parse(docs[0], cache=cache)
+        self.ae((cache.hits, cache.evictions), (0, 2))
+        parse('<p>' + 'x' * (3 * size), cache=cache)
+        self.ae(len(cache), 2)
+        cache.clear()
+        self.ae((len(cache), cache.current_bytes), (0, 0))
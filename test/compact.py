@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+
+from html5_parser import dump_compact, load_compact, parse
+
+from . import TestCase, tostring
+
+HTML = '''<!DOCTYPE html><!-- before --><html lang="en" xml:lang="en"><head><title>t</title></head>
+<body><p id="1" class="a b">A <span>test</span> of téxt<!-- c --> and tail
+<p><svg viewbox="v"><image xlink:href="h"/></svg><math><mi>x</mi></math></body></html><!-- after -->'''
+
+
+class CompactTest(TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tdir, 'tree.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir)
+
+    def roundtrip(self, root, **kw):
+        dump_compact(root, self.path)
+        return load_compact(self.path, **kw)
+
+    def test_compact_roundtrip(self):
+        for kw in ({}, {'namespace_elements': True}, {'maybe_xhtml': True}, {'line_number_attr': 'ln'}):
+            root = parse(HTML, **kw)
+            loaded = self.roundtrip(root)
+            self.ae(tostring(root.getroottree()), tostring(loaded.getroottree()), repr(kw))
+            self.ae([e.sourceline for e in root.iter()], [e.sourceline for e in loaded.iter()])
+        # Redundant and shadowed namespace declarations are preserved
+        for html in (
+            '<form xmlns:foo="x"><custom-tag xmlns:foo="x" foo:a="1">t</custom-tag>',
+            '<div xmlns:foo="x"><div xmlns:foo="y" foo:a="1">t</div>',
+        ):
+            root = parse(html, maybe_xhtml=True)
+            self.ae(tostring(root), tostring(self.roundtrip(root)), html)
+        tree = parse('<p>x', keep_doctype=False, return_root=False)
+        self.ae(tostring(tree), tostring(self.roundtrip(tree, return_root=False)))
+
+    def test_compact_treebuilders(self):
+        root = self.roundtrip(parse(HTML), treebuilder='etree')
+        self.ae(root.find('./body/p').attrib, {'id': '1', 'class': 'a b'})
+        root = self.roundtrip(parse(HTML), treebuilder='lxml_html')
+        from lxml.html import HtmlElement
+        self.assertIsInstance(root, HtmlElement)
+        self.assertRaises(ValueError, load_compact, self.path, treebuilder='soup')
+
+    def test_compact_invalid(self):
+        with open(self.path, 'wb'):
+            pass
+        self.assertRaises(ValueError, load_compact, self.path)
+        dump_compact(parse(HTML), self.path)
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(raw[:-10])
+        self.assertRaises(ValueError, load_compact, self.path)
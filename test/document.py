@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from xml.etree.ElementTree import tostring as etree_tostring
+
+from html5_parser import parse, parse_raw
+
+from . import TestCase, tostring
+
+HTML = '''<!DOCTYPE html><p id=1 a"b=2 xmlns:foo=x>Some <b>bold</b> text<!--c-->
+<svg viewbox=v><image xlink:href=h /></svg><custom-tag x:y=1>z</custom-tag><x:y a:b=1>q</x:y>'''
+
+
+class DocumentTest(TestCase):
+
+    def test_parse_raw(self):
+        for kw in ({}, {'namespace_elements': True}, {'maybe_xhtml': True}, {'sanitize_names': False},
+                   {'line_number_attr': 'ln', 'keep_doctype': False}, {'fragment_context': 'div'}):
+            with parse_raw(HTML, **kw) as doc:
+                # Converting the same document repeatedly, in any order, must
+                # give the same results as parsing
+                for i in range(2):
+                    self.ae(tostring(parse(HTML, **kw).getroottree()), tostring(doc.to_lxml(return_root=False)))
+                    self.ae(etree_tostring(parse(HTML, treebuilder='etree', **kw)), etree_tostring(doc.to_etree()))
+                self.ae(doc.to_native().find('b').text, 'bold')
+                self.ae(doc.to_text(), doc.to_native(return_root=False).text)
+            self.assertTrue(doc.closed)
+            self.assertRaises(ValueError, doc.to_lxml)
+        doc = parse_raw(HTML)
+        root = doc.to_lxml()
+        native = doc.to_native()
+        doc.close(), doc.close()
+        self.ae(root.find('.//b').text, 'bold')
+        self.assertRaises(ValueError, native.find, 'b')
+
+    def test_parse_raw_soup(self):
+        try:
+            import bs4  # noqa
+        except ImportError:
+            self.skipTest('bs4 not available')
+        with parse_raw(HTML) as doc:
+            lxml_root, soup_root = doc.to_lxml(), doc.to_soup()
+        self.ae(str(parse(HTML, treebuilder='soup')), str(soup_root))
+        self.ae(lxml_root.find('.//b').text, soup_root.find('b').string)
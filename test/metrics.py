@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from html5_parser import ParseStats, metrics, parse
+
+from . import TestCase
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+    def test_metrics(self):
+        parse('<p>not counted')
+        self.ae(metrics.snapshot()['documents'], 0)
+        metrics.enable()
+        parse('<p>x')
+        parse(b'\xef\xbb\xbf<p>y', treebuilder='dom')
+        parse(b'<p>z', transport_encoding='utf-8', treebuilder='native')
+        stats = ParseStats()
+        parse('<p>w', stats=stats)
+        self.assertGreater(stats.gumbo_peak_bytes, 0)
+        self.assertRaises(KeyError, parse, '<p>', fragment_context='no-such-tag')
+        s = metrics.snapshot(reset=True)
+        self.ae(s['documents'], 5)
+        self.ae(s['bytes'], 4 + 7 + 4 + 4 + 3)
+        self.ae(s['encoding_sources'], {'unicode': 3, 'bom': 1, 'transport': 1})
+        self.ae(s['exceptions'], {'KeyError': 1})
+        self.ae(s['parse_seconds']['count'], 5)
+        self.ae(s['convert_seconds']['count'], 3)
+        buckets = s['parse_seconds']['buckets']
+        self.ae(buckets[-1], (float('inf'), 5))
+        self.ae([c for b, c in buckets], sorted(c for b, c in buckets))
+        self.assertGreater(s['parse_seconds']['sum'], 0)
+        self.ae(metrics.snapshot()['documents'], 0)
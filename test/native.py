@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import gc
+
+from lxml import etree
+
+from html5_parser import parse
+
+from . import SVG, XHTML, TestCase
+
+HTML = '''<!DOCTYPE html><!--top--><html lang=en><body><p id=1 class="a b">Some <b>bold</b> text
+<!--c--><svg viewbox=v><foreignObject/></svg><custom-tag x-y=1>z</custom-tag><template><i>t</i></template>'''
+
+
+def serialize_lxml(elem):
+    children = []
+    if elem.text:
+        children.append(elem.text)
+    for child in elem:
+        if child.tag is etree.Comment:
+            children.append(('#comment', child.text))
+        else:
+            children.append(serialize_lxml(child))
+        if child.tail:
+            children.append(child.tail)
+    return (elem.tag, dict(elem.attrib), children)
+
+
+def serialize_native(elem):
+    children = []
+    for child in elem.children:
+        if hasattr(child, 'tag'):
+            children.append(serialize_native(child))
+        elif child.__class__.__name__ == 'Comment':
+            children.append(('#comment', child.text))
+        elif children and not isinstance(children[-1], tuple):
+            children[-1] += child.text
+        else:
+            children.append(child.text)
+    return (elem.tag, dict(elem.attrs), children)
+
+
+class NativeTest(TestCase):
+
+    def test_native_tree(self):
+        for kw in ({}, {'sanitize_names': False}, {'fragment_context': 'div'}):
+            root = parse(HTML, treebuilder='native', **kw)
+            self.ae(serialize_lxml(parse(HTML, **kw)), serialize_native(root))
+        doc = parse(HTML, treebuilder='native', return_root=False)
+        self.ae(doc.doctype, ('html', '', ''))
+        self.ae(doc.children[0].text, 'top')
+        root = doc.root
+        del doc
+        gc.collect()  # the tree must be kept alive by its nodes
+        self.ae(root.get('lang'), 'en')
+        self.ae(root.parent.root, root)
+        self.ae([e.tag for e in root.iter()], [
+            'html', 'head', 'body', 'p', 'b', 'svg', 'foreignObject', 'custom-tag', 'template', 'i'])
+        p = root.find('p')
+        self.ae(p.text, 'Some bold text\nzt')
+        self.ae(p.sourceline, 1)
+        self.ae(p.children[1].parent, p)
+        self.ae(p.namespace, XHTML)
+        self.ae(root.find('foreignObject').namespace, SVG)
+        self.ae([e.tag for e in root.findall('i')], ['i'])
+        self.ae(list(root.iter('nonexistent')), [])
+        self.assertIsNone(p.find('p'))
+        self.assertRaises(ValueError, parse, HTML, treebuilder='native', line_number_attr='ln')
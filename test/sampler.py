@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+
+from html5_parser import SlowDocumentSampler, parse
+from html5_parser.replay import replay, report
+from html5_parser.sampler import load_samples
+
+from . import TestCase
+
+
+class SamplerTest(TestCase):
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tdir)
+
+    def test_sampler(self):
+        sampler = SlowDocumentSampler(self.tdir, min_bytes=10, min_interval=0, max_samples=2)
+        sampler.install()
+        try:
+            parse('<p>short')
+            parse(b'<p>long enough', namespace_elements=True)
+            parse('<p>long enough, again', 'utf-8', False, 'dom')
+            parse('<p>no more samples')
+        finally:
+            sampler.uninstall()
+        parse('<p>not sampled, not installed')
+        samples = list(load_samples(self.tdir))
+        self.ae(len(samples), 2)
+        self.ae(len(os.listdir(self.tdir)), 4)
+        self.ae([s[1] for s in samples], [b'<p>long enough', '<p>long enough, again'])
+        meta = samples[0][2]
+        self.ae((meta['input_type'], meta['size'], meta['options']), ('bytes', 14, {'namespace_elements': True}))
+        self.assertGreater(meta['timings']['parse_time'], 0)
+        self.ae(samples[1][2]['options'], {'transport_encoding': 'utf-8', 'namespace_elements': False, 'treebuilder': 'dom'})
+        results = replay(self.tdir, repeat=2)
+        self.ae([r[0] for r in results], [s[0] for s in samples])
+        self.assertGreater(results[0][3].parse_time, 0)
+        out = io.StringIO()
+        report(results, out)
+        self.assertIn('parse_time', out.getvalue())
+
+    def test_rate_limit(self):
+        sampler = SlowDocumentSampler(self.tdir, min_seconds=0, min_interval=3600)
+        sampler.install()
+        try:
+            for i in range(3):
+                parse('<p>x')
+        finally:
+            sampler.uninstall()
+        self.ae(sampler.captured, 1)
+        self.assertRaises(ValueError, SlowDocumentSampler, self.tdir)
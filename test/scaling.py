@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# vim:fileencoding=utf-8
+# License: Apache 2.0 Copyright: 2026, Kovid Goyal <kovid at kovidgoyal.net>
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import timeit
+
+from html5_parser import parse, parse_raw
+
+from . import TestCase
+
+# Each document is parsed at two sizes, GROWTH times apart. When parse time
+# grows linearly the larger one takes about GROWTH times as long, when it
+# grows quadratically about GROWTH squared times. Comparing ratios rather
+# than absolute times keeps the tests independent of the speed of the machine
+# and of sanitizers.
+GROWTH = 4
+MAX_RATIO = 8
+
+
+def best_time(func, data, repeat=3):
+    # timeit disables garbage collection while timing
+    return min(timeit.Timer(lambda: func(data)).repeat(repeat, 1))
+
+
+def unclosed_formatting(n):
+    return '<b>x' * n
+
+
+def unclosed_anchors(n):
+    # Each <a> runs the adoption agency algorithm for the previous one
+    return '<a href="x">x' * n
+
+
+def unclosed_blocks(n):
+    return '<div>x' * n
+
+
+def anchors_around_blocks(n):
+    return '<a>x<div>y</a>' * n
+
+
+def formatting_across_blocks(n):
+    return '<div>' + '<b><i>x<p>y</b>z' * n
+
+
+def nested_tables(n):
+    return '<table><tr><td>x' * n
+
+
+def misnested_tables(n):
+    # Foster parented formatting elements inside ever deeper tables
+    return '<table><b>x<tr><td>y' * n
+
+
+def foster_parented_formatting(n):
+    return '<table>' + '<b>x' * n
+
+
+def many_attributes(n):
+    return '<div {}>x</div>'.format(' '.join('a%d="x"' % i for i in range(n)))
+
+
+def duplicate_attributes(n):
+    return '<div {}>x</div>'.format(' '.join('a="x"' for i in range(n)))
+
+
+class ScalingTests(TestCase):
+
+    def assert_linear(self, generate, n, func=parse):
+        small, large = (generate(n).encode('utf-8'), generate(GROWTH * n).encode('utf-8'))
+        small_time, large_time = best_time(func, small), best_time(func, large)
+        ratio = large_time / max(small_time, 1e-6)
+        self.assertLess(ratio, MAX_RATIO, '{}: parsing {} bytes took {:.4f}s but {} bytes took {:.4f}s'.format(
+            generate.__name__, len(small), small_time, len(large), large_time))
+
+    def test_open_formatting_elements(self):
+        self.assert_linear(unclosed_formatting, 10000)
+        self.assert_linear(unclosed_anchors, 5000)
+        self.assert_linear(anchors_around_blocks, 2500)
+        self.assert_linear(formatting_across_blocks, 2500)
+
+    def test_deep_nesting(self):
+        self.assert_linear(unclosed_blocks, 5000)
+
+    def test_table_misnesting(self):
+        self.assert_linear(nested_tables, 2500)
+        self.assert_linear(misnested_tables, 2500)
+        self.assert_linear(foster_parented_formatting, 10000)
+
+    def test_attributes(self):
+        self.assert_linear(many_attributes, 5000)
+        self.assert_linear(duplicate_attributes, 25000)
+        # Beyond a few tens of thousands of distinct names, interning them in
+        # the libxml2 dictionary is itself superlinear in older versions of
+        # libxml2, so only time the HTML parser for 100k attributes
+        self.assert_linear(many_attributes, 25000, func=parse_raw)
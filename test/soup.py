@@ -4,6 +4,7 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import codecs
 import gc
 
 from html5_parser.soup import parse, is_bs3
@@ -54,6 +55,49 @@ class SoupTest(TestCase):
         root = parse('<a class="a b" rel="x y">')
         self.ae(root.body.a.attrs, {'class': 'a b'.split(), 'rel': 'x y'.split()})
 
+    def test_soup_linkage(self):
+        if is_bs3():
+            self.skipTest('No bs4 module found')
+        root = parse('<p>a<b>b<i>c</i></b>d<!--e--><svg><image/></svg></p>f')
+        elements = [root]
+        while elements[-1].next_element is not None:
+            elements.append(elements[-1].next_element)
+        self.ae(elements, [root] + list(root.descendants))
+        for i, e in enumerate(elements[1:]):
+            self.assertIs(e.previous_element, elements[i])
+            siblings = e.parent.contents
+            idx = siblings.index(e)
+            self.assertIs(e.previous_sibling, siblings[idx - 1] if idx else None)
+            self.assertIs(e.next_sibling, siblings[idx + 1] if idx + 1 < len(siblings) else None)
+
+    def test_bs4_builder(self):
+        if is_bs3():
+            self.skipTest('No bs4 module found')
+        from bs4 import BeautifulSoup
+        from html5_parser.bs4_builder import HTML5ParserTreeBuilder
+        html = '<!DOCTYPE html><p class="a b">x<!--c--><svg><image xlink:href=h>'
+        soup = BeautifulSoup(html, 'html5-parser')
+        self.assertIsInstance(soup.builder, HTML5ParserTreeBuilder)
+        self.ae(type('')(soup), type('')(parse(html, return_root=False, keep_doctype=True)))
+        self.ae(soup.p['class'], ['a', 'b'])
+        soup = BeautifulSoup('<meta charset="iso-8859-1"><p>\xe9'.encode('iso-8859-1'), 'html5-parser')
+        self.ae(soup.p.string, '\xe9')
+        soup = BeautifulSoup('<p>\xe9'.encode('utf-16-le'), 'html5-parser', from_encoding='utf-16-le')
+        self.ae(soup.p.string, '\xe9')
+        self.ae(soup.original_encoding, 'utf-16-le')
+        soup = BeautifulSoup(codecs.BOM_UTF16_LE + '<p>\xe9'.encode('utf-16-le'), 'html5-parser')
+        self.ae((soup.p.string, soup.original_encoding), ('\xe9', 'utf-16-le'))
+        text = '\u0436\u0443\u0436\u0436\u0430\u043b\u0438 \u0436\u0443\u043a\u0438'
+        cyrillic = ('<meta charset="cp1251"><p>' + text).encode('cp1251')
+        soup = BeautifulSoup(cyrillic, 'html5-parser')
+        self.ae((soup.p.string, soup.original_encoding, soup.declared_html_encoding), (text, 'windows-1251', 'windows-1251'))
+        soup = BeautifulSoup(cyrillic, 'html5-parser', exclude_encodings=['cp1251'])
+        self.assertNotIn(soup.original_encoding, (None, 'windows-1251'))
+        self.assertNotEqual(soup.p.string, text)
+        # Only the html5-parser names are registered, not generic features such as html
+        self.assertNotIsInstance(BeautifulSoup('<p>x', 'html').builder, HTML5ParserTreeBuilder)
+        self.assertNotIsInstance(BeautifulSoup('<p>x', 'permissive').builder, HTML5ParserTreeBuilder)
+
     def test_soup_leak(self):
         HTML = '<p a=1>\n<a b=2 id=3>y</a>z<x:x class=4>1</x:x>'
         parse(HTML)  # So that BS and html_parser set up any internal objects
@@ -216,6 +216,7 @@ def build_obj(src, env, headers):
 
 TEST_EXE = os.path.join(build_dir, 'test')
 MEMLEAK_EXE = os.path.join(build_dir, 'mem-leak-check')
+BENCH_EXE = os.path.join(build_dir, 'bench')
 if is_ci:
     TEST_EXE = os.path.join(os.path.dirname(os.path.abspath(sys.executable)), 'test-html5-parser')
 SRC_DIRS = 'src gumbo'.split()
@@ -251,10 +252,28 @@ def build(args, build_leak_check=False):
         run_tool(cmd)
     for mod in glob.glob(os.path.join(build_dir, '*' + MOD_EXT)):
         shutil.copy2(mod, freeze_dir)
-    for mod in glob.glob(os.path.join('src', 'html5_parser', '*.py')):
+    for mod in glob.glob(os.path.join('src', 'html5_parser', '*.py')) + glob.glob(os.path.join('src', 'html5_parser', '*.json')):
         shutil.copy2(mod, freeze_dir)
 
 
+def build_bench():
+    # An optimized build, without sanitizers, of the native benchmark. Like
+    # setup.py it does not use -Werror, as some of the gumbo code has unused
+    # variables when assertions are disabled.
+    objects = []
+    env = init_env()
+    env.cflags.remove('-Werror')
+    for sdir in SRC_DIRS:
+        sources, headers = find_c_files(sdir)
+        if sdir == 'src':
+            headers += ('gumbo/gumbo.h', )
+        objects.extend(build_obj(c, env, headers) for c in sources)
+    if newer(BENCH_EXE, 'bench.c', *objects):
+        cmd = [env.cc] + env.cflags + ['bench.c', '-o', BENCH_EXE] + objects + env.ldflags
+        cmd = [x for x in cmd if x not in {'-fPIC', '-pthread', '-shared'}]
+        run_tool(cmd)
+
+
 TEST_COMMAND = ['run_tests.py']
 
 
@@ -271,8 +290,8 @@ def option_parser():
         'action',
         nargs='?',
         default='test',
-        choices='build test try leak'.split(),
-        help='Action to perform (default is build)')
+        choices='build test try leak bench'.split(),
+        help='Action to perform (default is build). For bench, pass its arguments after --, for example: bench -- -r 5 file.html')
     p.add_argument('rest', nargs='*')
     return p
 
@@ -301,6 +320,9 @@ def main():
         os.environ['ASAN_OPTIONS'] = 'leak_check_at_exit=0'
         add_python_path(os.environ, os.path.dirname(freeze_dir))
         os.execlp(TEST_EXE, TEST_EXE, 'run_tests.py')
+    elif args.action == 'bench':
+        build_bench()
+        os.execl(BENCH_EXE, BENCH_EXE, *args.rest)
 
 
 if __name__ == '__main__':